@@ -22,10 +22,14 @@
 기간: DB 내 최대 기간 (2016~ 현재)
 """
 
+import numpy as np
 import pymysql
 from collections import defaultdict
 from multiprocessing import Pool, cpu_count
 import time as time_mod
+from services.price_stream import load_price_columns
+from services.price_cache import segment_index, segment_arrays
+from services.shared_arrays import share_arrays, attach_arrays, release_arrays, shared_nbytes
 
 DB_CONFIG = {
     "host": "localhost",
@@ -55,20 +59,34 @@ MCAP_MIN = 1_000_000_000  # $1B
 # -- 백테스트 기간 --
 BT_START = "2016-01-01"
 
+# 최적화 대상 상수 (optimize_breakout 이 조합별로 set_params 로 변경)
+TUNABLE_PARAMS = [
+    "RISE_MIN_PCT", "CONSOL_MIN_DAYS", "CONSOL_MAX_DAYS", "VOLUME_RATIO_MIN",
+    "STOP_LOSS_PCT", "TRAILING_STOP_PCT", "MA_EXIT_DAYS",
+]
+
+
+# 워커가 쓰는 가격 컬럼 (공유 메모리로 전달)
+PRICE_COLUMNS = ["trade_date", "low", "close", "volume"]
+DELTA_PREFIX = "delta_"  # 공유 메모리의 델타 세그먼트 컬럼 이름 접두사
+
+# 워커 프로세스의 공유 가격 배열 (init_worker 에서 연결)
+_prices = None
 
-def check_breakout(prices, today_idx):
-    """돌파 조건 확인 (종가 기준 신고가 + 횡보 + 거래량)"""
-    today_close = float(prices[today_idx][4])
-    today_vol = prices[today_idx][5]
+
+def check_breakout(close, low, volume, today_idx):
+    """돌파 조건 확인 (종가 기준 신고가 + 횡보 + 거래량). close/low/volume: 한 종목의 리스트"""
+    today_close = close[today_idx]
+    today_vol = volume[today_idx]
 
     if today_close <= 0 or today_vol <= 0:
         return None
 
     # 거래량 체크
-    vol_window = prices[today_idx - VOLUME_AVG_DAYS:today_idx]
+    vol_window = volume[today_idx - VOLUME_AVG_DAYS:today_idx]
     if len(vol_window) < VOLUME_AVG_DAYS:
         return None
-    avg_vol = sum(p[5] for p in vol_window) / VOLUME_AVG_DAYS
+    avg_vol = sum(vol_window) / VOLUME_AVG_DAYS
     if avg_vol <= 0:
         return None
     volume_ratio = today_vol / avg_vol
@@ -81,7 +99,7 @@ def check_breakout(prices, today_idx):
     search_limit = min(CONSOL_MAX_DAYS, today_idx)
     for offset in range(1, search_limit + 1):
         idx = today_idx - offset
-        c = float(prices[idx][4])
+        c = close[idx]
         if c > peak_close:
             peak_close = c
             peak_idx = idx
@@ -101,18 +119,18 @@ def check_breakout(prices, today_idx):
     # 횡보 중 -50% 하락 금지
     floor = peak_close * (1 - CONSOL_MAX_DROP_PCT / 100)
     for k in range(peak_idx + 1, today_idx):
-        if float(prices[k][4]) < floor:
+        if close[k] < floor:
             return None
 
     # 첫날 확인: 전날 종가 <= peak
-    if today_idx >= 1 and float(prices[today_idx - 1][4]) > peak_close:
+    if today_idx >= 1 and close[today_idx - 1] > peak_close:
         return None
 
     # 저점 대비 200% 상승 (최근 2년 내)
     if peak_idx < 10:
         return None
     low_search_start = max(0, peak_idx - RISE_LOOKBACK_DAYS)
-    low_price = min(float(prices[k][3]) for k in range(low_search_start, peak_idx))
+    low_price = min(low[low_search_start:peak_idx])
     if low_price <= 0:
         return None
     rise_pct = (peak_close / low_price - 1) * 100
@@ -122,22 +140,59 @@ def check_breakout(prices, today_idx):
     return {"volume_ratio": volume_ratio, "rise_pct": rise_pct, "consol_days": consol_days}
 
 
+def current_params():
+    """튜닝 대상 상수의 현재 값 {이름: 값}"""
+    return {name: globals()[name] for name in TUNABLE_PARAMS}
+
+
+def set_params(params):
+    """튜닝 대상 상수 변경 (check_breakout/backtest_stock 이 호출 시점에 읽음)"""
+    unknown = set(params) - set(TUNABLE_PARAMS)
+    if unknown:
+        raise KeyError(f"unknown params: {sorted(unknown)}")
+    globals().update(params)
+
+
+def init_worker(spec):
+    """Pool initializer: 공유 메모리 가격 배열 연결"""
+    global _prices
+    _prices = attach_arrays(spec)
+
+
+def _stock_column(name, offset, length, d_offset, d_length):
+    """공유 메모리의 본 캐시 구간 + 델타 구간 (델타 행이 있는 종목만 이어붙임)"""
+    base = _prices[name][offset:offset + length]
+    if not d_length:
+        return base
+    return np.concatenate((base, _prices[DELTA_PREFIX + name][d_offset:d_offset + d_length]))
+
+
 def backtest_stock(args):
-    """단일 종목 백테스트. (stock_id, prices, start_idx) -> trades[]"""
-    stock_id, prices, start_idx = args
+    """단일 종목 백테스트. (stock_id, offset, length, d_offset, d_length, start_idx) -> trades[]
+
+    가격은 공유 메모리 배열의 [offset, offset + length) 구간 + 델타 배열의
+    [d_offset, d_offset + d_length) 구간 (종목 단위로만 리스트 변환).
+    """
+    stock_id, offset, length, d_offset, d_length, start_idx = args
+    seg = (offset, length, d_offset, d_length)
+    dates = _stock_column("trade_date", *seg)
+    close = _stock_column("close", *seg).tolist()
+    low = _stock_column("low", *seg).tolist()
+    volume = _stock_column("volume", *seg).tolist()
+
     trades = []
-    n = len(prices)
+    n = length + d_length
     i = start_idx
 
     while i < n:
-        result = check_breakout(prices, i)
+        result = check_breakout(close, low, volume, i)
         if not result:
             i += 1
             continue
 
         entry_idx = i
-        entry_price = float(prices[i][4])
-        entry_date = prices[i][0]
+        entry_price = close[i]
+        entry_date = dates[i]
         peak_price = entry_price
         stop_price = entry_price * (1 - STOP_LOSS_PCT / 100)
 
@@ -146,39 +201,39 @@ def backtest_stock(args):
         exit_reason = None
 
         for j in range(i + 1, n):
-            close = float(prices[j][4])
+            price = close[j]
 
-            if close > peak_price:
-                peak_price = close
+            if price > peak_price:
+                peak_price = price
 
             # 1) 손절: 진입가 -7%
-            if close <= stop_price:
-                exit_price = close
-                exit_date = prices[j][0]
+            if price <= stop_price:
+                exit_price = price
+                exit_date = dates[j]
                 exit_reason = "stop_loss"
                 i = j + 1
                 break
 
             # 2) 트레일링: 고점 -20%
-            if close <= peak_price * (1 - TRAILING_STOP_PCT / 100):
-                exit_price = close
-                exit_date = prices[j][0]
+            if price <= peak_price * (1 - TRAILING_STOP_PCT / 100):
+                exit_price = price
+                exit_date = dates[j]
                 exit_reason = "trailing_stop"
                 i = j + 1
                 break
 
             # 3) 20일선 이탈: 종가 < 20일 이동평균
             if j >= MA_EXIT_DAYS:
-                ma20 = sum(float(prices[j - k][4]) for k in range(MA_EXIT_DAYS)) / MA_EXIT_DAYS
-                if close < ma20:
-                    exit_price = close
-                    exit_date = prices[j][0]
+                ma20 = sum(close[j - k] for k in range(MA_EXIT_DAYS)) / MA_EXIT_DAYS
+                if price < ma20:
+                    exit_price = price
+                    exit_date = dates[j]
                     exit_reason = "ma20_break"
                     i = j + 1
                     break
         else:
-            exit_price = float(prices[-1][4])
-            exit_date = prices[-1][0]
+            exit_price = close[-1]
+            exit_date = dates[-1]
             exit_reason = "open"
             i = n
 
@@ -206,6 +261,42 @@ def backtest_stock(args):
     return trades
 
 
+def build_tasks(prices, min_start=None):
+    """컬럼형 가격 → 워커 작업 설명자 [(stock_id, offset, length, d_offset, d_length, start_idx), ...]
+
+    min_start: 최소 시작 인덱스 (기본: CONSOL_MAX_DAYS + VOLUME_AVG_DAYS)
+    """
+    if min_start is None:
+        min_start = CONSOL_MAX_DAYS + VOLUME_AVG_DAYS
+    bt_start = np.datetime64(BT_START)
+    sids, base, tail = segment_index(prices)
+
+    tasks = []
+    for i, stock_id in enumerate(sids.tolist()):
+        (offset, end), (d_offset, d_end) = base[i].tolist(), tail[i].tolist()
+        length, d_length = end - offset, d_end - d_offset
+        total = length + d_length
+        if total == 0:
+            continue
+        dates = segment_arrays(prices, ["trade_date"], base[i], tail[i])["trade_date"]
+        start_idx = int(np.searchsorted(dates, bt_start))
+        if start_idx == total:  # BT_START 이후 데이터 없음 → 앞부분부터
+            start_idx = min_start
+        start_idx = max(min_start, start_idx)
+        if start_idx >= total - 1:
+            continue
+        tasks.append((stock_id, offset, length, d_offset, d_length, start_idx))
+    return tasks
+
+
+def shared_price_columns(prices):
+    """공유 메모리에 올릴 가격 컬럼 (본 캐시 + 델타를 병합하지 않고 각각)"""
+    arrays = {name: prices[name] for name in PRICE_COLUMNS}
+    if prices.get("delta") is not None:
+        arrays.update({DELTA_PREFIX + name: prices["delta"][name] for name in PRICE_COLUMNS})
+    return arrays
+
+
 def classify_earnings(stock_id, signal_date, earnings_map):
     """
     시그널 날짜 기준 실적 분류.
@@ -273,6 +364,62 @@ def lookup_mcap(mcap_dates, mcap_values, entry_date_str):
     return None
 
 
+def load_mcap_map(cur):
+    """역사적 시가총액 {stock_id: (dates_list, values_list)} - 날짜순 (이진 탐색용)"""
+    cur.execute("""
+        SELECT stock_id, trade_date, market_cap
+        FROM bs_market_cap
+        ORDER BY stock_id, trade_date
+    """)
+
+    mcap_map = {}
+    current_sid = None
+    dates_buf, vals_buf = [], []
+    for row in cur:
+        sid, dt, mcap = row
+        if sid != current_sid:
+            if current_sid is not None and dates_buf:
+                mcap_map[current_sid] = ([str(d) for d in dates_buf], vals_buf)
+            current_sid = sid
+            dates_buf, vals_buf = [], []
+        dates_buf.append(dt)
+        vals_buf.append(mcap)
+    if current_sid is not None and dates_buf:
+        mcap_map[current_sid] = ([str(d) for d in dates_buf], vals_buf)
+    return mcap_map
+
+
+def filter_by_mcap(all_trades, mcap_map):
+    """진입일 시가총액 조회(t["market_cap"] 기록) + MCAP_MIN 미만 제외.
+
+    Returns: (filtered_trades, 제외 건수, 시총 데이터 없음 건수)
+    """
+    has_mcap_data = len(mcap_map) > 0
+    filtered_trades = []
+    mcap_filtered = 0
+    mcap_missing = 0
+
+    for t in all_trades:
+        sid = t["stock_id"]
+        mcap_data = mcap_map.get(sid)
+        if mcap_data and has_mcap_data:
+            mcap = lookup_mcap(mcap_data[0], mcap_data[1], t["entry_date"])
+            t["market_cap"] = mcap
+            if mcap is not None and mcap < MCAP_MIN:
+                mcap_filtered += 1
+                continue
+            if mcap is None:
+                mcap_missing += 1
+        else:
+            t["market_cap"] = None
+            if has_mcap_data:
+                mcap_missing += 1
+
+        filtered_trades.append(t)
+
+    return filtered_trades, mcap_filtered, mcap_missing
+
+
 # =====================================================================
 # 통계 계산 유틸리티
 # =====================================================================
@@ -403,19 +550,11 @@ def main():
     stocks = {r[0]: {"ticker": r[1], "name": r[2], "market_cap": r[3]} for r in cur.fetchall()}
 
     print("[2/5] Loading prices...", flush=True)
-    cur.execute("""
-        SELECT stock_id, trade_date, open_price, high_price, low_price, close_price, volume
-        FROM bs_daily_prices
-        ORDER BY stock_id, trade_date
-    """)
-
-    all_prices = defaultdict(list)
-    for row in cur:
-        all_prices[row[0]].append(row[1:])
+    prices = load_price_columns(conn, PRICE_COLUMNS)
 
     t1 = time_mod.time()
-    total_candles = sum(len(v) for v in all_prices.values())
-    print(f"  -> {len(all_prices)} stocks, {total_candles:,} candles ({t1-t0:.0f}s)")
+    total_candles = int(prices["offsets"][-1]) + (int(prices["delta"]["offsets"][-1]) if prices["delta"] else 0)
+    print(f"  -> {len(segment_index(prices)[0])} stocks, {total_candles:,} candles ({t1-t0:.0f}s)")
 
     print("[3/5] Loading earnings...", flush=True)
     cur.execute("""
@@ -433,27 +572,7 @@ def main():
     print(f"  -> {len(earnings_map)} stocks earnings ({t2-t1:.0f}s)")
 
     print("[4/5] Loading historical market cap...", flush=True)
-    cur.execute("""
-        SELECT stock_id, trade_date, market_cap
-        FROM bs_market_cap
-        ORDER BY stock_id, trade_date
-    """)
-
-    # {stock_id: (dates_list, values_list)} - sorted by date for binary search
-    mcap_map = {}
-    current_sid = None
-    dates_buf, vals_buf = [], []
-    for row in cur:
-        sid, dt, mcap = row
-        if sid != current_sid:
-            if current_sid is not None and dates_buf:
-                mcap_map[current_sid] = ([str(d) for d in dates_buf], vals_buf)
-            current_sid = sid
-            dates_buf, vals_buf = [], []
-        dates_buf.append(dt)
-        vals_buf.append(mcap)
-    if current_sid is not None and dates_buf:
-        mcap_map[current_sid] = ([str(d) for d in dates_buf], vals_buf)
+    mcap_map = load_mcap_map(cur)
 
     t2b = time_mod.time()
     total_mcap_rows = sum(len(v[0]) for v in mcap_map.values())
@@ -468,27 +587,23 @@ def main():
     # 2. 백테스트
     print("[5/5] Running backtest...", flush=True)
 
-    bt_args = []
-    for stock_id, prices in all_prices.items():
-        start_idx = -1
-        for idx, p in enumerate(prices):
-            if str(p[0]) >= BT_START:
-                start_idx = idx
-                break
-        if start_idx < 0 or start_idx < CONSOL_MAX_DAYS + VOLUME_AVG_DAYS:
-            start_idx = max(CONSOL_MAX_DAYS + VOLUME_AVG_DAYS, start_idx)
-        if start_idx >= len(prices) - 1:
-            continue
-        bt_args.append((stock_id, prices, start_idx))
+    bt_args = build_tasks(prices)
+
+    # 가격 컬럼을 공유 메모리에 한 벌만 두고 워커는 (offset, length) 만 받음
+    blocks, spec = share_arrays(shared_price_columns(prices))
+    del prices
 
     num_workers = max(1, cpu_count() - 1)
-    print(f"  -> {len(bt_args)} stocks, {num_workers} CPU cores")
+    print(f"  -> {len(bt_args)} stocks, {num_workers} CPU cores, "
+          f"shared prices {shared_nbytes(blocks) / 1e6:,.0f} MB")
 
     all_trades = []
-    with Pool(num_workers) as pool:
-        results = pool.map(backtest_stock, bt_args, chunksize=50)
-        for trades in results:
-            all_trades.extend(trades)
+    try:
+        with Pool(num_workers, initializer=init_worker, initargs=(spec,)) as pool:
+            for trades in pool.imap(backtest_stock, bt_args, chunksize=50):
+                all_trades.extend(trades)
+    finally:
+        release_arrays(blocks)
 
     t3 = time_mod.time()
     print(f"  -> {len(all_trades)} trades found ({t3-t2b:.0f}s)")
@@ -498,27 +613,7 @@ def main():
         return
 
     # 시가총액 조회 + $1B 필터
-    filtered_trades = []
-    mcap_filtered = 0
-    mcap_missing = 0
-
-    for t in all_trades:
-        sid = t["stock_id"]
-        mcap_data = mcap_map.get(sid)
-        if mcap_data and has_mcap_data:
-            mcap = lookup_mcap(mcap_data[0], mcap_data[1], t["entry_date"])
-            t["market_cap"] = mcap
-            if mcap is not None and mcap < MCAP_MIN:
-                mcap_filtered += 1
-                continue
-            if mcap is None:
-                mcap_missing += 1
-        else:
-            t["market_cap"] = None
-            if has_mcap_data:
-                mcap_missing += 1
-
-        filtered_trades.append(t)
+    filtered_trades, mcap_filtered, mcap_missing = filter_by_mcap(all_trades, mcap_map)
 
     if has_mcap_data:
         print(f"  -> Market cap filter: {len(all_trades)} -> {len(filtered_trades)} trades "
@@ -27,10 +27,16 @@
 인터랙티브 모드: 데이터 1회 로드 후 파라미터 변경하며 반복 테스트 가능.
 """
 
+import numpy as np
 import pymysql
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from itertools import product
+from multiprocessing import Pool, cpu_count
 import time as time_mod
 from db.connection import get_connection
+from services.price_cache import FULL_COLUMNS, to_column, arrays_to_rows
+from services.price_stream import load_price_rows
+from services.shared_arrays import share_arrays, attach_arrays, release_arrays
 
 # 튜플 인덱스
 IDX_DATE = 0
@@ -63,6 +69,12 @@ _cfg = {
 
 BT_START = "2016-01-01"
 
+# 진입 후보 캐시 (LRU). 진입 조건에 영향을 주는 _cfg 키만 캐시 키에 포함
+# → 손절/트레일링/시총 기준만 바꾼 재실행은 청산 시뮬레이션만 다시 돌림
+ENTRY_CFG_KEYS = ["volume_ratio_min", "breakout_lookback", "volume_avg_days", "ma200_trend_days"]
+CANDIDATE_CACHE_SIZE = 16
+_candidate_cache = OrderedDict()
+
 RS_MAP = {
     "1m": IDX_RS1M,
     "3m": IDX_RS3M,
@@ -70,8 +82,39 @@ RS_MAP = {
 }
 
 
-def check_minervini_template(prices, idx, rs_col_idx):
-    """미너비니 트렌드 템플릿 8가지 조건 확인."""
+def rolling_extreme(values, window, fn):
+    """후행 구간 [i - window + 1, i] 의 최소/최대 배열 (fn = np.minimum 또는 np.maximum).
+
+    van Herk/Gil-Werman 방식: window 크기 블록별 prefix/suffix 누적값 두 개를 결합하므로
+    구간 길이와 무관하게 O(n). 앞부분(i < window - 1)은 [0, i] 구간.
+    """
+    a = np.asarray(values, dtype=np.float64)
+    n = len(a)
+    if n == 0:
+        return a
+    fill = np.inf if fn is np.minimum else -np.inf
+    padded = np.concatenate([np.full(window - 1, fill), a])
+    padded = np.concatenate([padded, np.full(-len(padded) % window, fill)])
+    blocks = padded.reshape(-1, window)
+    prefix = fn.accumulate(blocks, axis=1).ravel()
+    suffix = fn.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    # 원래 인덱스 i 의 구간 = 패딩 배열 [i, i + window - 1]
+    i = np.arange(n)
+    return fn(suffix[i], prefix[i + window - 1])
+
+
+def week52_levels(prices):
+    """종목별 52주 저가/고가 배열 (당일 포함 최근 WEEK52_DAYS + 1 봉). (lows, highs) 리스트."""
+    lows = [p[IDX_LOW] for p in prices]
+    highs = [p[IDX_HIGH] for p in prices]
+    return (
+        rolling_extreme(lows, WEEK52_DAYS + 1, np.minimum).tolist(),
+        rolling_extreme(highs, WEEK52_DAYS + 1, np.maximum).tolist(),
+    )
+
+
+def check_trend_template(prices, idx, levels):
+    """트렌드 템플릿 조건 1~7 (RS 제외 — RS 기간/기준과 무관하므로 변형 간 공유)"""
     if idx < MIN_HISTORY:
         return False
 
@@ -80,15 +123,13 @@ def check_minervini_template(prices, idx, rs_col_idx):
     ma50 = p[IDX_MA50]
     ma150 = p[IDX_MA150]
     ma200 = p[IDX_MA200]
-    rs_val = p[rs_col_idx]
 
-    if ma50 is None or ma150 is None or ma200 is None or rs_val is None:
+    if ma50 is None or ma150 is None or ma200 is None:
         return False
 
     ma50 = float(ma50)
     ma150 = float(ma150)
     ma200 = float(ma200)
-    rs_val = int(rs_val)
 
     # 1. 종가 > MA150 AND 종가 > MA200
     if close <= ma150 or close <= ma200:
@@ -115,23 +156,23 @@ def check_minervini_template(prices, idx, rs_col_idx):
         return False
 
     # 6. 종가 >= 52주 저가 × 1.30
-    start = max(0, idx - WEEK52_DAYS)
-    week52_low = min(float(prices[i][IDX_LOW]) for i in range(start, idx + 1))
-    if close < week52_low * 1.30:
+    week52_low, week52_high = levels
+    if close < week52_low[idx] * 1.30:
         return False
 
     # 7. 종가 >= 52주 고가 × 0.75
-    week52_high = max(float(prices[i][IDX_HIGH]) for i in range(start, idx + 1))
-    if close < week52_high * 0.75:
-        return False
-
-    # 8. RS >= threshold
-    if rs_val < _cfg["rs_threshold"]:
+    if close < week52_high[idx] * 0.75:
         return False
 
     return True
 
 
+def check_rs(prices, idx, rs_col_idx, rs_threshold):
+    """8. RS >= threshold"""
+    rs_val = prices[idx][rs_col_idx]
+    return rs_val is not None and int(rs_val) >= rs_threshold
+
+
 def check_buy_trigger(prices, idx):
     """매수 타이밍: 고가 돌파 + 거래량 배수."""
     lookback = _cfg["breakout_lookback"]
@@ -160,74 +201,143 @@ def check_buy_trigger(prices, idx):
     return True
 
 
-def backtest_stock(args):
-    """단일 종목 백테스트."""
-    stock_id, prices, start_idx, rs_col_idx = args
-    trades = []
-    n = len(prices)
-    i = start_idx
+def _exit_trade(stock_id, dates, closes, entry_idx, sl_pct, trail_pct):
+    """entry_idx 종가 진입 → 청산까지 진행. (trade, 다음 탐색 인덱스)
+
+    dates/closes: 종목의 날짜/종가 시퀀스 (튜플 리스트에서 뽑은 리스트 또는 공유 메모리 배열 구간)
+    """
+    n = len(closes)
+    entry_price = float(closes[entry_idx])
+    entry_date = str(dates[entry_idx])
+    peak_price = entry_price
+    stop_price = entry_price * (1 - sl_pct / 100)
+
+    exit_price = None
+    exit_date = None
+    exit_reason = None
+
+    for j in range(entry_idx + 1, n):
+        close = float(closes[j])
+
+        if close > peak_price:
+            peak_price = close
+
+        if close <= stop_price:
+            exit_price = close
+            exit_date = str(dates[j])
+            exit_reason = "stop_loss"
+            next_idx = j + 1
+            break
+
+        if close <= peak_price * (1 - trail_pct / 100):
+            exit_price = close
+            exit_date = str(dates[j])
+            exit_reason = "trailing_stop"
+            next_idx = j + 1
+            break
+    else:
+        exit_price = float(closes[-1])
+        exit_date = str(dates[-1])
+        exit_reason = "open"
+        next_idx = n
+
+    ret_pct = (exit_price / entry_price - 1) * 100
+    hold_days = (n - 1 - entry_idx) if exit_reason == "open" else (j - entry_idx)
+
+    trade = {
+        "stock_id": stock_id,
+        "entry_date": entry_date,
+        "exit_date": exit_date,
+        "entry_price": entry_price,
+        "exit_price": exit_price,
+        "return_pct": ret_pct,
+        "exit_reason": exit_reason,
+        "hold_days": hold_days,
+    }
+    return trade, next_idx
+
+
+def entry_candidates(prices, start_idx, levels):
+    """조건 1~7 + 매수 타이밍을 만족하는 인덱스 목록 (RS 조건 적용 전)"""
+    return [
+        i for i in range(start_idx, len(prices))
+        if check_trend_template(prices, i, levels) and check_buy_trigger(prices, i)
+    ]
+
 
+def simulate_columns(stock_id, dates, closes, candidates):
+    """진입 후보 인덱스를 순서대로 진입/청산 (보유 중인 구간의 후보는 건너뜀)"""
     sl_pct = _cfg["stop_loss_pct"]
     trail_pct = _cfg["trailing_stop_pct"]
 
-    while i < n:
-        if not check_minervini_template(prices, i, rs_col_idx):
-            i += 1
-            continue
-        if not check_buy_trigger(prices, i):
-            i += 1
+    trades = []
+    next_idx = 0
+    for entry_idx in candidates:
+        if entry_idx < next_idx:
             continue
+        trade, next_idx = _exit_trade(stock_id, dates, closes, entry_idx, sl_pct, trail_pct)
+        trades.append(trade)
+    return trades
 
-        entry_idx = i
-        entry_price = float(prices[i][IDX_CLOSE])
-        entry_date = str(prices[i][IDX_DATE])
-        peak_price = entry_price
-        stop_price = entry_price * (1 - sl_pct / 100)
 
-        exit_price = None
-        exit_date = None
-        exit_reason = None
+def simulate_trades(stock_id, prices, candidates):
+    """튜플 리스트 가격으로 simulate_columns (후보가 있는 종목만 날짜/종가 추출)"""
+    if not candidates:
+        return []
+    dates = [p[IDX_DATE] for p in prices]
+    closes = [p[IDX_CLOSE] for p in prices]
+    return simulate_columns(stock_id, dates, closes, candidates)
 
-        for j in range(i + 1, n):
-            close = float(prices[j][IDX_CLOSE])
 
-            if close > peak_price:
-                peak_price = close
+def _cache_get(key):
+    if key in _candidate_cache:
+        _candidate_cache.move_to_end(key)
+        return _candidate_cache[key]
+    return None
 
-            if close <= stop_price:
-                exit_price = close
-                exit_date = str(prices[j][IDX_DATE])
-                exit_reason = "stop_loss"
-                i = j + 1
-                break
 
-            if close <= peak_price * (1 - trail_pct / 100):
-                exit_price = close
-                exit_date = str(prices[j][IDX_DATE])
-                exit_reason = "trailing_stop"
-                i = j + 1
-                break
-        else:
-            exit_price = float(prices[-1][IDX_CLOSE])
-            exit_date = str(prices[-1][IDX_DATE])
-            exit_reason = "open"
-            i = n
-
-        ret_pct = (exit_price / entry_price - 1) * 100
-        hold_days = (n - 1 - entry_idx) if exit_reason == "open" else (j - entry_idx)
-
-        trades.append({
-            "stock_id": stock_id,
-            "entry_date": entry_date,
-            "exit_date": exit_date,
-            "entry_price": entry_price,
-            "exit_price": exit_price,
-            "return_pct": ret_pct,
-            "exit_reason": exit_reason,
-            "hold_days": hold_days,
-        })
+def _cache_put(key, value):
+    _candidate_cache[key] = value
+    _candidate_cache.move_to_end(key)
+    while len(_candidate_cache) > CANDIDATE_CACHE_SIZE:
+        _candidate_cache.popitem(last=False)
 
-    return trades
+
+def base_candidates(bt_args_base):
+    """종목별 조건 1~7 + 매수 타이밍 후보 (현재 _cfg 의 진입 파라미터 기준)"""
+    return [entry_candidates(prices, start_idx, levels)
+            for _, prices, start_idx, levels in bt_args_base]
+
+
+def rs_filter(bt_args_base, base, rs_col_idx, rs_threshold):
+    """종목별 후보에 RS 조건(8) 적용"""
+    return [
+        [i for i in cands if check_rs(prices, i, rs_col_idx, rs_threshold)]
+        for cands, (_, prices, _, _) in zip(base, bt_args_base)
+    ]
+
+
+def candidate_lists(bt_args_base, rs_col_idx, rs_threshold):
+    """종목별 진입 후보 인덱스 (bt_args_base 순서). 진입 조건 키별 LRU 캐시.
+
+    조건 1~7 + 매수 타이밍 결과(RS 무관)와 RS 적용 결과를 각각 캐시하므로
+    RS 기준만 바뀌면 필터링만, 청산 파라미터만 바뀌면 재계산 없음.
+    Returns: (lists, cached)
+    """
+    entry_key = tuple(_cfg[k] for k in ENTRY_CFG_KEYS)
+    key = (rs_col_idx, rs_threshold) + entry_key
+    lists = _cache_get(key)
+    if lists is not None:
+        return lists, True
+
+    base = _cache_get(("base",) + entry_key)
+    if base is None:
+        base = base_candidates(bt_args_base)
+        _cache_put(("base",) + entry_key, base)
+
+    lists = rs_filter(bt_args_base, base, rs_col_idx, rs_threshold)
+    _cache_put(key, lists)
+    return lists, False
 
 
 # =====================================================================
@@ -349,23 +459,27 @@ def _bucket_by_mcap(trades):
     return result
 
 
-def run_backtest_for_rs(stocks, bt_args_base, rs_col_idx, rs_label,
-                        earnings_map, mcap_map, has_mcap_data):
-    """특정 RS 기간으로 백테스트 실행 + 결과 출력."""
-    all_trades = []
-    total = len(bt_args_base)
-    for i, (sid, prices, start_idx) in enumerate(bt_args_base):
-        trades = backtest_stock((sid, prices, start_idx, rs_col_idx))
-        all_trades.extend(trades)
-        if (i + 1) % 1000 == 0:
-            print(f"  진행: {i+1}/{total} ({len(all_trades)} trades)", flush=True)
+def run_backtest_variants(bt_args_base, variants):
+    """여러 RS 변형 실행. variants: [(rs_col_idx, rs_threshold), ...] → 변형별 trades
 
-    if not all_trades:
-        print(f"\n  [{rs_label}] No trades found.")
-        return None
+    진입 후보는 candidate_lists 캐시에서 가져오고(없으면 조건 1~7 + 매수 타이밍 1회 평가),
+    변형별로는 청산 시뮬레이션만 수행.
+    """
+    results = []
+    for rs_col_idx, rs_threshold in variants:
+        lists, cached = candidate_lists(bt_args_base, rs_col_idx, rs_threshold)
+        trades = []
+        for cands, (sid, prices, _, _) in zip(lists, bt_args_base):
+            trades.extend(simulate_trades(sid, prices, cands))
+        print(f"  [RS col {rs_col_idx} >= {rs_threshold}] entry candidates "
+              f"{sum(len(c) for c in lists):,} ({'cached' if cached else 'computed'}), "
+              f"{len(trades)} trades", flush=True)
+        results.append(trades)
+    return results
 
-    # 시가총액 필터
-    mcap_min = _cfg["mcap_min"]
+
+def filter_by_mcap(all_trades, mcap_map, has_mcap_data, mcap_min):
+    """진입일 시가총액 조회(t["market_cap"] 기록) + mcap_min 미만 제외. (filtered, 제외 건수)"""
     filtered_trades = []
     mcap_filtered = 0
 
@@ -382,6 +496,23 @@ def run_backtest_for_rs(stocks, bt_args_base, rs_col_idx, rs_label,
             t["market_cap"] = None
         filtered_trades.append(t)
 
+    return filtered_trades, mcap_filtered
+
+
+def report_trades(stocks, all_trades, rs_label, earnings_map, mcap_map, has_mcap_data,
+                  rs_threshold=None):
+    """거래 목록 → 시가총액 필터 + 실적 분류 + 결과 출력. 전체 통계 반환."""
+    if rs_threshold is None:
+        rs_threshold = _cfg["rs_threshold"]
+
+    if not all_trades:
+        print(f"\n  [{rs_label}] No trades found.")
+        return None
+
+    # 시가총액 필터
+    mcap_min = _cfg["mcap_min"]
+    filtered_trades, mcap_filtered = filter_by_mcap(all_trades, mcap_map, has_mcap_data, mcap_min)
+
     if has_mcap_data and mcap_filtered:
         print(f"  Market cap filter: {len(all_trades)} -> {len(filtered_trades)} "
               f"(removed {mcap_filtered} < ${mcap_min/1e9:.0f}B)")
@@ -394,7 +525,7 @@ def run_backtest_for_rs(stocks, bt_args_base, rs_col_idx, rs_label,
     # -- 결과 출력 --
     print(f"\n{'='*110}")
     print(f"  {rs_label}  ({len(all_trades)} trades)")
-    print(f"  Config: RS>={_cfg['rs_threshold']}  Vol>={_cfg['volume_ratio_min']}x  "
+    print(f"  Config: RS>={rs_threshold}  Vol>={_cfg['volume_ratio_min']}x  "
           f"Breakout={_cfg['breakout_lookback']}d  SL={_cfg['stop_loss_pct']}%  Trail={_cfg['trailing_stop_pct']}%")
     print(f"{'='*110}")
 
@@ -463,15 +594,7 @@ def load_data():
     t0 = time_mod.time()
 
     print("[1/4] Loading prices (with MA + RS)...", flush=True)
-    cur.execute("""
-        SELECT stock_id, trade_date, open_price, high_price, low_price, close_price, volume,
-               ma50, ma150, ma200, rs_1m, rs_3m, rs_6m
-        FROM bs_daily_prices
-        ORDER BY stock_id, trade_date
-    """)
-    all_prices = defaultdict(list)
-    for row in cur:
-        all_prices[row[0]].append(row[1:])
+    all_prices = load_price_rows(conn, FULL_COLUMNS)
     t1 = time_mod.time()
     total_candles = sum(len(v) for v in all_prices.values())
     print(f"  -> {len(all_prices)} stocks, {total_candles:,} candles ({t1-t0:.0f}s)")
@@ -520,7 +643,9 @@ def load_data():
 
     conn.close()
 
-    # bt_args_base 준비
+    _candidate_cache.clear()
+
+    # bt_args_base 준비 (52주 고가/저가는 여기서 1회 계산 → 모든 RS 기간/파라미터에서 재사용)
     bt_args_base = []
     for stock_id, prices in all_prices.items():
         start_idx = -1
@@ -533,7 +658,7 @@ def load_data():
         start_idx = max(MIN_HISTORY, start_idx)
         if start_idx >= len(prices) - 1:
             continue
-        bt_args_base.append((stock_id, prices, start_idx))
+        bt_args_base.append((stock_id, prices, start_idx, week52_levels(prices)))
 
     elapsed = time_mod.time() - t0
     print(f"\nData loaded in {elapsed:.0f}s. Eligible stocks: {len(bt_args_base)}\n")
@@ -547,35 +672,274 @@ def load_data():
     }
 
 
-def run_default_tests(data):
-    """기본 3개 RS 기간 테스트."""
-    rs_configs = [
-        (IDX_RS1M, "RS 1M (rs_1m >= 70)"),
-        (IDX_RS3M, "RS 3M (rs_3m >= 70)"),
-        (IDX_RS6M, "RS 6M (rs_6m >= 70)"),
-    ]
+def run_rs_variants(data, variants):
+    """RS 변형 여러 개를 1패스로 실행 + 변형별 결과 출력.
+
+    variants: [(rs_col_idx, rs_threshold, label), ...] → [(label, stats), ...]
+    """
+    t_start = time_mod.time()
+    print(f"\n{'#'*110}")
+    print(f"  Running ({len(variants)} RS variants, single pass): "
+          + ", ".join(label for _, _, label in variants))
+    print(f"{'#'*110}")
+
+    results = run_backtest_variants(
+        data["bt_args_base"], [(rs_col_idx, rs_threshold) for rs_col_idx, rs_threshold, _ in variants],
+    )
+    elapsed = time_mod.time() - t_start
 
     summary = []
-    for rs_col_idx, rs_label in rs_configs:
-        t_start = time_mod.time()
-        print(f"\n{'#'*110}")
-        print(f"  Running: {rs_label}")
-        print(f"{'#'*110}")
-
-        stats = run_backtest_for_rs(
-            data["stocks"], data["bt_args_base"], rs_col_idx, rs_label,
+    for (_, rs_threshold, label), trades in zip(variants, results):
+        stats = report_trades(
+            data["stocks"], trades, label,
             data["earnings_map"], data["mcap_map"], data["has_mcap_data"],
+            rs_threshold=rs_threshold,
         )
-        elapsed = time_mod.time() - t_start
-        print(f"\n  [{rs_label}] completed in {elapsed:.0f}s")
-
         if stats:
-            summary.append((rs_label, stats))
+            summary.append((label, stats))
+
+    print(f"\n  {len(variants)} variants completed in {elapsed:.0f}s")
+    return summary
+
 
+def run_default_tests(data):
+    """기본 3개 RS 기간 테스트 (조건 1~7 + 매수 타이밍 1회 평가 후 RS 기간별 분기)."""
+    rs_configs = [
+        (IDX_RS1M, 70, "RS 1M (rs_1m >= 70)"),
+        (IDX_RS3M, 70, "RS 3M (rs_3m >= 70)"),
+        (IDX_RS6M, 70, "RS 6M (rs_6m >= 70)"),
+    ]
+
+    summary = run_rs_variants(data, rs_configs)
     print_comparison(summary)
     return summary
 
 
+# =====================================================================
+# 파라미터 스윕 (프로세스 풀)
+# =====================================================================
+
+SWEEP_TOP_N = 30
+
+# 정수여야 하는 _cfg 키 (인덱스/기간/RS 정수 비교). 나머지 수치는 float 허용
+INT_CFG_KEYS = {"rs_threshold", "breakout_lookback", "volume_avg_days", "ma200_trend_days"}
+
+# 워커 프로세스 상태 (Pool initializer 로 1회 설정 — 공유 메모리 배열 뷰만 보관)
+_sweep_state = {}
+
+
+def parse_cfg_value(key, value):
+    """수치 문자열/float → _cfg 값. float 로 파싱하고 정수가 필요한 키만 int (1e9 같은 표기 허용).
+
+    정수 키에 소수 값이면 ValueError. 기본값이 int 인 키(mcap_min)는 정수 값이면 int 로 유지.
+    """
+    v = float(value)
+    if key in INT_CFG_KEYS:
+        if not v.is_integer():
+            raise ValueError(f"{key}: 정수 파라미터 ({value})")
+        return int(v)
+    if isinstance(_cfg.get(key), int) and v.is_integer():
+        return int(v)
+    return v
+
+
+def parse_sweep_values(key, spec):
+    """'60,70,80' 또는 'lo:hi:step' (양끝 포함) → 값 목록 (parse_cfg_value 로 변환, 중복 제거)
+
+    잘못된 범위(step <= 0, hi < lo, 정수 키의 소수 step/끝값)는 ValueError.
+    """
+    if ":" in spec:
+        bounds = spec.split(":")
+        if len(bounds) != 3:
+            raise ValueError(f"{key}: 범위는 lo:hi:step 형식 ({spec})")
+        lo, hi, step = (float(v) for v in bounds)
+        if step <= 0:
+            raise ValueError(f"{key}: step 은 0 보다 커야 함 ({spec})")
+        if hi < lo:
+            raise ValueError(f"{key}: hi < lo ({spec})")
+        if key in INT_CFG_KEYS and not all(v.is_integer() for v in (lo, hi, step)):
+            raise ValueError(f"{key}: 정수 파라미터는 정수 범위만 가능 ({spec})")
+        n = int(round((hi - lo) / step, 10)) + 1
+        values = [parse_cfg_value(key, round(lo + k * step, 10)) for k in range(n)]
+    else:
+        values = [parse_cfg_value(key, v) for v in spec.split(",")]
+    return list(dict.fromkeys(values))
+
+
+def sweep_columns(bt_args_base):
+    """bt_args_base → 공유 메모리용 컬럼 배열 (종목 i 의 행 = offsets[i]:offsets[i+1])
+
+    가격 컬럼(FULL_COLUMNS, NULL = NaN) + 52주 저가/고가 + 종목별 stock_id/start_idx.
+    컬럼 하나씩 만들어 부모의 임시 리스트도 한 컬럼 분량만 유지.
+    """
+    lengths = [len(prices) for _, prices, _, _ in bt_args_base]
+    arrays = {
+        "stock_id": np.array([sid for sid, _, _, _ in bt_args_base], dtype=np.int64),
+        "start_idx": np.array([start for _, _, start, _ in bt_args_base], dtype=np.int64),
+        "offsets": np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))),
+    }
+    for k, name in enumerate(FULL_COLUMNS):
+        dtype = None if name == "trade_date" else ("int64" if name == "volume" else "float64")
+        arrays[name] = to_column([p[k] for _, prices, _, _ in bt_args_base for p in prices], name, dtype)
+    for k, name in enumerate(("week52_low", "week52_high")):
+        arrays[name] = np.array([v for _, _, _, levels in bt_args_base for v in levels[k]], dtype=np.float64)
+    return arrays
+
+
+def candidate_columns(lists_by_key):
+    """키별 종목별 후보 인덱스 [[...], ...] 목록 → (cand_idx, cand_offsets) 평탄화 배열
+
+    키 k, 종목 i 의 후보 = cand_idx[cand_offsets[k * n + i]:cand_offsets[k * n + i + 1]]
+    """
+    flat = [cands for lists in lists_by_key for cands in lists]
+    lengths = [len(c) for c in flat]
+    return {
+        "cand_idx": np.array([i for c in flat for i in c], dtype=np.int64),
+        "cand_offsets": np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))),
+    }
+
+
+def _init_sweep_worker(spec):
+    _sweep_state["arrays"] = attach_arrays(spec)
+
+
+def _shared_stock(i):
+    """워커: 공유 메모리의 i 번째 종목 → (stock_id, 튜플 리스트, start_idx, levels) (종목 단위 변환)"""
+    cols = _sweep_state["arrays"]
+    s, e = int(cols["offsets"][i]), int(cols["offsets"][i + 1])
+    prices = arrays_to_rows({name: cols[name][s:e] for name in FULL_COLUMNS}, FULL_COLUMNS)
+    levels = (cols["week52_low"][s:e].tolist(), cols["week52_high"][s:e].tolist())
+    return int(cols["stock_id"][i]), prices, int(cols["start_idx"][i]), levels
+
+
+def _sweep_entry(entry_cfg):
+    """워커: 진입 파라미터 1세트의 조건 1~7 + 매수 타이밍 후보"""
+    _cfg.update(entry_cfg)
+    n = len(_sweep_state["arrays"]["stock_id"])
+    return entry_cfg, base_candidates(_shared_stock(i) for i in range(n))
+
+
+def _sweep_exit(task):
+    """워커: 진입 후보가 정해진 조합 1개의 청산 시뮬레이션 → (params, trades)
+
+    후보는 공유 메모리의 평탄화 배열에서 key_no 로 찾고, 후보가 있는 종목만 날짜/종가 구간을 읽음.
+    """
+    params, key_no = task
+    _cfg.update({k: v for k, v in params.items() if k in _cfg})
+    cols = _sweep_state["arrays"]
+    offsets, cand_offsets = cols["offsets"], cols["cand_offsets"]
+    n = len(cols["stock_id"])
+    bounds = cand_offsets[key_no * n:(key_no + 1) * n + 1]
+    trades = []
+    for i in np.flatnonzero(np.diff(bounds)).tolist():
+        s, e = int(offsets[i]), int(offsets[i + 1])
+        cands = cols["cand_idx"][bounds[i]:bounds[i + 1]].tolist()
+        trades.extend(simulate_columns(int(cols["stock_id"][i]), cols["trade_date"][s:e], cols["close"][s:e], cands))
+    return params, trades
+
+
+def _sweep_label(params, keys):
+    return " ".join(f"{k}={params[k]}" for k in keys)
+
+
+def run_sweep(data, grid, rs_periods=("3m",), workers=None):
+    """파라미터 그리드 전 조합 백테스트. EV 내림차순 결과 반환.
+
+    grid: {_cfg 키: [값, ...]} (지정하지 않은 키는 현재 _cfg 값)
+    진입 파라미터 조합별 후보는 1회만 계산(1단계)하고, RS 기준/청산 규칙만 다른 조합은
+    그 후보를 공유해 청산 시뮬레이션만 수행(2단계). 두 단계 모두 프로세스 풀에서 실행.
+    """
+    bt_args_base = data["bt_args_base"]
+    keys = list(grid)
+    combos = []
+    for rs_name in rs_periods:
+        for values in product(*(grid[k] for k in keys)):
+            params = dict(_cfg, **dict(zip(keys, values)))
+            params["rs"] = rs_name
+            combos.append(params)
+
+    label_keys = (["rs"] if len(rs_periods) > 1 else []) + keys
+    entry_keys = sorted({tuple(c[k] for k in ENTRY_CFG_KEYS) for c in combos})
+    workers = workers or max(1, cpu_count() - 1)
+    print(f"\n  [sweep] {len(combos)} combinations, {len(entry_keys)} entry settings, {workers} workers")
+
+    t0 = time_mod.time()
+    # 가격/52주 레벨은 공유 메모리에 한 벌만 두고 워커에는 spec 과 인덱스만 넘김 (spawn 에서도 pickle 복사 없음)
+    arrays = sweep_columns(bt_args_base)
+    blocks, spec = share_arrays(arrays)
+    del arrays
+    cand_blocks = []
+    try:
+        # 1단계: 진입 파라미터별 후보 (인터랙티브 캐시에 있으면 재사용)
+        bases = {}
+        missing = []
+        for entry_key in entry_keys:
+            base = _cache_get(("base",) + entry_key)
+            if base is not None:
+                bases[entry_key] = base
+            else:
+                missing.append(dict(zip(ENTRY_CFG_KEYS, entry_key)))
+        if missing:
+            with Pool(min(workers, len(missing)), initializer=_init_sweep_worker, initargs=(spec,)) as pool:
+                for entry_cfg, base in pool.imap_unordered(_sweep_entry, missing):
+                    entry_key = tuple(entry_cfg[k] for k in ENTRY_CFG_KEYS)
+                    bases[entry_key] = base
+                    _cache_put(("base",) + entry_key, base)
+        print(f"  [sweep] entry candidates: {len(missing)} computed, "
+              f"{len(entry_keys) - len(missing)} cached ({time_mod.time() - t0:.0f}s)", flush=True)
+
+        # 2단계: RS 필터는 부모에서 (진입/RS 조합별 1회), 청산 시뮬레이션은 워커에서.
+        # 필터된 후보도 공유 메모리 평탄화 배열로 두고 작업에는 키 번호만 실음.
+        key_nos = {}
+        filtered = []
+        tasks = []
+        for params in combos:
+            entry_key = tuple(params[k] for k in ENTRY_CFG_KEYS)
+            rs_key = (params["rs"], params["rs_threshold"]) + entry_key
+            if rs_key not in key_nos:
+                key_nos[rs_key] = len(filtered)
+                filtered.append(rs_filter(bt_args_base, bases[entry_key],
+                                          RS_MAP[params["rs"]], params["rs_threshold"]))
+            tasks.append((params, key_nos[rs_key]))
+        cand_blocks, cand_spec = share_arrays(candidate_columns(filtered))
+        del filtered
+
+        # mcap 필터/통계는 부모에서 (시총 이력을 워커로 복사하지 않음)
+        results = []
+        with Pool(workers, initializer=_init_sweep_worker, initargs=({**spec, **cand_spec},)) as pool:
+            for params, trades in pool.imap_unordered(_sweep_exit, tasks):
+                trades, _ = filter_by_mcap(trades, data["mcap_map"], data["has_mcap_data"], params["mcap_min"])
+                stats = _calc_stats(trades)
+                results.append((params, stats))
+                if stats:
+                    print(f"  [sweep {len(results)}/{len(tasks)}] EV {stats['ev']:>+6.2f}%  "
+                          f"N={stats['closed']:<5} | {_sweep_label(params, label_keys)}", flush=True)
+                else:
+                    print(f"  [sweep {len(results)}/{len(tasks)}] no trades | "
+                          f"{_sweep_label(params, label_keys)}", flush=True)
+    finally:
+        release_arrays(blocks + cand_blocks)
+
+    results = [(p, st) for p, st in results if st]
+    results.sort(key=lambda r: r[1]["ev"], reverse=True)
+    print_sweep_results(results, label_keys, time_mod.time() - t0)
+    return results
+
+
+def print_sweep_results(results, label_keys, elapsed):
+    """스윕 결과표 (EV 내림차순, 상위 SWEEP_TOP_N 개)"""
+    print(f"\n{'='*110}")
+    print(f"  SWEEP RESULTS  ({len(results)} combinations with trades, {elapsed:.0f}s)")
+    print(f"{'='*110}")
+    top = results[:SWEEP_TOP_N]
+    width = max([len(_sweep_label(p, label_keys)) for p, _ in top] + [6])
+    print(f"  {'#':>3}  {'Params':<{width}} {'N':>5}  {'Win%':>6}  {'AvgRet':>8}  {'P/L':>5}  {'EV':>7}  {'Hold':>6}")
+    print(f"  {'-'*(width + 56)}")
+    for rank, (params, s) in enumerate(top, 1):
+        print(f"  {rank:>3}  {_sweep_label(params, label_keys):<{width}} {s['closed']:>5}  {s['win_rate']:>5.1f}%  "
+              f"{s['avg_ret']:>+7.2f}%  {s['pl_ratio']:>5.2f}  {s['ev']:>+6.2f}%  {s['avg_hold']:>5.1f}d")
+
+
 def interactive_mode(data):
     """인터랙티브 모드: 파라미터 변경 후 재테스트."""
     global _cfg
@@ -594,10 +958,13 @@ def interactive_mode(data):
         print(f"    stop_loss       = {_cfg['stop_loss_pct']}%")
         print(f"    trailing_stop   = {_cfg['trailing_stop_pct']}%")
         print(f"    mcap_min        = ${_cfg['mcap_min']/1e9:.0f}B")
+        print(f"    (진입 후보 캐시 {len(_candidate_cache)}/{CANDIDATE_CACHE_SIZE})")
         print()
         print("  명령어:")
         print("    set <key> <value>   — 파라미터 변경 (예: set rs_threshold 80)")
-        print("    run <rs_period>     — 테스트 실행 (1m / 3m / 6m / all)")
+        print("    run <rs_period> [rs,...] — 테스트 실행 (1m / 3m / 6m / all, 예: run all 60,70,80)")
+        print("    sweep <key>=<values> ... [rs=3m] [workers=N]")
+        print("                        — 그리드 스윕 (예: sweep rs_threshold=60,70,80 stop_loss_pct=5:9:1)")
         print("    compare             — 지금까지 결과 비교표")
         print("    clear               — 비교표 초기화")
         print("    q                   — 종료")
@@ -622,10 +989,7 @@ def interactive_mode(data):
             val_str = parts[2]
             if key in _cfg:
                 try:
-                    if isinstance(_cfg[key], float):
-                        _cfg[key] = float(val_str)
-                    elif isinstance(_cfg[key], int):
-                        _cfg[key] = int(val_str)
+                    _cfg[key] = parse_cfg_value(key, val_str)
                     print(f"    -> {key} = {_cfg[key]}")
                 except ValueError:
                     print(f"    -> 잘못된 값: {val_str}")
@@ -643,19 +1007,44 @@ def interactive_mode(data):
                 print(f"    -> 잘못된 RS 기간: {period} (1m / 3m / 6m / all)")
                 continue
 
-            for rs_name, rs_col_idx in rs_list:
-                label = (f"RS {rs_name.upper()} "
-                         f"(rs>={_cfg['rs_threshold']} vol>={_cfg['volume_ratio_min']}x "
-                         f"bo={_cfg['breakout_lookback']}d)")
-                t_start = time_mod.time()
-                stats = run_backtest_for_rs(
-                    data["stocks"], data["bt_args_base"], rs_col_idx, label,
-                    data["earnings_map"], data["mcap_map"], data["has_mcap_data"],
-                )
-                elapsed = time_mod.time() - t_start
-                print(f"\n  Completed in {elapsed:.0f}s")
-                if stats:
-                    all_summary.append((label, stats))
+            try:
+                thresholds = ([int(v) for v in parts[2].split(",")] if len(parts) >= 3
+                              else [_cfg["rs_threshold"]])
+            except ValueError:
+                print(f"    -> 잘못된 RS 기준: {parts[2]} (예: 60,70,80)")
+                continue
+
+            # RS 기간 × 기준 조합을 1패스로 실행
+            variants = [
+                (rs_col_idx, rs_threshold,
+                 f"RS {rs_name.upper()} (rs>={rs_threshold} vol>={_cfg['volume_ratio_min']}x "
+                 f"bo={_cfg['breakout_lookback']}d)")
+                for rs_name, rs_col_idx in rs_list
+                for rs_threshold in thresholds
+            ]
+            all_summary.extend(run_rs_variants(data, variants))
+
+        elif action == "sweep" and len(parts) >= 2:
+            grid = {}
+            rs_periods = ["3m"]
+            workers = None
+            try:
+                for arg in parts[1:]:
+                    key, _, spec = arg.partition("=")
+                    if key == "rs":
+                        rs_periods = list(RS_MAP) if spec == "all" else spec.split(",")
+                    elif key == "workers":
+                        workers = int(spec)
+                    elif key in _cfg:
+                        grid[key] = parse_sweep_values(key, spec)
+                    else:
+                        raise ValueError(f"알 수 없는 키: {key}")
+                if any(p not in RS_MAP for p in rs_periods):
+                    raise ValueError(f"잘못된 RS 기간: {','.join(rs_periods)}")
+            except ValueError as e:
+                print(f"    -> {e}")
+                continue
+            run_sweep(data, grid, rs_periods, workers)
 
         elif action == "compare":
             print_comparison(all_summary)
@@ -13,6 +13,8 @@
 from collections import defaultdict
 import time as time_mod
 from db.connection import get_connection
+from services.price_cache import FULL_COLUMNS
+from services.price_stream import load_price_rows
 
 # 튜플 인덱스 (bs_daily_prices 쿼리 결과)
 IDX_DATE = 0
@@ -41,15 +43,7 @@ def load_data():
     t0 = time_mod.time()
 
     print("[1/2] Loading prices (with RS)...", flush=True)
-    cur.execute("""
-        SELECT stock_id, trade_date, open_price, high_price, low_price, close_price, volume,
-               ma50, ma150, ma200, rs_1m, rs_3m, rs_6m
-        FROM bs_daily_prices
-        ORDER BY stock_id, trade_date
-    """)
-    all_prices = defaultdict(list)
-    for row in cur:
-        all_prices[row[0]].append(row[1:])
+    all_prices = load_price_rows(conn, FULL_COLUMNS)
     t1 = time_mod.time()
     total_candles = sum(len(v) for v in all_prices.values())
     print(f"  -> {len(all_prices)} stocks, {total_candles:,} candles ({t1-t0:.0f}s)")
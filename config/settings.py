@@ -23,6 +23,11 @@ class Settings(BaseSettings):
 
     # FMP API
     FMP_API_KEY: str = ""
+    FMP_CALLS_PER_MIN: int = 300     # 플랜별 분당 호출 한도
+    FMP_MAX_IN_FLIGHT: int = 10      # 동시 진행 요청 수
+
+    # 외부 API 공용 HTTP 세션 (호스트별 keep-alive 커넥션 풀 크기)
+    HTTP_POOL_SIZE: int = 20
 
     # theme_analyzer SQLite 경로
     THEME_DB_PATH: str = "c:/theme_analyzer/data/theme_analyzer.db"
@@ -36,6 +41,7 @@ class Settings(BaseSettings):
     VOLUME_RATIO_MIN: float = 2.0
     VOLUME_RATIO_DAYS: int = 10
     LOOKBACK_MONTHS: int = 120
+    SCAN_WINDOW_BARS: int = 300  # 돌파 스캔 시 종목별로 읽는 최근 거래일 수
 
     # 실적 필터
     FUNDAMENTAL_FILTER: bool = True
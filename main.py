@@ -6,6 +6,7 @@ Usage:
     python main.py collect-symbols   # 미국 전 종목 목록 수집
     python main.py collect-prices    # 주가 수집 (FMP → yfinance → KIS 폴백)
     python main.py collect-prices --reset  # 기존 데이터 삭제 후 재수집
+    python main.py collect-prices --row-insert  # 행 단위 INSERT (bulk 처리량 비교용)
     python main.py collect-financials      # 재무 데이터 수집 (FMP)
     python main.py collect-financials --include-delisted  # 상장폐지 종목 포함
     python main.py collect-marketcap       # 역사적 시가총액 수집 (FMP)
@@ -13,14 +14,22 @@ Usage:
     python main.py calculate-ma           # 이동평균선(MA50/150/200) 계산
     python main.py calculate-rs           # 상대강도(RS) 계산 (최근일)
     python main.py calculate-rs --backfill # RS 전체 백필
+    python main.py calculate-rs --backfill --memory-budget 2048  # float32 날짜 블록 백필 (MB 예산)
+    python main.py build-cache            # 가격 캐시(컬럼형 .npy) 전체 생성
+    python main.py refresh-cache          # 가격 캐시 증분 갱신 (워터마크 이후 + 최근 MA/RS)
     python main.py collect-industry       # FMP에서 industry 수집
     python main.py sync-themes       # theme_analyzer에서 테마 동기화
     python main.py scan              # 돌파 패턴 스캔
     python main.py backtest          # 백테스트
     python main.py backtest --include-delisted  # 생존편향 제거 백테스트
+    python main.py backtest --stop-loss 5 --trailing-stop 15  # 청산 규칙만 변경 (저장된 신호 테이블 재사용)
+    python main.py backtest --mcap-min 1e10 --mcap-max 5e11   # 시가총액 범위 진입 필터
+    python main.py backtest --rebuild-signals   # 신호 테이블 재계산
     python main.py backtest-minervini         # 미너비니 트렌드 템플릿 백테스트
     python main.py backtest-rotation          # 산업 로테이션 백테스트
     python main.py backtest-breakout          # 차트 돌파 백테스트 (주가 범위별)
+    python main.py optimize-breakout          # 차트 돌파 파라미터 최적화 (successive halving)
+    python main.py optimize-breakout --eta 3 --min-sample 300 --seed 0
     python main.py full              # 위 전체 순차 실행
     python main.py status            # DB 현황 조회
 """
@@ -74,7 +83,7 @@ def run_collect_symbols():
         conn.close()
 
 
-def run_collect_prices(reset=False):
+def run_collect_prices(reset=False, bulk=True):
     from services.price_collector import collect_prices
     from services.kis_service import KISClient
     conn = get_connection()
@@ -88,7 +97,7 @@ def run_collect_prices(reset=False):
         print("[주가 초기화] 완료")
     kis = KISClient()
     try:
-        collect_prices(conn, kis_client=kis)
+        collect_prices(conn, kis_client=kis, bulk=bulk)
     finally:
         conn.close()
 
@@ -138,11 +147,35 @@ def run_calculate_ma():
         conn.close()
 
 
-def run_calculate_rs(backfill=False):
+def run_calculate_rs(backfill=False, memory_budget_mb=None):
     from services.rs_calculator import calculate_rs
+    if memory_budget_mb is not None and not backfill:
+        print("[RS] --memory-budget 는 --backfill 과 함께만 사용 가능 (최근일 계산은 전체 이력을 로드하지 않음)")
+        return
+    if memory_budget_mb is not None and memory_budget_mb <= 0:
+        print(f"[RS] --memory-budget 는 양수(MB)여야 함: {memory_budget_mb}")
+        return
+    conn = get_connection()
+    try:
+        calculate_rs(conn, backfill=backfill, memory_budget_mb=memory_budget_mb)
+    finally:
+        conn.close()
+
+
+def run_build_cache():
+    from services.price_cache import build_cache
     conn = get_connection()
     try:
-        calculate_rs(conn, backfill=backfill)
+        build_cache(conn)
+    finally:
+        conn.close()
+
+
+def run_refresh_cache():
+    from services.price_cache import refresh_cache
+    conn = get_connection()
+    try:
+        refresh_cache(conn)
     finally:
         conn.close()
 
@@ -158,11 +191,16 @@ def run_collect_industry():
         conn.close()
 
 
-def run_backtest_cmd(include_delisted=False):
-    from services.backtester import run_backtest
+def run_backtest_cmd(include_delisted=False, stop_loss_pct=None, trailing_stop_pct=None, **kwargs):
+    from services.backtester import run_backtest, STOP_LOSS_PCT, TRAILING_STOP_PCT
     conn = get_connection()
     try:
-        run_backtest(conn, include_delisted=include_delisted)
+        run_backtest(
+            conn, include_delisted=include_delisted,
+            stop_loss_pct=STOP_LOSS_PCT if stop_loss_pct is None else stop_loss_pct,
+            trailing_stop_pct=TRAILING_STOP_PCT if trailing_stop_pct is None else trailing_stop_pct,
+            **kwargs,
+        )
     finally:
         conn.close()
 
@@ -182,6 +220,11 @@ def run_backtest_breakout():
     breakout_main()
 
 
+def run_optimize_breakout(**kwargs):
+    from optimize_breakout import main as optimize_main
+    optimize_main(**{k: v for k, v in kwargs.items() if v is not None})
+
+
 def show_status():
     """DB 현황 조회"""
     conn = get_connection()
@@ -254,6 +297,15 @@ def show_status():
     conn.close()
 
 
+def _flag_value(flags, name, cast=str, default=None):
+    """'--name 값' 형태 플래그 값 (없으면 default)"""
+    if name in flags:
+        i = flags.index(name)
+        if i + 1 < len(flags):
+            return cast(flags[i + 1])
+    return default
+
+
 def main():
     if len(sys.argv) < 2:
         print(__doc__)
@@ -265,18 +317,37 @@ def main():
     commands = {
         "init": init_db,
         "collect-symbols": run_collect_symbols,
-        "collect-prices": lambda: run_collect_prices(reset="--reset" in flags),
+        "collect-prices": lambda: run_collect_prices(
+            reset="--reset" in flags, bulk="--row-insert" not in flags,
+        ),
         "collect-financials": lambda: run_collect_financials(include_delisted="--include-delisted" in flags),
         "collect-marketcap": lambda: run_collect_marketcap(include_delisted="--include-delisted" in flags),
         "calculate-ma": run_calculate_ma,
-        "calculate-rs": lambda: run_calculate_rs(backfill="--backfill" in flags),
+        "calculate-rs": lambda: run_calculate_rs(
+            backfill="--backfill" in flags,
+            memory_budget_mb=_flag_value(flags, "--memory-budget", int),
+        ),
+        "build-cache": run_build_cache,
+        "refresh-cache": run_refresh_cache,
         "collect-industry": run_collect_industry,
         "sync-themes": run_sync_themes,
         "scan": run_scan,
-        "backtest": lambda: run_backtest_cmd(include_delisted="--include-delisted" in flags),
+        "backtest": lambda: run_backtest_cmd(
+            include_delisted="--include-delisted" in flags,
+            stop_loss_pct=_flag_value(flags, "--stop-loss", float),
+            trailing_stop_pct=_flag_value(flags, "--trailing-stop", float),
+            mcap_min=_flag_value(flags, "--mcap-min", float),
+            mcap_max=_flag_value(flags, "--mcap-max", float),
+            rebuild_signals="--rebuild-signals" in flags,
+        ),
         "backtest-minervini": run_backtest_minervini,
         "backtest-rotation": run_backtest_rotation,
         "backtest-breakout": run_backtest_breakout,
+        "optimize-breakout": lambda: run_optimize_breakout(
+            eta=_flag_value(flags, "--eta", int),
+            min_sample=_flag_value(flags, "--min-sample", int),
+            seed=_flag_value(flags, "--seed", int),
+        ),
         "status": show_status,
         "full": lambda: (
             run_collect_symbols(),
@@ -0,0 +1,210 @@
+"""
+차트 돌파 백테스트 파라미터 최적화 (Successive Halving).
+
+backtest_breakout 의 진입/청산 상수(TUNABLE_PARAMS) 그리드를 전부 전 종목으로 돌리면
+조합 수 × 전 종목 비용이 들기 때문에 단계적으로 후보를 줄임:
+1. 모든 후보를 작은 종목 표본(MIN_SAMPLE_STOCKS 종목)으로 평가
+2. EV 상위 1/ETA 만 다음 단계로 승급, 표본은 전 종목까지 기하급수적으로 확대
+3. 마지막 단계(후보 약 FINAL_CANDIDATES 개)는 전 종목 (= backtest_breakout 과 같은 결과)
+
+표본은 고정 시드로 섞은 종목 순서의 앞부분이라 단계가 올라갈수록 이전 표본을 포함함.
+연산량은 평가한 (종목 × 봉) 수로 세고, 전체 그리드를 전 종목으로 돌렸을 때와 비교해 출력.
+
+가격은 backtest_breakout 과 같은 공유 메모리 버퍼를 쓰고, 워커는 (후보 파라미터, 종목 묶음) 단위로 실행.
+"""
+
+import math
+import random
+import time as time_mod
+from itertools import product
+from multiprocessing import Pool, cpu_count
+
+import pymysql
+
+import backtest_breakout as bb
+from services.price_stream import load_price_columns
+from services.shared_arrays import share_arrays, release_arrays
+
+# 탐색 공간 (현재 backtest_breakout 기본값 포함)
+SEARCH_SPACE = {
+    "RISE_MIN_PCT": [100.0, 150.0, 200.0, 300.0],
+    "CONSOL_MIN_DAYS": [5, 10, 20],
+    "CONSOL_MAX_DAYS": [65, 130],
+    "VOLUME_RATIO_MIN": [1.5, 2.0, 3.0],
+    "STOP_LOSS_PCT": [5.0, 7.0, 10.0],
+    "TRAILING_STOP_PCT": [15.0, 20.0, 25.0],
+    "MA_EXIT_DAYS": [10, 20, 50],
+}
+
+ETA = 3                  # 단계마다 상위 1/ETA 승급
+MIN_SAMPLE_STOCKS = 300  # 첫 단계 표본 종목 수
+FINAL_CANDIDATES = 9     # 전 종목으로 평가할 마지막 단계 후보 수 (이상)
+MIN_TRADES = 20          # 이보다 청산 거래가 적은 후보는 순위에서 뒤로
+SAMPLE_SEED = 0
+JOB_STOCKS = 50          # 워커 작업 1건당 종목 수
+TOP_N = 10
+
+
+def grid_candidates(space):
+    """탐색 공간 → 후보 파라미터 목록 (CONSOL_MIN_DAYS >= CONSOL_MAX_DAYS 조합 제외)"""
+    keys = list(space)
+    candidates = []
+    for values in product(*(space[k] for k in keys)):
+        params = dict(zip(keys, values))
+        if params.get("CONSOL_MIN_DAYS", bb.CONSOL_MIN_DAYS) >= params.get("CONSOL_MAX_DAYS", bb.CONSOL_MAX_DAYS):
+            continue
+        candidates.append(dict(bb.current_params(), **params))
+    return candidates
+
+
+def plan_rungs(n_candidates, n_stocks, eta=ETA, min_sample=MIN_SAMPLE_STOCKS):
+    """단계별 (후보 수, 종목 표본 비율). 비율은 min_sample/n_stocks 에서 1.0 까지 등비로 증가"""
+    if eta < 2 or min_sample < 1:
+        raise ValueError(f"eta >= 2, min_sample >= 1 required (eta={eta}, min_sample={min_sample})")
+    last = int(math.log(max(n_candidates / FINAL_CANDIDATES, 1), eta) + 1e-9)
+    first = min(1.0, min_sample / max(n_stocks, 1))
+    return [
+        (math.ceil(n_candidates / eta ** k), first ** (1 - k / last) if last else 1.0)
+        for k in range(last + 1)
+    ]
+
+
+def _bars(tasks):
+    """작업 목록의 평가 봉 수 (연산량 단위)"""
+    return sum(length + d_length - start_idx for _, _, length, _, d_length, start_idx in tasks)
+
+
+def _run_job(job):
+    """워커: 후보 파라미터 1세트로 종목 묶음 백테스트"""
+    cand_idx, params, tasks = job
+    bb.set_params(params)
+    trades = []
+    for task in tasks:
+        trades.extend(bb.backtest_stock(task))
+    return cand_idx, trades
+
+
+def _score(stats):
+    """순위 키: 거래 수가 충분한 후보 우선, 그다음 EV"""
+    if stats is None:
+        return (False, float("-inf"))
+    return (stats["closed"] >= MIN_TRADES, stats["ev"])
+
+
+def _label(params):
+    return (f"rise>={params['RISE_MIN_PCT']:.0f}% consol {params['CONSOL_MIN_DAYS']}-{params['CONSOL_MAX_DAYS']}d "
+            f"vol>={params['VOLUME_RATIO_MIN']}x SL {params['STOP_LOSS_PCT']}% "
+            f"trail {params['TRAILING_STOP_PCT']}% MA{params['MA_EXIT_DAYS']}")
+
+
+def successive_halving(pool, tasks_by_consol, stock_rank, mcap_map, candidates,
+                       eta=ETA, min_sample=MIN_SAMPLE_STOCKS):
+    """Successive halving 실행. 마지막 단계(전 종목) 결과 [(params, stats)] 와 연산량 반환.
+
+    tasks_by_consol: {CONSOL_MAX_DAYS: build_tasks 결과} (시작 인덱스가 CONSOL_MAX_DAYS 에 의존)
+    stock_rank: {stock_id: 섞은 순서} — 표본 = rank < 비율 × 종목 수
+    """
+    n_stocks = len(stock_rank)
+    rungs = plan_rungs(len(candidates), n_stocks, eta, min_sample)
+    full_cost = sum(_bars(tasks_by_consol[p["CONSOL_MAX_DAYS"]]) for p in candidates)
+    spent = 0
+
+    survivors = list(range(len(candidates)))
+    results = []
+    for k, (n_keep, fraction) in enumerate(rungs):
+        t0 = time_mod.time()
+        survivors = survivors[:n_keep]
+        sample_size = max(1, int(round(n_stocks * fraction)))
+
+        jobs = []
+        for cand_idx in survivors:
+            params = candidates[cand_idx]
+            tasks = [t for t in tasks_by_consol[params["CONSOL_MAX_DAYS"]] if stock_rank[t[0]] < sample_size]
+            spent += _bars(tasks)
+            for i in range(0, len(tasks), JOB_STOCKS):
+                jobs.append((cand_idx, params, tasks[i:i + JOB_STOCKS]))
+
+        trades_by_cand = {cand_idx: [] for cand_idx in survivors}
+        for cand_idx, trades in pool.imap(_run_job, jobs):  # 종목 순서 유지 (backtest_breakout 과 같은 통계)
+            trades_by_cand[cand_idx].extend(trades)
+
+        scored = []
+        for cand_idx in survivors:
+            trades, _, _ = bb.filter_by_mcap(trades_by_cand[cand_idx], mcap_map)
+            scored.append((cand_idx, bb._calc_stats(trades)))
+        scored.sort(key=lambda r: _score(r[1]), reverse=True)
+        survivors = [cand_idx for cand_idx, _ in scored]
+        results = [(candidates[cand_idx], stats) for cand_idx, stats in scored]
+
+        best = scored[0][1] if scored else None
+        best_str = f"best EV {best['ev']:+.2f}% (N={best['closed']})" if best else "no trades"
+        print(f"  [rung {k + 1}/{len(rungs)}] {len(survivors)} candidates x {sample_size:,} stocks "
+              f"({fraction * 100:.1f}%) -> {best_str} ({time_mod.time() - t0:.0f}s)", flush=True)
+
+    return results, spent, full_cost
+
+
+def main(eta=ETA, min_sample=MIN_SAMPLE_STOCKS, seed=SAMPLE_SEED):
+    # 데이터 로드 전에 검증 (eta=1 은 log 밑이 1, eta/min_sample <= 0 은 단계 계산 불가)
+    if eta < 2:
+        print(f"[optimize] --eta must be >= 2 (got {eta})")
+        return []
+    if min_sample < 1:
+        print(f"[optimize] --min-sample must be >= 1 (got {min_sample})")
+        return []
+
+    t0 = time_mod.time()
+    candidates = grid_candidates(SEARCH_SPACE)
+
+    print("=" * 110)
+    print("Breakout Backtest Optimizer (successive halving)")
+    print(f"Search: {len(candidates)} candidates over {', '.join(SEARCH_SPACE)}")
+    print(f"Eta={eta}, first-rung sample >= {min_sample} stocks, seed={seed}")
+    print("=" * 110)
+
+    conn = pymysql.connect(**bb.DB_CONFIG)
+    cur = conn.cursor()
+    print("[1/2] Loading prices...", flush=True)
+    prices = load_price_columns(conn, bb.PRICE_COLUMNS)
+    print("[2/2] Loading historical market cap...", flush=True)
+    mcap_map = bb.load_mcap_map(cur)
+    conn.close()
+
+    tasks_by_consol = {
+        consol: bb.build_tasks(prices, min_start=consol + bb.VOLUME_AVG_DAYS)
+        for consol in sorted({p["CONSOL_MAX_DAYS"] for p in candidates})
+    }
+    stock_ids = sorted({t[0] for tasks in tasks_by_consol.values() for t in tasks})
+    random.Random(seed).shuffle(stock_ids)
+    stock_rank = {sid: rank for rank, sid in enumerate(stock_ids)}
+
+    blocks, spec = share_arrays(bb.shared_price_columns(prices))
+    del prices
+
+    num_workers = max(1, cpu_count() - 1)
+    print(f"  -> {len(stock_ids):,} stocks, {num_workers} CPU cores")
+
+    try:
+        with Pool(num_workers, initializer=bb.init_worker, initargs=(spec,)) as pool:
+            results, spent, full_cost = successive_halving(
+                pool, tasks_by_consol, stock_rank, mcap_map, candidates, eta, min_sample,
+            )
+    finally:
+        release_arrays(blocks)
+
+    print(f"\n{'='*110}")
+    print(f"  TOP {TOP_N} (full universe)  |  total {time_mod.time() - t0:.0f}s")
+    print(f"{'='*110}")
+    bb._print_table_header()
+    for params, stats in results[:TOP_N]:
+        print(f"  {_label(params)}")
+        bb._print_stat_row("", stats)
+
+    saved = (1 - spent / full_cost) * 100 if full_cost else 0
+    print(f"\n  Compute: {spent:,} stock-bars evaluated vs {full_cost:,} for the full grid "
+          f"({saved:.1f}% saved, {full_cost / spent if spent else 0:.1f}x less)")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -11,14 +11,13 @@
     3. industry 정보 수집 (없는 종목만)
     4. MA 계산 (전종목)
     5. RS 계산 (최근일 or 전체 백필)
+    6. 가격 캐시 갱신 (build-cache 로 만든 캐시가 있을 때만, 증분)
 """
 
 import sys
-import time
-import requests
 import pymysql
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from services.fmp_fetcher import fetch_all
 from db.connection import get_connection
 from config.settings import Settings
 
@@ -84,24 +83,6 @@ def collect_today_prices(conn, api_key):
     return candles
 
 
-def _fetch_profile(api_key, ticker):
-    """FMP profile에서 industry 가져오기"""
-    try:
-        resp = requests.get(
-            "https://financialmodelingprep.com/stable/profile",
-            params={"symbol": ticker, "apikey": api_key},
-            timeout=15,
-        )
-        if resp.status_code == 200:
-            data = resp.json()
-            if data:
-                item = data[0] if isinstance(data, list) else data
-                return item.get("industry")
-    except Exception:
-        pass
-    return None
-
-
 def collect_industry(conn, api_key):
     """industry 정보가 없는 종목만 FMP에서 수집"""
     cursor = conn.cursor(pymysql.cursors.DictCursor)
@@ -116,37 +97,25 @@ def collect_industry(conn, api_key):
     total = len(stocks)
     print(f"[산업 수집] {total}개 종목 industry 수집 시작...")
     update_count = 0
-    BATCH = 50
-    WORKERS = 10
-
-    for batch_start in range(0, total, BATCH):
-        batch = stocks[batch_start:batch_start + BATCH]
-
-        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
-            futures = {
-                executor.submit(_fetch_profile, api_key, s["ticker"]): s
-                for s in batch
-            }
-            for future in as_completed(futures):
-                s = futures[future]
-                try:
-                    industry = future.result()
-                    if industry:
-                        cursor.execute(
-                            "UPDATE bs_stocks SET industry = %s WHERE id = %s",
-                            (industry, s["id"]),
-                        )
-                        update_count += 1
-                except Exception:
-                    pass
-
-        conn.commit()
-        print(
-            f"  진행: {min(batch_start + BATCH, total)}/{total} "
-            f"(업데이트 {update_count}개)",
-            flush=True,
-        )
-        time.sleep(0.3)
+    done = 0
+
+    def on_result(s, data, err):
+        nonlocal update_count, done
+        done += 1
+        rec = (data[0] if data else None) if isinstance(data, list) else data
+        industry = rec.get("industry") if isinstance(rec, dict) else None
+        if industry:
+            cursor.execute(
+                "UPDATE bs_stocks SET industry = %s WHERE id = %s",
+                (industry, s["id"]),
+            )
+            update_count += 1
+        if done % 50 == 0:
+            conn.commit()
+
+    jobs = [(s, "/stable/profile", {"symbol": s["ticker"]}) for s in stocks]
+    fetch_all(jobs, api_key, on_result, timeout=15, label="산업")
+    conn.commit()
 
     print(f"[산업 수집] 완료: {update_count}개 종목 industry 업데이트")
 
@@ -187,14 +156,14 @@ def main():
     try:
         # 1. 마이그레이션
         print("=" * 50)
-        print("[1/5] DB 마이그레이션")
+        print("[1/6] DB 마이그레이션")
         print("=" * 50)
         migrate(conn)
 
         # 2. 주가 수집 (이미 최신이면 스킵)
         print()
         print("=" * 50)
-        print("[2/5] 주가 수집 (FMP)")
+        print("[2/6] 주가 수집 (FMP)")
         print("=" * 50)
         if _needs_price_update(conn):
             collect_today_prices(conn, settings.FMP_API_KEY)
@@ -206,14 +175,14 @@ def main():
         # 3. industry 수집
         print()
         print("=" * 50)
-        print("[3/5] Industry 정보 수집")
+        print("[3/6] Industry 정보 수집")
         print("=" * 50)
         collect_industry(conn, settings.FMP_API_KEY)
 
         # 4. MA 계산 (이미 최신이면 스킵)
         print()
         print("=" * 50)
-        print("[4/5] 이동평균선 계산 (MA50/150/200)")
+        print("[4/6] 이동평균선 계산 (MA50/150/200)")
         print("=" * 50)
         if _needs_ma_update(conn) or backfill:
             from services.ma_calculator import calculate_moving_averages
@@ -227,11 +196,24 @@ def main():
         # 5. RS 계산
         print()
         print("=" * 50)
-        print("[5/5] 상대강도(RS) 계산")
+        print("[5/6] 상대강도(RS) 계산")
         print("=" * 50)
         from services.rs_calculator import calculate_rs
         calculate_rs(conn, backfill=backfill)
 
+        # 6. 가격 캐시 갱신 (백필 시 과거 MA/RS 가 바뀌므로 전체 재생성)
+        print()
+        print("=" * 50)
+        print("[6/6] 가격 캐시 갱신")
+        print("=" * 50)
+        from services.price_cache import cache_exists, build_cache, refresh_cache
+        if not cache_exists():
+            print("  캐시 없음 → 스킵 (python main.py build-cache 로 생성)")
+        elif backfill:
+            build_cache(conn)
+        else:
+            refresh_cache(conn)
+
     finally:
         conn.close()
 
@@ -10,12 +10,13 @@
 3. 횡보 후 10일 평균 거래량 200% 이상 동반 신고가 돌파
 4. 돌파 첫날 종가 매수
 
-성능 최적화: 전체 가격 메모리 일괄 로드
+성능 최적화: 가격 캐시/DB 에서 종목 단위 스트리밍 (전체 가격을 메모리에 들고 있지 않음)
 """
 
 import pymysql
-from collections import defaultdict
 import time
+from services.price_cache import OHLCV_COLUMNS
+from services.price_stream import iter_price_rows
 
 DB_CONFIG = {
     "host": "localhost",
@@ -158,9 +159,9 @@ def scan():
     print(f"  4. 거래량 {VOLUME_RATIO_MIN}x+ 동반 돌파 (첫날만)")
     print()
 
-    # ── 전체 가격 메모리 로드 (성능 최적화) ──
+    # ── 가격 로드 + 스캔 (종목 단위 스트리밍) ──
     t0 = time.time()
-    print("가격 데이터 로딩 중...", flush=True)
+    print("가격 데이터 스캔 중...", flush=True)
 
     cur.execute("""
         SELECT s.id, s.ticker, s.name, s.market_cap
@@ -170,27 +171,15 @@ def scan():
     """)
     stocks = {row[0]: {"ticker": row[1], "name": row[2], "market_cap": row[3]} for row in cur.fetchall()}
 
-    cur.execute("""
-        SELECT stock_id, trade_date, open_price, high_price, low_price, close_price, volume
-        FROM bs_daily_prices
-        WHERE stock_id IN (SELECT id FROM bs_stocks WHERE is_active = 1)
-        ORDER BY stock_id, trade_date
-    """)
-
-    all_prices = defaultdict(list)
-    for row in cur:
-        stock_id = row[0]
-        all_prices[stock_id].append(row[1:])  # (date, open, high, low, close, volume)
-
-    t1 = time.time()
-    print(f"로딩 완료: {len(all_prices)}개 종목, {sum(len(v) for v in all_prices.values()):,}개 캔들 ({t1-t0:.1f}초)")
-    print()
+    # 전체 가격을 튜플로 들고 있지 않고 한 종목씩 (date, open, high, low, close, volume)
+    price_rows = iter_price_rows(conn, OHLCV_COLUMNS, active_only=True)
 
-    # ── 스캔 ──
     signals = []
-    total = len(all_prices)
+    total = len(stocks)
+    candles = 0
 
-    for i, (stock_id, prices) in enumerate(all_prices.items()):
+    for i, (stock_id, prices) in enumerate(price_rows):
+        candles += len(prices)
         if i % 1000 == 0:
             print(f"  스캔: {i}/{total}...", flush=True)
 
@@ -217,7 +206,7 @@ def scan():
 
     t2 = time.time()
     print(f"\n{'='*90}")
-    print(f"스캔 완료! 조건 충족: {len(signals)}개  (기준일: {latest_date}, 소요: {t2-t0:.1f}초)")
+    print(f"스캔 완료! 조건 충족: {len(signals)}개  (기준일: {latest_date}, {candles:,}개 캔들, 소요: {t2-t0:.1f}초)")
     print(f"{'='*90}\n")
 
     if not signals:
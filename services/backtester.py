@@ -9,12 +9,23 @@
   재돌파 시 새 lot으로 매수 가능.
 
 매수 필터: 시가총액 $10B ~ $500B (섹터 강도 계산은 전체 종목 대상)
+
+2단계 구성: 돌파 신호 테이블(날짜, 종목, 점수, 종가)을 탐지 설정별로 한 번 계산해
+data/signals/ 에 저장하고, 시뮬레이터는 그 테이블만 재생 → 청산 규칙 실험은 재스캔 없음.
 """
 
+import hashlib
+import json
+import os
+import time
+import numpy as np
 import pymysql
 from collections import defaultdict
+from pathlib import Path
 from config.settings import Settings
-from services.breakout_scanner import check_breakout, score_breakout
+from services.breakout_scanner import breakout_series
+from services.price_cache import OHLCV_COLUMNS, load_price_cache, iter_cached_arrays
+from services.price_stream import iter_price_rows, iter_stock_arrays
 
 
 STOP_LOSS_PCT = 7.0
@@ -22,24 +33,23 @@ TRAILING_STOP_PCT = 20.0
 MCAP_MIN = 10_000_000_000    # $10B
 MCAP_MAX = 500_000_000_000   # $500B
 
+SIGNAL_DIR = Path(__file__).resolve().parent.parent / "data" / "signals"
+SIGNAL_COLUMNS = ["date", "stock_id", "score", "close"]
+# 신호 테이블을 바꾸는 탐지 설정 (이 값이 같으면 저장된 테이블 재사용)
+DETECTOR_SETTINGS = [
+    "HIGH_BREAKOUT_DAYS", "RISE_FROM_LOW_MIN_PCT", "RISE_FROM_LOW_MAX_PCT",
+    "CONSOLIDATION_MIN_DAYS", "CONSOLIDATION_MAX_RANGE_PCT",
+    "VOLUME_RATIO_MIN", "VOLUME_RATIO_DAYS",
+]
 
-def load_all_prices(conn):
-    """모든 주가 데이터를 메모리에 로드. {stock_id: [(date, o, h, l, c, v), ...]}"""
-    cursor = conn.cursor()
-    cursor.execute(
-        """SELECT stock_id, trade_date, open_price, high_price, low_price, close_price, volume
-           FROM bs_daily_prices ORDER BY stock_id, trade_date ASC"""
-    )
 
-    prices = defaultdict(list)
-    for row in cursor.fetchall():
-        sid = row[0]
-        prices[sid].append((
-            str(row[1]), float(row[2]), float(row[3]),
-            float(row[4]), float(row[5]), int(row[6])
-        ))
+def load_all_prices(conn):
+    """전 종목 주가를 종목 단위로 생성. (stock_id, [(date, o, h, l, c, v), ...])
 
-    return dict(prices)
+    로컬 가격 캐시(build-cache)가 있으면 캐시에서, 없으면 DB 스트리밍으로 읽음.
+    전체를 dict 로 들고 있지 않으므로 최대 메모리는 한 종목 분량.
+    """
+    return iter_price_rows(conn, OHLCV_COLUMNS, date_str=True)
 
 
 def load_stock_info(conn, include_delisted=False):
@@ -107,75 +117,147 @@ def check_fundamental(financials_list, signal_date, growth_years=1):
     return True
 
 
-def run_backtest(conn, include_delisted=False):
-    settings = Settings()
+# ── 1단계: 신호 테이블 (탐지 설정별 1회 계산 후 저장) ──────────
 
-    print("[backtest] loading data...")
-    all_prices = load_all_prices(conn)
-    stock_info = load_stock_info(conn, include_delisted=include_delisted)
-    sector_db = load_sectors_from_db(conn)
-    spy_prices = load_spy_prices(conn)
+def _detector_config(settings):
+    """신호 테이블 키에 들어가는 탐지 설정 (청산 규칙/시총 필터는 제외)"""
+    return {key: getattr(settings, key) for key in DETECTOR_SETTINGS}
 
-    # 실적 필터 데이터 로드
-    all_financials = {}
-    if settings.FUNDAMENTAL_FILTER:
-        all_financials = load_all_financials(conn)
-        fin_eligible = sum(1 for sid in all_financials if len(all_financials[sid]) >= 2)
-        print(f"  fundamentals: {len(all_financials)} stocks, {fin_eligible} with 2+ years")
-    if include_delisted:
-        print(f"  survivorship bias: OFF (delisted stocks included)")
 
-    # 거래일 목록 + 날짜→종목 역인덱스
-    all_dates = set()
-    stock_date_idx = {}
-    date_to_sids = defaultdict(list)
+def _price_watermark(conn):
+    """가격 데이터 버전 식별자 (캐시가 있으면 캐시 메타, 없으면 DB)
+
+    캐시 메타는 refresh_cache 가 행을 패치할 때마다 refreshed_at 이 바뀜.
+    DB 는 MAX(id)/MAX(trade_date) 만으로는 과거 행의 UPDATE 를 놓치므로 CHECKSUM TABLE 도 포함.
+    """
+    cache = load_price_cache(columns=[])
+    if cache is not None:
+        meta = cache["meta"]
+        return f"cache:{meta['rows']}:{meta['max_date']}:{meta.get('refreshed_at') or meta.get('built_at')}"
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(id), MAX(trade_date) FROM bs_daily_prices")
+    max_id, max_date = cursor.fetchone()
+    cursor.execute("CHECKSUM TABLE bs_daily_prices")
+    checksum = cursor.fetchone()[1]
+    return f"db:{max_id}:{max_date}:{checksum}"
+
 
-    for sid, prices in all_prices.items():
-        idx_map = {}
-        for i, p in enumerate(prices):
-            idx_map[p[0]] = i
-            all_dates.add(p[0])
-            date_to_sids[p[0]].append(sid)
-        stock_date_idx[sid] = idx_map
+def build_signal_table(price_rows, settings):
+    """전 종목 전 기간 돌파 신호 → 컬럼 배열 {"date", "stock_id", "score", "close"} ((날짜, 종목) 순)
 
-    trade_dates = sorted(all_dates)
+    price_rows: (stock_id, 가격 튜플 리스트) 이터러블 (load_all_prices)
+    """
     min_data_len = settings.HIGH_BREAKOUT_DAYS + 10
-    start_idx = min_data_len
+    rows = []
+    for sid, prices in price_rows:
+        for idx, (breakout, score) in breakout_series(prices, settings).items():
+            if idx >= min_data_len:
+                rows.append((prices[idx][0], sid, score, breakout["close_price"]))
+    rows.sort(key=lambda r: (r[0], r[1]))
+
+    dates, sids, scores, closes = zip(*rows) if rows else ((), (), (), ())
+    return {
+        "date": np.array(dates, dtype="datetime64[D]"),
+        "stock_id": np.array(sids, dtype=np.int64),
+        "score": np.array(scores, dtype=np.int16),
+        "close": np.array(closes, dtype=np.float64),
+    }
+
+
+def load_signal_table(conn, settings, rebuild=False, signal_dir=None):
+    """탐지 설정 + 가격 버전별 신호 테이블. 저장본이 있으면 읽고, 없으면 계산 후 저장."""
+    signal_dir = Path(signal_dir) if signal_dir else SIGNAL_DIR
+    config = _detector_config(settings)
+    price_key = hashlib.sha1(_price_watermark(conn).encode()).hexdigest()[:12]
+    config_key = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+    path = signal_dir / f"breakout_{price_key}_{config_key}.npz"
+
+    if path.exists() and not rebuild:
+        with np.load(path) as f:
+            table = {col: f[col] for col in SIGNAL_COLUMNS}
+        print(f"  signals: {len(table['date']):,} (saved table {path.name})")
+        return table
+
+    t0 = time.time()
+    table = build_signal_table(load_all_prices(conn), settings)
+    signal_dir.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **table, config=json.dumps(config))
+    os.replace(tmp, path)
+
+    # 이전 가격 버전의 테이블 삭제 (같은 가격 버전의 다른 탐지 설정은 유지)
+    removed = 0
+    for old_path in signal_dir.glob("breakout_*.npz"):
+        if not old_path.name.startswith(f"breakout_{price_key}_"):
+            old_path.unlink(missing_ok=True)
+            removed += 1
+    print(f"  signals: {len(table['date']):,} built in {time.time() - t0:.1f}s -> {path.name}"
+          + (f" (removed {removed} stale)" if removed else ""))
+    return table
+
+
+# ── 2단계: 포트폴리오 시뮬레이터 (신호 테이블 재생) ──────────
+
+def load_close_arrays(conn):
+    """종목별 종가 시계열 {stock_id: (날짜 배열 datetime64[D], 종가 배열)}"""
+    cache = load_price_cache(columns=["trade_date", "close"])
+    if cache is not None:
+        return {
+            sid: (np.asarray(cols["trade_date"]), np.asarray(cols["close"], dtype=np.float64))
+            for sid, cols in iter_cached_arrays(cache, ["trade_date", "close"])
+        }
+    return {
+        sid: (cols["trade_date"], cols["close"])
+        for sid, cols in iter_stock_arrays(conn, ["trade_date", "close"])
+    }
 
-    # stock_id → sector
-    sid_sector = {}
-    for sid, info in stock_info.items():
-        ticker = info.get("ticker", "")
-        if ticker in sector_db:
-            sid_sector[sid] = sector_db[ticker]
 
-    mcap_eligible = sum(1 for sid, info in stock_info.items()
-                        if info.get("market_cap") and MCAP_MIN <= info["market_cap"] <= MCAP_MAX)
-    print(f"  stocks: {len(all_prices)}, dates: {len(trade_dates)} ({trade_dates[0]} ~ {trade_dates[-1]})")
-    print(f"  sectors loaded: {len(sid_sector)}, market cap $10B~$500B: {mcap_eligible}")
+def simulate(signals, closes, stock_info, sid_sector, settings, all_financials=None,
+             stop_loss_pct=STOP_LOSS_PCT, trailing_stop_pct=TRAILING_STOP_PCT,
+             mcap_min=None, mcap_max=None, verbose=True):
+    """신호 테이블을 날짜순으로 재생하며 포지션 관리. 거래 목록과 (시작일, 종료일) 반환.
+
+    mcap_min/mcap_max: 지정 시 진입 후보를 시가총액 범위로 제한 (기본: 제한 없음)
+    """
+    trade_dates = np.unique(np.concatenate([d for d, _ in closes.values()])).astype(str).tolist()
+    start_idx = settings.HIGH_BREAKOUT_DAYS + 10
+    if len(trade_dates) <= start_idx:
+        return [], None, None
+
+    # 날짜별 신호 (테이블이 (날짜, 종목) 순이므로 종목 순서 유지)
+    sig_dates = signals["date"].astype(str)
+    date_signals = defaultdict(list)
+    for d, sid, score, close in zip(sig_dates.tolist(), signals["stock_id"].tolist(),
+                                    signals["score"].tolist(), signals["close"].tolist()):
+        date_signals[d].append((sid, score, close))
+
+    # 보유 종목만 날짜 → 종가 인덱스를 만들어 씀
+    close_index = {}
+
+    def close_on(sid, date):
+        if sid not in close_index:
+            dates, values = closes.get(sid, ((), ()))
+            close_index[sid] = dict(zip(np.asarray(dates).astype(str).tolist(), np.asarray(values).tolist()))
+        return close_index[sid].get(date)
 
-    # ── 백테스트 실행 (단일 패스) ──
     all_trades = []
     open_positions = {}   # key = f"{ticker}_{lot_id}" → position
     lot_counter = 0
     total_dates = len(trade_dates) - start_idx
 
     for di, current_date in enumerate(trade_dates[start_idx:], start_idx):
-        if (di - start_idx) % 20 == 0:
+        if verbose and (di - start_idx) % 20 == 0:
             pct = (di - start_idx) / total_dates * 100
             print(f"  [{pct:5.1f}%] {current_date} | open: {len(open_positions)} | trades: {len(all_trades)}")
 
         # ── 1. 기존 포지션 청산 확인 ──
         closed_keys = []
         for key, pos in open_positions.items():
-            sid = pos["stock_id"]
-            if current_date not in stock_date_idx.get(sid, {}):
+            today_close = close_on(pos["stock_id"], current_date)
+            if today_close is None:
                 continue
 
-            idx = stock_date_idx[sid][current_date]
-            today = all_prices[sid][idx]
-            today_high, today_low, today_close = today[2], today[3], today[4]
-
             # 고점 업데이트 (종가 기준)
             if today_close > pos["peak"]:
                 pos["peak"] = today_close
@@ -183,15 +265,15 @@ def run_backtest(conn, include_delisted=False):
             exit_reason = None
             exit_price = today_close
 
-            # 1. 손절: 종가가 진입가 -7% 이하
-            stop_price = pos["entry_price"] * (1 - STOP_LOSS_PCT / 100)
+            # 1. 손절: 종가가 진입가 -stop_loss_pct% 이하
+            stop_price = pos["entry_price"] * (1 - stop_loss_pct / 100)
             if today_close <= stop_price:
                 exit_reason = "stop_loss"
                 exit_price = today_close
 
-            # 2. 트레일링 스탑: 고점 대비 -20% (종가 기준)
+            # 2. 트레일링 스탑: 고점 대비 -trailing_stop_pct% (종가 기준)
             elif pos["peak"] > 0:
-                trail_price = pos["peak"] * (1 - TRAILING_STOP_PCT / 100)
+                trail_price = pos["peak"] * (1 - trailing_stop_pct / 100)
                 if today_close <= trail_price:
                     exit_reason = "trailing_stop"
                     exit_price = today_close
@@ -218,24 +300,18 @@ def run_backtest(conn, include_delisted=False):
         for key in closed_keys:
             del open_positions[key]
 
-        # ── 2. 오늘의 돌파 신호 (역인덱스 활용) ──
+        # ── 2. 오늘의 돌파 신호 ──
         day_signals = []
-        for sid in date_to_sids[current_date]:
-            idx = stock_date_idx[sid][current_date]
-            if idx < min_data_len:
-                continue
-
-            price_slice = all_prices[sid][:idx + 1]
-            breakout = check_breakout(price_slice, settings)
-            if breakout is None:
-                continue
-
+        for sid, score, close in date_signals.get(current_date, ()):
             info = stock_info.get(sid, {})
             ticker = info.get("ticker", "")
             sector = sid_sector.get(sid, "Unknown")
-            score = score_breakout(breakout)
 
             mcap = info.get("market_cap")
+            if mcap_min is not None and (not mcap or mcap < mcap_min):
+                continue
+            if mcap_max is not None and (not mcap or mcap > mcap_max):
+                continue
 
             # 실적 필터: 매출 성장 + 흑자 확인 (point-in-time)
             if settings.FUNDAMENTAL_FILTER and all_financials:
@@ -248,7 +324,7 @@ def run_backtest(conn, include_delisted=False):
                 "ticker": ticker,
                 "sector": sector,
                 "score": score,
-                "close_price": breakout["close_price"],
+                "close_price": close,
                 "market_cap": mcap,
             })
 
@@ -278,11 +354,8 @@ def run_backtest(conn, include_delisted=False):
     # ── 미청산 포지션 마지막 날 종가로 정리 ──
     last_date = trade_dates[-1]
     for key, pos in open_positions.items():
-        sid = pos["stock_id"]
-        if last_date in stock_date_idx.get(sid, {}):
-            idx = stock_date_idx[sid][last_date]
-            last_close = all_prices[sid][idx][4]
-        else:
+        last_close = close_on(pos["stock_id"], last_date)
+        if last_close is None:
             last_close = pos["entry_price"]
 
         pnl_pct = ((last_close / pos["entry_price"]) - 1) * 100
@@ -300,8 +373,56 @@ def run_backtest(conn, include_delisted=False):
             "score": pos["score"],
         })
 
-    bt_start = trade_dates[start_idx]
-    bt_end = trade_dates[-1]
+    return all_trades, trade_dates[start_idx], trade_dates[-1]
+
+
+def run_backtest(conn, include_delisted=False, stop_loss_pct=STOP_LOSS_PCT,
+                 trailing_stop_pct=TRAILING_STOP_PCT, mcap_min=None, mcap_max=None,
+                 rebuild_signals=False):
+    """1단계(신호 테이블 로드/생성) → 2단계(포트폴리오 시뮬레이션).
+
+    청산 규칙/시총 범위만 바꾼 재실행은 저장된 신호 테이블을 재사용하므로 빠름.
+    """
+    settings = Settings()
+
+    print("[backtest] loading data...")
+    signals = load_signal_table(conn, settings, rebuild=rebuild_signals)
+    closes = load_close_arrays(conn)
+    stock_info = load_stock_info(conn, include_delisted=include_delisted)
+    sector_db = load_sectors_from_db(conn)
+    spy_prices = load_spy_prices(conn)
+
+    # 실적 필터 데이터 로드
+    all_financials = {}
+    if settings.FUNDAMENTAL_FILTER:
+        all_financials = load_all_financials(conn)
+        fin_eligible = sum(1 for sid in all_financials if len(all_financials[sid]) >= 2)
+        print(f"  fundamentals: {len(all_financials)} stocks, {fin_eligible} with 2+ years")
+    if include_delisted:
+        print(f"  survivorship bias: OFF (delisted stocks included)")
+
+    # stock_id → sector
+    sid_sector = {}
+    for sid, info in stock_info.items():
+        ticker = info.get("ticker", "")
+        if ticker in sector_db:
+            sid_sector[sid] = sector_db[ticker]
+
+    mcap_eligible = sum(1 for sid, info in stock_info.items()
+                        if info.get("market_cap") and MCAP_MIN <= info["market_cap"] <= MCAP_MAX)
+    print(f"  stocks: {len(closes)}, sectors loaded: {len(sid_sector)}, "
+          f"market cap $10B~$500B: {mcap_eligible}")
+    print(f"  exit rules: stop -{stop_loss_pct}% | trailing -{trailing_stop_pct}%"
+          + (f" | mcap {mcap_min or 0:,.0f}~{mcap_max or float('inf'):,.0f}" if mcap_min or mcap_max else ""))
+
+    t0 = time.time()
+    all_trades, bt_start, bt_end = simulate(
+        signals, closes, stock_info, sid_sector, settings, all_financials,
+        stop_loss_pct=stop_loss_pct, trailing_stop_pct=trailing_stop_pct,
+        mcap_min=mcap_min, mcap_max=mcap_max,
+    )
+    print(f"  simulation: {time.time() - t0:.1f}s")
+
     print_backtest_results(all_trades, spy_prices, bt_start, bt_end)
     return all_trades
 
@@ -8,8 +8,24 @@ C. 2주 이상(10거래일+) 기간 조정 (가격 범위 ≤ 10%)
 D. 조정 구간 고가 재돌파
 """
 
+import os
+import warnings
 import pymysql
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from datetime import date, timedelta
+from pathlib import Path
 from config.settings import Settings
+from services.price_cache import OHLCV_COLUMNS
+from services.price_stream import iter_stock_arrays, ACTIVE_WHERE
+
+RETURN_LOOKBACK_PAD_DAYS = 30  # 테마 수익률: 거래일 → 캘린더일 환산 여유
+
+# 조건 B 바닥(전체 이력 최저가) 상태: 스캔마다 최근 구간 최저가로 갱신
+LOWS_STATE_PATH = Path(__file__).resolve().parent.parent / "data" / "scan_lows.npz"
+LOWS_STATE_VERSION = 1
+LOWS_REBUILD_DAYS = 30  # 과거 구간 정정(주가 재수집 등)을 반영하기 위해 이 주기로 DB 에서 다시 집계
 
 
 # ── 테마 강도 ────────────────────────────────────────────
@@ -21,30 +37,54 @@ def _get_spy_id(conn):
     return row[0] if row else None
 
 
-def _calc_return(conn, stock_id, period_days):
-    """stock_id의 period_days 거래일 수익률(%) 계산"""
+def _calc_returns(conn, stock_ids, period_days):
+    """종목들의 period_days 거래일 수익률(%)을 쿼리 한 번으로 계산. {stock_id: 수익률}
+
+    종목별 최근 period_days+1 개 종가 중 최신/가장 오래된 값만 윈도 함수로 가져옴.
+    날짜 하한(거래일의 약 1.5배 + 여유)으로 오래된 이력은 읽지 않음.
+    이력이 부족하거나 과거 종가가 0 이하인 종목은 결과에서 빠짐.
+    """
+    stock_ids = sorted(set(stock_ids))
+    if not stock_ids:
+        return {}
+
     cursor = conn.cursor()
+    cursor.execute("SELECT MAX(trade_date) FROM bs_daily_prices")
+    latest = cursor.fetchone()[0]
+    if not latest:
+        return {}
+    since = latest - timedelta(days=period_days * 3 // 2 + RETURN_LOOKBACK_PAD_DAYS)
+
+    placeholders = ",".join(["%s"] * len(stock_ids))
     cursor.execute(
-        """SELECT close_price FROM bs_daily_prices
-           WHERE stock_id = %s ORDER BY trade_date DESC LIMIT %s""",
-        (stock_id, period_days + 1),
+        f"""SELECT stock_id, rn, close_price FROM (
+                SELECT stock_id, close_price,
+                       ROW_NUMBER() OVER (PARTITION BY stock_id ORDER BY trade_date DESC) AS rn
+                FROM bs_daily_prices
+                WHERE stock_id IN ({placeholders}) AND trade_date >= %s
+            ) x
+            WHERE rn = 1 OR rn = %s""",
+        (*stock_ids, since, period_days + 1),
     )
-    rows = cursor.fetchall()
-    if len(rows) < period_days + 1:
-        return None
-    current = float(rows[0][0])
-    past = float(rows[period_days][0])
-    if past <= 0:
-        return None
-    return ((current / past) - 1) * 100
+    current = {}
+    past = {}
+    for sid, rn, close in cursor.fetchall():
+        (current if rn == 1 else past)[sid] = float(close)
+
+    return {
+        sid: ((current[sid] / p) - 1) * 100
+        for sid, p in past.items()
+        if p > 0 and sid in current
+    }
 
 
 def calc_theme_strength(conn, period_days=20):
-    """모든 테마의 강도를 계산하여 딕셔너리로 반환"""
+    """모든 테마의 강도를 계산하여 딕셔너리로 반환
+
+    테마 소속 전 종목(+SPY)의 수익률을 한 번에 구해 종목별로 한 번만 계산하고,
+    테마별 평균은 pandas groupby 로 집계.
+    """
     spy_id = _get_spy_id(conn)
-    spy_return = _calc_return(conn, spy_id, period_days) if spy_id else 0.0
-    if spy_return is None:
-        spy_return = 0.0
 
     cursor = conn.cursor(pymysql.cursors.DictCursor)
 
@@ -58,38 +98,35 @@ def calc_theme_strength(conn, period_days=20):
            )"""
     )
     rows = cursor.fetchall()
-
-    # 테마별 그룹핑
-    theme_stocks = {}
-    theme_names = {}
-    for row in rows:
-        tid = row["theme_id"]
-        if tid not in theme_stocks:
-            theme_stocks[tid] = []
-            theme_names[tid] = row["name_ko"]
-        theme_stocks[tid].append(row["stock_id"])
+    if not rows:
+        return {}
+
+    stock_ids = {row["stock_id"] for row in rows}
+    if spy_id:
+        stock_ids.add(spy_id)
+    returns = _calc_returns(conn, stock_ids, period_days)
+    spy_return = returns.get(spy_id, 0.0) if spy_id else 0.0
+
+    members = pd.DataFrame(rows)
+    members["ret"] = members["stock_id"].map(returns)
+    members = members.dropna(subset=["ret"])
+    grouped = members.groupby("theme_id").agg(
+        name_ko=("name_ko", "first"), avg_ret=("ret", "mean"), count=("ret", "size"),
+    )
 
     results = {}
-    for tid, stock_ids in theme_stocks.items():
-        returns = []
-        for sid in stock_ids:
-            r = _calc_return(conn, sid, period_days)
-            if r is not None:
-                returns.append(r)
-
-        if not returns:
-            continue
-
-        avg_ret = sum(returns) / len(returns)
+    for tid, g in grouped.iterrows():
+        tid = int(tid)
+        avg_ret = float(g["avg_ret"])
         rel_str = avg_ret - spy_return
 
         results[tid] = {
             "theme_id": tid,
-            "name_ko": theme_names[tid],
+            "name_ko": g["name_ko"],
             "avg_return_pct": round(avg_ret, 4),
             "spy_return_pct": round(spy_return, 4),
             "relative_str": round(rel_str, 4),
-            "stock_count": len(returns),
+            "stock_count": int(g["count"]),
         }
 
     return results
@@ -97,13 +134,14 @@ def calc_theme_strength(conn, period_days=20):
 
 # ── 돌파 패턴 탐지 ──────────────────────────────────────
 
-def check_breakout(prices, settings):
+def check_breakout(prices, settings, history_low=None):
     """
     가격 리스트(과거→최신)에서 돌파 패턴 검사.
 
     Args:
         prices: list of (trade_date, open, high, low, close, volume)
         settings: Settings 객체
+        history_low: prices 가 최근 구간만일 때 전체 이력 최저가 (조건 B 의 바닥)
 
     Returns:
         dict with breakout metrics if triggered, None otherwise
@@ -123,6 +161,8 @@ def check_breakout(prices, settings):
 
     # B. 바닥 대비 50~100% 상승
     low_all = min(p[3] for p in prices)
+    if history_low is not None:
+        low_all = min(low_all, history_low)
     if low_all <= 0:
         return None
     rise_pct = ((today_close / low_all) - 1) * 100
@@ -249,8 +289,299 @@ def score_breakout(breakout, theme_rel_str=None):
     return vol_score + theme_score + rise_score + cons_score
 
 
+# ── 전 종목 벡터화 탐지 ─────────────────────────────────
+
+def pack_windows(windows, stock_ids, bars):
+    """{stock_id: {컬럼: 배열}} → (종목 x bars) 행렬 묶음 (최신 봉이 마지막 열, 앞쪽은 NaN)
+
+    Returns:
+        {"stock_ids", "length", "last_date", "high", "low", "close", "volume"}
+    """
+    n_stocks = len(stock_ids)
+    packed = {col: np.full((n_stocks, bars), np.nan) for col in ("high", "low", "close", "volume")}
+    length = np.zeros(n_stocks, dtype=np.int64)
+    last_date = [None] * n_stocks
+    for i, sid in enumerate(stock_ids):
+        arrays = windows.get(sid)
+        if arrays is None or len(arrays["close"]) == 0:
+            continue
+        k = min(bars, len(arrays["close"]))
+        for col in packed:
+            packed[col][i, bars - k:] = arrays[col][-k:]
+        length[i] = k
+        last_date[i] = str(arrays["trade_date"][-1])
+    packed.update(stock_ids=list(stock_ids), length=length, last_date=last_date)
+    return packed
+
+
+def score_breakouts(volume_ratio, rise_pct, cons_range_pct, cons_days, theme_rel):
+    """score_breakout 의 배열 버전 (theme_rel 의 NaN = 테마 정보 없음)"""
+    vol_score = np.select(
+        [volume_ratio >= 3.0, volume_ratio >= 2.0, volume_ratio >= 1.5, volume_ratio >= 1.0],
+        [25, 20, 15, 10], 5,
+    )
+    theme_score = np.select(
+        [np.isnan(theme_rel), theme_rel >= 10.0, theme_rel >= 5.0, theme_rel >= 2.0, theme_rel >= 0.0],
+        [12, 25, 20, 15, 10], 0,
+    )
+    rise_diff = np.abs(rise_pct - 70)
+    rise_score = np.select([rise_diff <= 10, rise_diff <= 20, rise_diff <= 30], [25, 20, 15], 10)
+    cons_score = np.select(
+        [(cons_range_pct <= 5) & (cons_days >= 15),
+         (cons_range_pct <= 7) & (cons_days >= 12),
+         (cons_range_pct <= 10) & (cons_days >= 10)],
+        [25, 20, 15], 10,
+    )
+    return vol_score + theme_score + rise_score + cons_score
+
+
+def detect_breakouts(packed, settings, history_low=None, theme_rel=None):
+    """check_breakout 조건 A~E 를 전 종목 행렬에 대해 한 번에 평가 + 점수 계산.
+
+    Args:
+        packed: pack_windows 결과
+        history_low: (종목,) 전체 이력 최저가 (NaN 이면 구간 최저가만 사용)
+        theme_rel: (종목,) 테마 상대강도 (NaN = 없음)
+
+    Returns:
+        [(행 번호, breakout dict, score), ...] — check_breakout / score_breakout 과 같은 값
+    """
+    high, low, close, volume = packed["high"], packed["low"], packed["close"], packed["volume"]
+    n_stocks, bars = close.shape
+    if n_stocks == 0 or bars < settings.HIGH_BREAKOUT_DAYS + 10:
+        return []
+    length = packed["length"]
+    hb = settings.HIGH_BREAKOUT_DAYS
+    vol_days = settings.VOLUME_RATIO_DAYS
+    cons_window = 60  # _find_consolidation: 오늘 직전 최대 60봉 역방향 탐색
+
+    # 데이터가 짧은 행(앞쪽 NaN)은 length 조건에서 걸러지므로 All-NaN 경고는 무시
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        ok = length >= hb + 10
+
+        # A. 직전 hb 일 고가 돌파
+        high_60d = np.nanmax(high[:, bars - 1 - hb:bars - 1], axis=1)
+        today_high = high[:, -1]
+        ok &= today_high > high_60d
+
+        # B. 바닥 대비 상승률
+        low_all = np.nanmin(low, axis=1)
+        if history_low is not None:
+            low_all = np.fmin(low_all, history_low)
+        today_close = close[:, -1]
+        ok &= low_all > 0
+        rise = ((today_close / low_all) - 1) * 100
+        ok &= (rise >= settings.RISE_FROM_LOW_MIN_PCT) & (rise <= settings.RISE_FROM_LOW_MAX_PCT)
+
+        # C. 기간 조정: 오늘 직전부터 역방향 누적 고가/저가
+        back_high = np.fmax.accumulate(high[:, bars - 2:bars - 2 - cons_window:-1], axis=1)
+        back_low = np.fmin.accumulate(low[:, bars - 2:bars - 2 - cons_window:-1], axis=1)
+        back_mid = (back_high + back_low) / 2
+        back_range = ((back_high - back_low) / back_mid) * 100
+        within = (back_low > 0) & (back_range <= settings.CONSOLIDATION_MAX_RANGE_PCT)
+        # 처음 실패한 위치까지의 연속 일수
+        cons_days = np.where(within.all(axis=1), within.shape[1], np.argmin(within, axis=1))
+        ok &= cons_days >= settings.CONSOLIDATION_MIN_DAYS
+        last = np.clip(cons_days - 1, 0, None)
+        rows = np.arange(n_stocks)
+        cons_high = back_high[rows, last]
+        cons_low = back_low[rows, last]
+
+        # D. 조정 구간 고가 재돌파
+        ok &= today_close > cons_high
+
+        # E. 거래량: 직전 vol_days 일 평균 대비
+        vol_window = volume[:, bars - 1 - vol_days:bars - 1]
+        vol_count = np.count_nonzero(~np.isnan(vol_window), axis=1)
+        avg_vol = np.where(vol_count > 0, np.nansum(vol_window, axis=1) / np.maximum(vol_count, 1), 1)
+        volume_ratio = np.where(avg_vol > 0, volume[:, -1] / avg_vol, 0)
+        ok &= volume_ratio >= settings.VOLUME_RATIO_MIN
+
+    hits = np.flatnonzero(ok)
+    results = []
+    for i in hits:
+        mid = (cons_high[i] + cons_low[i]) / 2
+        results.append((int(i), {
+            "signal_date": packed["last_date"][i],
+            "close_price": float(today_close[i]),
+            "high_60d": float(high_60d[i]),
+            "low_lookback": float(low_all[i]),
+            "rise_from_low_pct": round(float(rise[i]), 4),
+            "consolidation_days": int(cons_days[i]),
+            "consolidation_range_pct": round(float(((cons_high[i] - cons_low[i]) / mid) * 100), 4),
+            "consolidation_high": float(cons_high[i]),
+            "volume_ratio": round(float(volume_ratio[i]), 4),
+        }))
+
+    if results:
+        # 점수는 반올림된 dict 값 기준 (score_breakout 과 동일 입력)
+        field = lambda key: np.array([b[key] for _, b in results], dtype=np.float64)
+        rel = np.full(len(hits), np.nan) if theme_rel is None else np.asarray(theme_rel, dtype=np.float64)[hits]
+        scores = score_breakouts(
+            field("volume_ratio"), field("rise_from_low_pct"),
+            field("consolidation_range_pct"), field("consolidation_days"), rel,
+        )
+        results = [(i, b, int(sc)) for (i, b), sc in zip(results, scores)]
+    return results
+
+
+def breakout_series(prices, settings):
+    """한 종목의 전 기간 각 날짜를 '오늘'로 본 check_breakout 결과를 한 번에 계산.
+
+    prices[:i+1] 로 check_breakout 을 날짜마다 호출하는 것과 같은 결과를
+    길이 W 의 슬라이딩 윈도(복사 없는 view) + 누적 최저가로 구하므로 봉 수에 선형.
+
+    Args:
+        prices: list of (trade_date, open, high, low, close, volume) (과거→최신)
+
+    Returns:
+        {날짜 인덱스: (breakout dict, score)} — score 는 테마 정보 없는 score_breakout
+    """
+    n = len(prices)
+    bars = max(settings.HIGH_BREAKOUT_DAYS + 10, 62, settings.VOLUME_RATIO_DAYS + 1)
+    if n < settings.HIGH_BREAKOUT_DAYS + 10:
+        return {}
+
+    cols = list(zip(*prices))
+    pad = np.full(bars - 1, np.nan)
+    packed = {
+        name: sliding_window_view(np.concatenate([pad, np.asarray(cols[k], dtype=np.float64)]), bars)
+        for k, name in ((2, "high"), (3, "low"), (4, "close"), (5, "volume"))
+    }
+    packed["length"] = np.minimum(np.arange(1, n + 1), bars)
+    packed["last_date"] = cols[0]
+    history_low = np.minimum.accumulate(np.asarray(cols[3], dtype=np.float64))
+
+    return {i: (b, score) for i, b, score in detect_breakouts(packed, settings, history_low)}
+
+
 # ── 스캔 메인 ───────────────────────────────────────────
 
+def load_history_lows(path=LOWS_STATE_PATH):
+    """최저가 상태 파일 → (생성일, {stock_id: (최저가, 반영된 마지막 거래일)}). 없거나 버전이 다르면 None."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        with np.load(path) as f:
+            if int(f["version"]) != LOWS_STATE_VERSION:
+                return None
+            lows = {
+                int(sid): (float(low), through)
+                for sid, low, through in zip(f["stock_ids"], f["low"], f["through"])
+            }
+            return date.fromisoformat(str(f["built"])), lows
+    except Exception as e:
+        print(f"  [WARN] 최저가 상태 파일 읽기 실패 ({e}) → DB 집계")
+        return None
+
+
+def save_history_lows(built, lows, path=LOWS_STATE_PATH):
+    """(생성일, {stock_id: (최저가, 마지막 거래일)}) → npz
+
+    프로세스별 임시 파일에 쓴 뒤 os.replace → 동시에 도는 스캔끼리 임시 파일이 겹치지 않고,
+    읽는 쪽은 항상 이전 또는 새 파일 전체를 봄.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sids = sorted(lows)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                version=LOWS_STATE_VERSION,
+                built=str(built),
+                stock_ids=np.array(sids, dtype=np.int64),
+                low=np.array([lows[s][0] for s in sids], dtype=np.float64),
+                through=np.array([lows[s][1] for s in sids], dtype="datetime64[D]"),
+            )
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _lows_changed(before, after):
+    """최저가 상태 비교 (NaN 최저가끼리는 같은 값으로 봄)"""
+    if before.keys() != after.keys():
+        return True
+    for sid, (low, through) in after.items():
+        old_low, old_through = before[sid]
+        if old_through != through or not (old_low == low or (np.isnan(old_low) and np.isnan(low))):
+            return True
+    return False
+
+
+def _history_lows(conn, windows, today=None):
+    """종목별 전체 이력 최저가 (조건 B 의 바닥).
+
+    상태 파일의 최저가가 최근 구간 첫 봉 이후까지 반영돼 있으면 그대로 쓰고
+    (구간 안의 최저가는 detect_breakouts 가 따로 합침), 상태가 없거나 끊긴 종목만
+    MIN(low_price) 를 종목 한정으로 집계 → 매 스캔 가격 테이블 전체를 읽지 않음.
+    LOWS_REBUILD_DAYS 가 지나면 전 종목을 다시 집계해 과거 구간 정정을 반영.
+    """
+    today = today or date.today()
+    loaded = load_history_lows()
+    built, lows = loaded if loaded else (today, {})
+    if (today - built).days >= LOWS_REBUILD_DAYS:
+        built, lows = today, {}
+    before = (built, dict(lows)) if loaded else None
+
+    stale = [
+        sid for sid, cols in windows.items()
+        if sid not in lows or lows[sid][1] < cols["trade_date"][0]
+    ]
+    if stale:
+        print(f"  [최저가] {len(stale):,}개 종목 DB 집계 (상태 {len(lows):,}개 종목)")
+        cursor = conn.cursor()
+        for start in range(0, len(stale), 1000):
+            chunk = stale[start:start + 1000]
+            placeholders = ",".join(["%s"] * len(chunk))
+            cursor.execute(
+                f"SELECT stock_id, MIN(low_price), MAX(trade_date) FROM bs_daily_prices "
+                f"WHERE stock_id IN ({placeholders}) GROUP BY stock_id",
+                chunk,
+            )
+            for sid, low, through in cursor.fetchall():
+                lows[sid] = (float(low), np.datetime64(through, "D"))
+
+    # 최근 구간까지 반영해 다음 스캔용 상태 저장 (같은 날 재스캔 등 바뀐 게 없으면 쓰지 않음)
+    for sid, cols in windows.items():
+        low, through = lows.get(sid, (np.nan, cols["trade_date"][0]))
+        lows[sid] = (
+            float(np.fmin(low, np.nanmin(cols["low"]))) if len(cols["low"]) else low,
+            max(through, cols["trade_date"][-1]),
+        )
+    if before is None or before[0] != built or _lows_changed(before[1], lows):
+        save_history_lows(built, lows)
+    return {sid: low for sid, (low, _) in lows.items()}
+
+
+def _load_scan_windows(conn, bars):
+    """활성 종목의 최근 구간 OHLCV 를 스트리밍 쿼리 한 번으로 로드.
+
+    Returns:
+        ({stock_id: {컬럼: np.ndarray}}, {stock_id: 전체 이력 최저가})
+        최근 구간은 거래일 bars 개 분량의 캘린더일(+여유) 기준.
+        조건 B 의 바닥은 전체 이력 기준이므로 최저가는 _history_lows 상태에서 구함.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(trade_date) FROM bs_daily_prices")
+    latest = cursor.fetchone()[0]
+    if not latest:
+        return {}, {}
+    since = latest - timedelta(days=bars * 7 // 5 + RETURN_LOOKBACK_PAD_DAYS)
+
+    windows = {
+        sid: {col: a[-bars:] for col, a in arrays.items()}
+        for sid, arrays in iter_stock_arrays(
+            conn, OHLCV_COLUMNS, where=f"trade_date >= %s AND {ACTIVE_WHERE}", params=(since,),
+        )
+    }
+    return windows, _history_lows(conn, windows)
+
+
 def scan_breakouts(conn):
     """전 종목 돌파 패턴 스캔"""
     settings = Settings()
@@ -286,58 +617,34 @@ def scan_breakouts(conn):
         ):
             stock_theme_map[sid] = tid
 
-    # 전 종목 스캔
+    # 전 종목 스캔 (최근 구간 가격을 한 번에 로드)
     cursor.execute(
         "SELECT id, ticker, exchange_code FROM bs_stocks WHERE is_active = 1"
     )
     stocks = cursor.fetchall()
+    windows, history_lows = _load_scan_windows(conn, settings.SCAN_WINDOW_BARS)
 
-    signals = []
-    scanned = 0
-
-    for s in stocks:
-        stock_id = s["id"]
-
-        # 가격 데이터 조회 (과거→최신)
-        cursor.execute(
-            """SELECT trade_date, open_price, high_price, low_price, close_price, volume
-               FROM bs_daily_prices
-               WHERE stock_id = %s
-               ORDER BY trade_date ASC""",
-            (stock_id,),
-        )
-        prices = cursor.fetchall()
-
-        if len(prices) < settings.HIGH_BREAKOUT_DAYS + 10:
-            continue
-
-        scanned += 1
+    stock_ids = [s["id"] for s in stocks]
+    packed = pack_windows(windows, stock_ids, settings.SCAN_WINDOW_BARS)
+    scanned = int(np.count_nonzero(packed["length"] >= settings.HIGH_BREAKOUT_DAYS + 10))
 
-        # 튜플을 리스트로 변환 (date, open, high, low, close, volume)
-        price_list = [
-            (str(p["trade_date"]), float(p["open_price"]), float(p["high_price"]),
-             float(p["low_price"]), float(p["close_price"]), int(p["volume"]))
-            for p in prices
-        ]
-
-        breakout = check_breakout(price_list, settings)
-        if breakout is None:
-            continue
-
-        # 테마 정보
-        theme_id = stock_theme_map.get(stock_id)
-        theme_rel = None
-        if theme_id and theme_id in theme_strength:
-            theme_rel = theme_strength[theme_id]["relative_str"]
-
-        score = score_breakout(breakout, theme_rel)
+    # 테마 정보 (종목별 가장 강한 테마의 상대강도)
+    theme_ids = [stock_theme_map.get(sid) for sid in stock_ids]
+    theme_rel = np.array([
+        theme_strength[tid]["relative_str"] if tid and tid in theme_strength else np.nan
+        for tid in theme_ids
+    ])
+    history_low = np.array([history_lows.get(sid, np.nan) for sid in stock_ids])
 
+    signals = []
+    for i, breakout, score in detect_breakouts(packed, settings, history_low, theme_rel):
+        theme_id = theme_ids[i]
         signal = {
-            "stock_id": stock_id,
-            "ticker": s["ticker"],
+            "stock_id": stock_ids[i],
+            "ticker": stocks[i]["ticker"],
             **breakout,
             "theme_id": theme_id,
-            "theme_relative_str": theme_rel,
+            "theme_relative_str": None if np.isnan(theme_rel[i]) else float(theme_rel[i]),
             "signal_score": score,
         }
         signals.append(signal)
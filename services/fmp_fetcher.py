@@ -0,0 +1,178 @@
+"""
+FMP API 비동기 수집 엔진.
+
+asyncio 워커 N개가 전 종목 작업 큐를 공유하며 요청을 보내고,
+프로세스 전역 토큰 버킷이 FMP 플랜의 분당 호출 한도를 지킴.
+배치(50개) 단위로 가장 느린 요청을 기다린 뒤 sleep 하던 방식과 달리
+항상 max_in_flight 개의 요청이 진행 중이므로 처리량이 꼬리 지연에 묶이지 않음.
+
+HTTP 호출 자체는 전용 스레드 풀에서 공용 세션(http_session, keep-alive)으로 실행
+(추가 의존성 없음).
+base_url 을 바꾸면 로컬 스텁 HTTP 서버로 테스트 가능.
+"""
+
+import asyncio
+import random
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+from services.http_session import get_session, connection_stats, print_connection_stats
+
+FMP_BASE = "https://financialmodelingprep.com"
+MAX_RETRIES = 4
+DEFAULT_CALLS_PER_MIN = 300
+DEFAULT_MAX_IN_FLIGHT = 10
+PROGRESS_EVERY = 500
+
+
+class TokenBucket:
+    """분당 호출 한도용 토큰 버킷 (이벤트 루프 단일 스레드에서만 사용)"""
+
+    def __init__(self, calls_per_min, burst=None):
+        self.rate = calls_per_min / 60.0
+        self.capacity = float(burst or max(1, calls_per_min // 60))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# 같은 프로세스의 연속 수집 단계(재무 → 어닝 → 시총)가 한도를 함께 쓰도록 공유
+_buckets = {}
+
+
+def _get_bucket(calls_per_min):
+    if calls_per_min not in _buckets:
+        _buckets[calls_per_min] = TokenBucket(calls_per_min)
+    return _buckets[calls_per_min]
+
+
+def _get_json(url, params, timeout):
+    resp = get_session().get(url, params=params, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def _request(loop, executor, bucket, url, params, timeout, stats):
+    """단일 요청. 404 → None, 429/5xx/연결 오류 → exponential backoff + jitter 재시도.
+
+    JSON 본문을 그대로 반환 (FMP 는 200 응답에 {"Error Message": ...} dict 를 주기도 하므로
+    list/dict 형태 확인은 콜백에서). stats 의 requests 는 재시도 포함 HTTP 호출 수.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        await bucket.acquire()
+        stats["requests"] += 1
+        try:
+            data = await loop.run_in_executor(executor, _get_json, url, params, timeout)
+            return data or None
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status == 404:
+                return None
+            retryable = status == 429 or (status is not None and status >= 500)
+            if not retryable or attempt >= MAX_RETRIES:
+                raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt >= MAX_RETRIES:
+                raise
+        stats["retries"] += 1
+        await asyncio.sleep((2 ** attempt) + random.uniform(0, 1))
+    return None
+
+
+async def _run(jobs, api_key, on_result, calls_per_min, max_in_flight, base_url, timeout, label,
+               should_stop=None):
+    loop = asyncio.get_running_loop()
+    bucket = _get_bucket(calls_per_min)
+    queue = iter(jobs)
+    total = len(jobs)
+    stats = {"jobs": 0, "requests": 0, "retries": 0, "errors": 0, "callback_errors": 0}
+    t0 = time.monotonic()
+
+    async def worker():
+        for key, endpoint, params in queue:
+            if should_stop is not None and should_stop():
+                return
+            params = dict(params, apikey=api_key)
+            err = None
+            data = None
+            try:
+                data = await _request(loop, executor, bucket, f"{base_url}{endpoint}", params, timeout, stats)
+            except Exception as e:
+                err = e
+                stats["errors"] += 1
+            stats["jobs"] += 1
+
+            # 콜백 예외는 해당 작업만 실패 처리 (gather 전체가 중단되지 않도록)
+            try:
+                on_result(key, data, err)
+            except Exception as e:
+                stats["callback_errors"] += 1
+                if stats["callback_errors"] <= 10:
+                    print(f"  [{label}] 결과 처리 에러 ({key!r:.60}): {e}", flush=True)
+
+            done = stats["jobs"]
+            if done % PROGRESS_EVERY == 0:
+                rps = stats["requests"] / (time.monotonic() - t0)
+                print(f"  [{label}] 진행: {done}/{total} ({rps:.1f} req/s, 재시도 {stats['retries']}회, "
+                      f"에러 {stats['errors']}개)", flush=True)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        await asyncio.gather(*(worker() for _ in range(min(max_in_flight, total))))
+
+    stats["elapsed"] = time.monotonic() - t0
+    stats["req_per_sec"] = stats["requests"] / stats["elapsed"] if stats["elapsed"] > 0 else 0
+    return stats
+
+
+def fetch_all(jobs, api_key, on_result, calls_per_min=None, max_in_flight=None,
+              base_url=FMP_BASE, timeout=30, label="FMP", should_stop=None):
+    """FMP 요청 목록을 비동기로 수행.
+
+    Args:
+        jobs: [(key, endpoint, params), ...]
+        on_result: on_result(key, data, err) — 이벤트 루프 스레드에서 순차 호출
+                   (DB 쓰기를 해도 안전, 호출 중에는 새 요청 발송이 멈춤)
+        calls_per_min / max_in_flight: 기본값은 Settings 의 FMP_CALLS_PER_MIN / FMP_MAX_IN_FLIGHT
+        should_stop: 요청마다 확인하는 중단 조건 (True 면 남은 작업을 보내지 않음)
+
+    Returns:
+        {"jobs", "requests" (재시도 포함 HTTP 호출 수), "retries", "errors", "callback_errors",
+         "elapsed", "req_per_sec"}
+    """
+    if calls_per_min is None or max_in_flight is None:
+        try:
+            from config.settings import Settings
+            settings = Settings()
+            calls_per_min = calls_per_min or settings.FMP_CALLS_PER_MIN
+            max_in_flight = max_in_flight or settings.FMP_MAX_IN_FLIGHT
+        except Exception:
+            calls_per_min = calls_per_min or DEFAULT_CALLS_PER_MIN
+            max_in_flight = max_in_flight or DEFAULT_MAX_IN_FLIGHT
+
+    if not jobs:
+        return {"jobs": 0, "requests": 0, "retries": 0, "errors": 0, "callback_errors": 0,
+                "elapsed": 0.0, "req_per_sec": 0.0}
+
+    before = connection_stats()
+    stats = asyncio.run(_run(
+        jobs, api_key, on_result, calls_per_min, max_in_flight, base_url, timeout, label, should_stop,
+    ))
+    print(f"  [{label}] {stats['jobs']}건 작업, HTTP {stats['requests']}회 (재시도 {stats['retries']}), "
+          f"{stats['elapsed']:.0f}s, {stats['req_per_sec']:.1f} req/s (한도 {calls_per_min}/분, 동시 {max_in_flight})")
+    if stats["callback_errors"]:
+        print(f"  [{label}] 결과 처리 에러 {stats['callback_errors']}건")
+    print_connection_stats(label, since=before)
+    return stats
@@ -4,14 +4,13 @@ bs_financials, bs_earnings 테이블에 데이터 저장.
 상장폐지 종목 수집 지원.
 """
 
-import time
-import random
-import requests
 import pymysql
-from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from services.fmp_fetcher import fetch_all
+from services.http_session import get_session
 
 FMP_BASE = "https://financialmodelingprep.com"
-MAX_RETRIES = 4
+COMMIT_EVERY = 50  # 결과 N건마다 커밋
 
 
 def _get_all_stocks(conn, include_delisted=False):
@@ -28,7 +27,7 @@ def _fmp_get(endpoint, api_key, params=None):
     """FMP API GET 요청"""
     params = params or {}
     params["apikey"] = api_key
-    resp = requests.get(f"{FMP_BASE}{endpoint}", params=params, timeout=30)
+    resp = get_session().get(f"{FMP_BASE}{endpoint}", params=params, timeout=30)
     resp.raise_for_status()
     return resp.json()
 
@@ -118,64 +117,42 @@ def _insert_financials(conn, stock_id, records):
     return count
 
 
-def _fetch_one(endpoint, api_key, params, stock):
-    """단일 종목 HTTP 요청 (스레드용). 429시 exponential backoff + jitter 재시도."""
-    for attempt in range(MAX_RETRIES + 1):
-        try:
-            data = _fmp_get(endpoint, api_key, params)
-            if data and isinstance(data, list):
-                return (stock, data, None)
-            return (stock, None, None)
-        except requests.exceptions.HTTPError as e:
-            if e.response is not None and e.response.status_code == 404:
-                return (stock, None, None)
-            if e.response is not None and e.response.status_code == 429 and attempt < MAX_RETRIES:
-                wait = (2 ** attempt) + random.uniform(0, 1)
-                time.sleep(wait)
-                continue
-            return (stock, None, e)
-        except Exception as e:
-            return (stock, None, e)
-    return (stock, None, None)
+def _collect_per_stock(conn, api_key, stocks, endpoint, make_params, insert_fn):
+    """종목별 FMP 요청을 비동기 엔진으로 수행하고 결과를 insert_fn 으로 저장.
+
+    Returns:
+        (inserted, error_count)
+    """
+    jobs = [(s, endpoint, make_params(s)) for s in stocks]
+    state = {"inserted": 0, "errors": 0, "done": 0}
+
+    def on_result(stock, data, err):
+        state["done"] += 1
+        if err:
+            state["errors"] += 1
+            if state["errors"] <= 10:
+                print(f"  [ERR] {stock['ticker']}: {err}")
+        elif data and isinstance(data, list):
+            state["inserted"] += insert_fn(conn, stock["id"], data)
+        if state["done"] % COMMIT_EVERY == 0:
+            conn.commit()
+
+    fetch_all(jobs, api_key, on_result)
+    conn.commit()
+
+    if state["errors"] > 10:
+        print(f"  [WARN] 총 {state['errors']}개 에러")
+    return state["inserted"], state["errors"]
 
 
 def _collect_income_statements(conn, api_key, stocks):
-    """전 종목 연간 income statement 수집 (멀티스레드)"""
+    """전 종목 연간 income statement 수집 (비동기, 분당 호출 한도 준수)"""
     print("[재무 수집] Income Statement 시작...")
-    total = len(stocks)
-    total_inserted = 0
-    error_count = 0
-    BATCH = 50
-    WORKERS = 10
-
-    for batch_start in range(0, total, BATCH):
-        batch = stocks[batch_start:batch_start + BATCH]
-        print(f"  진행: {batch_start}/{total} (누적 {total_inserted}개, 에러 {error_count}개)", flush=True)
-
-        # 병렬 HTTP 요청
-        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
-            futures = [
-                executor.submit(
-                    _fetch_one, "/stable/income-statement", api_key,
-                    {"symbol": s["ticker"], "period": "annual", "limit": 30}, s
-                )
-                for s in batch
-            ]
-            for future in as_completed(futures):
-                stock, data, err = future.result()
-                if err:
-                    error_count += 1
-                    if error_count <= 10:
-                        print(f"  [ERR] {stock['ticker']}: {err}")
-                elif data:
-                    inserted = _insert_financials(conn, stock["id"], data)
-                    total_inserted += inserted
-
-        conn.commit()
-        time.sleep(0.5)  # 배치 간 딜레이 (rate limit 방지)
-
-    if error_count > 10:
-        print(f"  [WARN] 총 {error_count}개 에러")
+    total_inserted, _ = _collect_per_stock(
+        conn, api_key, stocks, "/stable/income-statement",
+        lambda s: {"symbol": s["ticker"], "period": "annual", "limit": 30},
+        _insert_financials,
+    )
     print(f"[재무 수집] Income Statement 완료: +{total_inserted}개")
     return total_inserted
 
@@ -211,41 +188,13 @@ def _insert_earnings(conn, stock_id, records):
 
 
 def _collect_earnings(conn, api_key, stocks):
-    """전 종목 earnings 데이터 수집 (멀티스레드)"""
+    """전 종목 earnings 데이터 수집 (비동기, 분당 호출 한도 준수)"""
     print("[재무 수집] Earnings 시작...")
-    total = len(stocks)
-    total_inserted = 0
-    error_count = 0
-    BATCH = 50
-    WORKERS = 10
-
-    for batch_start in range(0, total, BATCH):
-        batch = stocks[batch_start:batch_start + BATCH]
-        print(f"  진행: {batch_start}/{total} (누적 {total_inserted}개, 에러 {error_count}개)", flush=True)
-
-        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
-            futures = [
-                executor.submit(
-                    _fetch_one, "/stable/earnings", api_key,
-                    {"symbol": s["ticker"], "limit": 100}, s
-                )
-                for s in batch
-            ]
-            for future in as_completed(futures):
-                stock, data, err = future.result()
-                if err:
-                    error_count += 1
-                    if error_count <= 10:
-                        print(f"  [ERR] {stock['ticker']}: {err}")
-                elif data:
-                    inserted = _insert_earnings(conn, stock["id"], data)
-                    total_inserted += inserted
-
-        conn.commit()
-        time.sleep(0.5)  # 배치 간 딜레이 (rate limit 방지)
-
-    if error_count > 10:
-        print(f"  [WARN] 총 {error_count}개 에러")
+    total_inserted, _ = _collect_per_stock(
+        conn, api_key, stocks, "/stable/earnings",
+        lambda s: {"symbol": s["ticker"], "limit": 100},
+        _insert_earnings,
+    )
     print(f"[재무 수집] Earnings 완료: +{total_inserted}개")
     return total_inserted
 
@@ -274,41 +223,13 @@ def _insert_market_caps(conn, stock_id, records):
 
 
 def _collect_market_caps(conn, api_key, stocks, start_date="2016-01-01"):
-    """전 종목 historical market cap 수집 (멀티스레드)"""
+    """전 종목 historical market cap 수집 (비동기, 분당 호출 한도 준수)"""
     print(f"[시총 수집] Historical Market Cap 시작 (from {start_date})...")
-    total = len(stocks)
-    total_inserted = 0
-    error_count = 0
-    BATCH = 50
-    WORKERS = 10
-
-    for batch_start in range(0, total, BATCH):
-        batch = stocks[batch_start:batch_start + BATCH]
-        print(f"  진행: {batch_start}/{total} (누적 {total_inserted}개, 에러 {error_count}개)", flush=True)
-
-        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
-            futures = [
-                executor.submit(
-                    _fetch_one, "/stable/historical-market-capitalization", api_key,
-                    {"symbol": s["ticker"], "from": start_date}, s
-                )
-                for s in batch
-            ]
-            for future in as_completed(futures):
-                stock, data, err = future.result()
-                if err:
-                    error_count += 1
-                    if error_count <= 10:
-                        print(f"  [ERR] {stock['ticker']}: {err}")
-                elif data:
-                    inserted = _insert_market_caps(conn, stock["id"], data)
-                    total_inserted += inserted
-
-        conn.commit()
-        time.sleep(0.5)
-
-    if error_count > 10:
-        print(f"  [WARN] 총 {error_count}개 에러")
+    total_inserted, _ = _collect_per_stock(
+        conn, api_key, stocks, "/stable/historical-market-capitalization",
+        lambda s: {"symbol": s["ticker"], "from": start_date},
+        _insert_market_caps,
+    )
     print(f"[시총 수집] 완료: +{total_inserted}개")
     return total_inserted
 
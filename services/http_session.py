@@ -0,0 +1,121 @@
+"""
+외부 API 공용 HTTP 세션 (keep-alive + 커넥션 풀).
+
+FMP / KIS / NASDAQ 호출이 모두 하나의 requests.Session 을 공유하므로
+호스트별 TCP+TLS 연결이 재사용됨 (요청마다 핸드셰이크하지 않음).
+urllib3 커넥션 풀은 스레드 안전하며, 풀 크기는 동시 요청 수 이상이어야
+초과 연결이 버려지지 않음 → Settings.HTTP_POOL_SIZE (기본 20).
+
+connection_stats() 로 호스트별 신규 연결(핸드셰이크) 수와 요청 수를 확인.
+카운터는 프로세스 누적이므로 단계별 통계는 시작 시 스냅샷을 받아 차이로 출력:
+
+    before = connection_stats()
+    ...
+    print_connection_stats("FMP", since=before)
+"""
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 20
+POOL_HOSTS = 10  # 호스트별 풀을 유지할 개수 (FMP, KIS, NASDAQ 등)
+
+_session = None
+_lock = threading.Lock()
+
+# POOL_HOSTS 초과로 밀려난(또는 clear 된) 호스트 풀의 카운터 (누적 통계에서 사라지지 않도록)
+_retired = {}
+_retired_lock = threading.Lock()
+
+
+def _pool_size():
+    try:
+        from config.settings import Settings
+        return Settings().HTTP_POOL_SIZE
+    except Exception:
+        return DEFAULT_POOL_SIZE
+
+
+def get_session(pool_size=None):
+    """프로세스 공용 세션 반환 (최초 호출 시 생성)"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                size = pool_size or _pool_size()
+                adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=size)
+                _track_evictions(adapter)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _host(pool):
+    return f"{pool.host}:{pool.port}" if pool.port else pool.host
+
+
+def _add_counts(stats, host, connections, requests_):
+    s = stats.setdefault(host, {"connections": 0, "requests": 0})
+    s["connections"] += connections
+    s["requests"] += requests_
+
+
+def _track_evictions(adapter):
+    """풀 매니저에서 호스트 풀이 빠질 때 카운터를 _retired 에 더한 뒤 원래 정리 함수 호출"""
+    pools = adapter.poolmanager.pools
+    dispose = pools.dispose_func
+
+    def retire(pool):
+        with _retired_lock:
+            _add_counts(_retired, _host(pool), pool.num_connections, pool.num_requests)
+        if dispose:
+            dispose(pool)
+
+    pools.dispose_func = retire
+
+
+def connection_stats(since=None):
+    """호스트별 연결 통계. {host: {"connections", "requests", "reused"}}
+
+    connections = 새로 연 연결 수 (= 핸드셰이크 수), reused = 기존 연결로 보낸 요청 수
+    since: 이전 connection_stats() 결과 — 주면 그 이후 증가분만 (요청이 없던 호스트 제외)
+    """
+    if _session is None:
+        return {}
+
+    with _retired_lock:
+        stats = {host: dict(s) for host, s in _retired.items()}
+    seen = set()
+    for adapter in _session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            _add_counts(stats, _host(pool), pool.num_connections, pool.num_requests)
+
+    if since:
+        for host, s in stats.items():
+            base = since.get(host)
+            if base:
+                s["connections"] = max(0, s["connections"] - base["connections"])
+                s["requests"] = max(0, s["requests"] - base["requests"])
+        stats = {host: s for host, s in stats.items() if s["requests"]}
+
+    for s in stats.values():
+        s["reused"] = max(0, s["requests"] - s["connections"])
+    return stats
+
+
+def print_connection_stats(label="HTTP", since=None):
+    """호스트별 핸드셰이크/재사용 통계 출력 (since: 단계 시작 시 connection_stats() 스냅샷)"""
+    for host, s in connection_stats(since).items():
+        rate = s["reused"] / s["requests"] * 100 if s["requests"] else 0
+        print(f"  [{label}] {host}: 요청 {s['requests']:,}건, "
+              f"신규 연결 {s['connections']}개, 재사용 {rate:.1f}%")
@@ -5,10 +5,10 @@ Adapted from asset_us kis_service.py
 
 import json
 import time
-import requests
 from datetime import datetime
 from pathlib import Path
 from config.settings import Settings
+from services.http_session import get_session
 
 TOKEN_CACHE_FILE = Path(__file__).resolve().parent.parent / ".token_cache.json"
 
@@ -27,6 +27,7 @@ class KISClient:
         self._token_expired = None
         self._last_call_time = 0
         self._min_interval = 0.5
+        self._session = get_session()
 
         self._load_token_cache()
 
@@ -73,7 +74,7 @@ class KISClient:
         }
 
         self._wait_for_rate_limit()
-        response = requests.post(url, headers=headers, data=json.dumps(body))
+        response = self._session.post(url, headers=headers, data=json.dumps(body))
 
         if response.status_code == 403:
             if self._access_token:
@@ -123,7 +124,7 @@ class KISClient:
         }
 
         self._wait_for_rate_limit()
-        response = requests.get(url, headers=headers, params=params)
+        response = self._session.get(url, headers=headers, params=params)
 
         if response.status_code != 200:
             return []
@@ -1,73 +1,385 @@
 """
 이동평균선(MA50/150/200) 계산.
 bs_daily_prices 테이블의 ma50, ma150, ma200 컬럼 업데이트.
+
+종가를 종목 단위로 한 번 읽어 NumPy 누적합(cumsum) 차분으로 MA 를 구하고,
+결과는 임시 테이블에 다중행 INSERT 후 JOIN UPDATE 한 번으로 반영
+(종목마다 윈도 함수 / 상관 서브쿼리 UPDATE 를 실행하지 않음).
+
+일일(latest_only) 모드는 data/ma_state.npz 에 저장된 종목별 롤링 상태
+(최근 200개 종가 링 버퍼 + 기간별 합계)에 새 봉만 더하고 빼서 갱신하므로
+이력 길이와 무관하게 새 봉 수에 비례. 새 봉이 있는 종목은 링 버퍼 윈도의
+행 수/종가 합을 DB 측 COUNT/SUM 과 비교해(윈도 행을 다시 읽지 않음) 다르면
+(수정주가 반영, 과거 날짜 추가/삭제 등) 그 종목만 전체 재계산. 합계는 매 실행
+링 버퍼에서 다시 더해 부동소수 누적 오차가 쌓이지 않게 함.
 """
 
-import pymysql
+import os
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+
+from services.price_stream import iter_stock_arrays
 
 MA_PERIODS = [50, 150, 200]
 
-# 전체 백필용 (종목별 전 기간)
-_UPDATE_ALL_SQL = """
+STOCK_CHUNK = 200          # 백필: 한 번에 읽는 종목 수 (버퍼 메모리 제한)
+WRITE_CHUNK_ROWS = 200_000  # 임시 테이블 → JOIN UPDATE 단위
+LATEST_LOOKBACK_DAYS = 400  # 최신일 모드: MA200 계산용 캘린더일 (거래일 200일 + 여유)
+
+STATE_PATH = Path(__file__).resolve().parent.parent / "data" / "ma_state.npz"
+STATE_VERSION = 2
+WINDOW_TOL = 5e-5  # 링 버퍼 합 ↔ DB SUM 허용 오차 (DECIMAL(12,4) 1틱 정정도 잡히도록 반 틱)
+
+_CREATE_TMP_SQL = """
+CREATE TEMPORARY TABLE _tmp_ma (
+    stock_id INT NOT NULL,
+    trade_date DATE NOT NULL,
+    ma50 DECIMAL(12,4),
+    ma150 DECIMAL(12,4),
+    ma200 DECIMAL(12,4),
+    PRIMARY KEY (stock_id, trade_date)
+) ENGINE=MEMORY
+"""
+
+_INSERT_TMP_SQL = (
+    "INSERT INTO _tmp_ma (stock_id, trade_date, ma50, ma150, ma200) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+
+_CREATE_STATE_SQL = """
+CREATE TEMPORARY TABLE {name} (
+    stock_id INT NOT NULL PRIMARY KEY,
+    window_from DATE NULL,
+    last_date DATE NOT NULL
+) ENGINE=MEMORY
+"""
+
+# 종목별 last_date 이후 봉만 (PK (stock_id, trade_date) 범위 탐색)
+_NEW_BARS_SQL = """
+SELECT p.stock_id, p.trade_date, p.close_price
+FROM _tmp_ma_state t
+JOIN bs_daily_prices p ON p.stock_id = t.stock_id AND p.trade_date > t.last_date
+ORDER BY p.stock_id, p.trade_date
+"""
+
+# 링 버퍼 윈도 [window_from, last_date] 의 행 수/종가 합 (window_from NULL = 전체 이력)
+_WINDOW_CHECK_SQL = """
+SELECT t.stock_id, COUNT(*), SUM(p.close_price)
+FROM _tmp_ma_check t
+JOIN bs_daily_prices p ON p.stock_id = t.stock_id AND p.trade_date <= t.last_date
+     AND (t.window_from IS NULL OR p.trade_date >= t.window_from)
+GROUP BY t.stock_id
+"""
+
+_JOIN_UPDATE_SQL = """
 UPDATE bs_daily_prices p
-JOIN (
-    SELECT id,
-        CASE WHEN ROW_NUMBER() OVER w >= 50
-             THEN AVG(close_price) OVER (ORDER BY trade_date ROWS BETWEEN 49 PRECEDING AND CURRENT ROW)
-        END as ma50,
-        CASE WHEN ROW_NUMBER() OVER w >= 150
-             THEN AVG(close_price) OVER (ORDER BY trade_date ROWS BETWEEN 149 PRECEDING AND CURRENT ROW)
-        END as ma150,
-        CASE WHEN ROW_NUMBER() OVER w >= 200
-             THEN AVG(close_price) OVER (ORDER BY trade_date ROWS BETWEEN 199 PRECEDING AND CURRENT ROW)
-        END as ma200
-    FROM bs_daily_prices
-    WHERE stock_id = %s
-    WINDOW w AS (ORDER BY trade_date)
-) calc ON p.id = calc.id
-SET p.ma50 = calc.ma50, p.ma150 = calc.ma150, p.ma200 = calc.ma200
+JOIN _tmp_ma t ON p.stock_id = t.stock_id AND p.trade_date = t.trade_date
+SET p.ma50 = t.ma50, p.ma150 = t.ma150, p.ma200 = t.ma200
 """
 
-# 일일 업데이트용 (최신일만, 최근 200일 종가로 계산)
-_UPDATE_LATEST_SQL = """
-UPDATE bs_daily_prices dp
-SET
-    ma50 = (
-        SELECT AVG(sub.close_price) FROM (
-            SELECT close_price FROM bs_daily_prices
-            WHERE stock_id = dp.stock_id AND trade_date <= dp.trade_date
-            ORDER BY trade_date DESC LIMIT 50
-        ) sub
-        HAVING COUNT(*) = 50
-    ),
-    ma150 = (
-        SELECT AVG(sub.close_price) FROM (
-            SELECT close_price FROM bs_daily_prices
-            WHERE stock_id = dp.stock_id AND trade_date <= dp.trade_date
-            ORDER BY trade_date DESC LIMIT 150
-        ) sub
-        HAVING COUNT(*) = 150
-    ),
-    ma200 = (
-        SELECT AVG(sub.close_price) FROM (
-            SELECT close_price FROM bs_daily_prices
-            WHERE stock_id = dp.stock_id AND trade_date <= dp.trade_date
-            ORDER BY trade_date DESC LIMIT 200
-        ) sub
-        HAVING COUNT(*) = 200
+
+def rolling_means(close, periods=MA_PERIODS):
+    """종가 배열 → {period: MA 배열}. 데이터가 period 개 미만인 앞부분은 NaN."""
+    close = np.asarray(close, dtype=np.float64)
+    csum = np.concatenate(([0.0], np.cumsum(close)))
+    result = {}
+    for p in periods:
+        ma = np.full(len(close), np.nan)
+        if len(close) >= p:
+            ma[p - 1:] = (csum[p:] - csum[:-p]) / p
+        result[p] = ma
+    return result
+
+
+def _ma_value(x):
+    return None if np.isnan(x) else round(float(x), 4)
+
+
+def _ma_rows(sid, dates, mas):
+    """임시 테이블 INSERT 용 튜플 목록"""
+    m50, m150, m200 = (mas[p] for p in MA_PERIODS)
+    return [
+        (int(sid), str(dates[i]), _ma_value(m50[i]), _ma_value(m150[i]), _ma_value(m200[i]))
+        for i in range(len(dates))
+    ]
+
+
+def _write_back(conn, rows):
+    """임시 테이블에 INSERT 후 JOIN UPDATE 한 번. 업데이트된 행 수 반환."""
+    if not rows:
+        return 0
+    cursor = conn.cursor()
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS _tmp_ma")
+    cursor.execute(_CREATE_TMP_SQL)
+    cursor.executemany(_INSERT_TMP_SQL, rows)
+    cursor.execute(_JOIN_UPDATE_SQL)
+    updated = cursor.rowcount
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS _tmp_ma")
+    conn.commit()
+    return updated
+
+
+def _backfill(conn, stock_ids, state=None):
+    """전 기간 MA 재계산 (종목 청크 단위로 읽기 → 계산 → 쓰기)
+
+    state 가 주어지면 종목별 롤링 상태도 함께 재구성.
+    """
+    total = len(stock_ids)
+    update_count = 0
+    pending = []
+
+    for chunk_start in range(0, total, STOCK_CHUNK):
+        chunk = stock_ids[chunk_start:chunk_start + STOCK_CHUNK]
+        placeholders = ",".join(["%s"] * len(chunk))
+        # 스트림을 끝까지 소비한 뒤 같은 연결로 쓰기
+        arrays = list(iter_stock_arrays(
+            conn, ["trade_date", "close"],
+            where=f"stock_id IN ({placeholders})", params=list(chunk),
+        ))
+
+        for sid, cols in arrays:
+            mas = rolling_means(cols["close"])
+            pending.extend(_ma_rows(sid, cols["trade_date"], mas))
+            if state is not None:
+                state[sid] = _new_entry(cols["close"], cols["trade_date"])
+            if len(pending) >= WRITE_CHUNK_ROWS:
+                update_count += _write_back(conn, pending)
+                pending = []
+
+        done = min(chunk_start + STOCK_CHUNK, total)
+        print(f"  진행: {done}/{total} ({update_count + len(pending):,}행)", flush=True)
+
+    update_count += _write_back(conn, pending)
+    return update_count
+
+
+def _latest(conn, stock_ids, latest_date, state=None):
+    """최신 거래일 MA 만 계산 (종목별 최근 종가 윈도우 로드)
+
+    state 가 주어지면 로드한 윈도우로 롤링 상태를 만듦 (상태 파일 최초 생성).
+    윈도우만 읽으므로 count 는 실제 이력 길이가 아닌 윈도우 길이 (MA 판정에는 충분).
+    """
+    target = set(stock_ids)
+    since = latest_date - timedelta(days=LATEST_LOOKBACK_DAYS)
+    closes = {}
+    for sid, cols in iter_stock_arrays(conn, ["trade_date", "close"],
+                                       where="trade_date >= %s", params=(since,)):
+        if sid in target:
+            closes[sid] = cols
+
+    # 거래정지 등으로 윈도우 안에 200일이 안 되는 종목은 전체 이력으로 다시 로드
+    short = [sid for sid, cols in closes.items() if len(cols["close"]) < max(MA_PERIODS)]
+    if short:
+        placeholders = ",".join(["%s"] * len(short))
+        for sid, cols in iter_stock_arrays(conn, ["trade_date", "close"],
+                                           where=f"stock_id IN ({placeholders})", params=short):
+            closes[sid] = cols
+
+    rows = []
+    for sid, cols in closes.items():
+        mas = rolling_means(cols["close"][-max(MA_PERIODS):])
+        rows.append((int(sid), str(cols["trade_date"][-1]),
+                     *(_ma_value(mas[p][-1]) for p in MA_PERIODS)))
+        if state is not None:
+            state[sid] = _new_entry(cols["close"], cols["trade_date"])
+    return _write_back(conn, rows)
+
+
+# ── 롤링 상태 (일일 증분) ──────────────────────────────────
+
+def _new_entry(close, dates):
+    """종가/날짜 이력(과거→최근) → 롤링 상태 1종목
+
+    ring: 최근 RING 개 종가 (pos 가 다음 기록 위치), dates: ring 과 같은 위치의 거래일,
+    sums: 기간별 최근 min(count, p)개 합
+    """
+    ring_len = max(MA_PERIODS)
+    tail = np.asarray(close[-ring_len:], dtype=np.float64)
+    ring = np.zeros(ring_len)
+    ring[:len(tail)] = tail
+    ring_dates = np.zeros(ring_len, dtype="datetime64[D]")
+    ring_dates[:len(tail)] = np.asarray(dates[-ring_len:], dtype="datetime64[D]")
+    return {
+        "ring": ring,
+        "dates": ring_dates,
+        "pos": len(tail) % ring_len,
+        "count": len(close),
+        "sums": np.array([tail[-p:].sum() for p in MA_PERIODS]),
+        "last_date": np.datetime64(dates[-1], "D"),
+    }
+
+
+def _push(entry, close, trade_date):
+    """새 종가 1개 반영 (기간별 합계에 더하고 창 밖으로 나간 값을 뺌). MA 튜플 반환."""
+    ring = entry["ring"]
+    ring_len = len(ring)
+    pos = entry["pos"]
+    for k, p in enumerate(MA_PERIODS):
+        if entry["count"] >= p:
+            entry["sums"][k] -= ring[(pos - p) % ring_len]
+        entry["sums"][k] += close
+    ring[pos] = close
+    entry["dates"][pos] = trade_date
+    entry["pos"] = (pos + 1) % ring_len
+    entry["count"] += 1
+    entry["last_date"] = np.datetime64(trade_date, "D")
+    return tuple(
+        round(float(entry["sums"][k] / p), 4) if entry["count"] >= p else None
+        for k, p in enumerate(MA_PERIODS)
     )
-WHERE dp.stock_id = %s AND dp.trade_date = %s
-"""
+
+
+def _ring_window(entry):
+    """링 버퍼 → 최근 min(count, RING)개 종가 (과거→최근 순)"""
+    ring, pos = entry["ring"], entry["pos"]
+    if entry["count"] < len(ring):
+        return ring[:pos]
+    return np.concatenate((ring[pos:], ring[:pos]))
+
+
+def _window_from(entry):
+    """링 버퍼의 가장 오래된 거래일 (이력이 RING 개 미만이면 None = 전체 이력)"""
+    if entry["count"] < len(entry["ring"]):
+        return None
+    return str(entry["dates"][entry["pos"]])
+
+
+def _resum(entry):
+    """기간별 합계를 링 버퍼에서 다시 계산 (증분 덧셈/뺄셈의 누적 오차 제거)"""
+    window = _ring_window(entry)
+    entry["sums"] = np.array([window[-p:].sum() for p in MA_PERIODS])
+
+
+def _window_matches(entry, db_count, db_sum):
+    """DB 의 윈도 [window_from, last_date] 행 수/종가 합이 링 버퍼와 같은지.
+
+    윈도 안 종가 정정(합계), 과거 날짜 추가/삭제(행 수)를 잡음.
+    이력이 RING 개 미만인 종목은 last_date 이하 전체 이력과 비교.
+    """
+    window = _ring_window(entry)
+    return db_count == len(window) and abs(db_sum - window.sum()) <= WINDOW_TOL
+
+
+def load_ma_state(path=STATE_PATH):
+    """상태 파일 → {stock_id: entry}. 없거나 버전/기간이 다르면 None."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        with np.load(path) as f:
+            if int(f["version"]) != STATE_VERSION or list(f["periods"]) != MA_PERIODS:
+                return None
+            return {
+                int(sid): {
+                    "ring": f["ring"][i].copy(),
+                    "dates": f["dates"][i].copy(),
+                    "pos": int(f["pos"][i]),
+                    "count": int(f["count"][i]),
+                    "sums": f["sums"][i].copy(),
+                    "last_date": f["last_date"][i],
+                }
+                for i, sid in enumerate(f["stock_ids"])
+            }
+    except Exception as e:
+        print(f"  [WARN] MA 상태 파일 읽기 실패 ({e}) → 전체 계산")
+        return None
+
+
+def save_ma_state(state, path=STATE_PATH):
+    """{stock_id: entry} → npz (임시 파일에 쓴 뒤 교체)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sids = sorted(state)
+    tmp = path.with_name(path.stem + ".tmp.npz")
+    np.savez(
+        tmp,
+        version=STATE_VERSION,
+        periods=np.array(MA_PERIODS),
+        stock_ids=np.array(sids, dtype=np.int64),
+        ring=np.array([state[s]["ring"] for s in sids]).reshape(len(sids), max(MA_PERIODS)),
+        dates=np.array([state[s]["dates"] for s in sids], dtype="datetime64[D]").reshape(len(sids), max(MA_PERIODS)),
+        pos=np.array([state[s]["pos"] for s in sids], dtype=np.int64),
+        count=np.array([state[s]["count"] for s in sids], dtype=np.int64),
+        sums=np.array([state[s]["sums"] for s in sids]).reshape(len(sids), len(MA_PERIODS)),
+        last_date=np.array([state[s]["last_date"] for s in sids], dtype="datetime64[D]"),
+    )
+    os.replace(tmp, path)
+
+
+def _fill_tmp_state(cursor, name, rows):
+    """(stock_id, window_from, last_date) 목록 → 임시 테이블 name"""
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {name}")
+    cursor.execute(_CREATE_STATE_SQL.format(name=name))
+    for start in range(0, len(rows), WRITE_CHUNK_ROWS):
+        cursor.executemany(
+            f"INSERT INTO {name} (stock_id, window_from, last_date) VALUES (%s, %s, %s)",
+            rows[start:start + WRITE_CHUNK_ROWS],
+        )
+
+
+def _incremental(conn, state):
+    """상태의 마지막 봉 이후 새 봉만 반영. 윈도 불일치/신규 종목은 전체 재계산.
+
+    읽는 행: 종목별 last_date 이후 새 봉 + 새 봉이 있는 종목의 윈도 행 수/합계 (DB 집계 1행)
+    → 링 버퍼 윈도(200봉)를 다시 읽지 않음.
+    """
+    cursor = conn.cursor()
+    newest = max(e["last_date"] for e in state.values())
+
+    # 1) 종목별 last_date 이후 새 봉 (상태 테이블 JOIN — 오래 끊긴 종목이 범위를 넓히지 않음)
+    _fill_tmp_state(cursor, "_tmp_ma_state",
+                    [(int(sid), None, str(e["last_date"])) for sid, e in state.items()])
+    cursor.execute(_NEW_BARS_SQL)
+    new_rows = {}
+    for sid, trade_date, close in cursor.fetchall():
+        new_rows.setdefault(sid, []).append((trade_date, float(close)))
+
+    # 상태에 없는 신규 종목
+    cursor.execute("SELECT DISTINCT stock_id FROM bs_daily_prices WHERE trade_date > %s", (str(newest),))
+    recompute = [sid for (sid,) in cursor.fetchall() if sid not in state]
+
+    # 2) 새 봉이 있는 종목만 윈도 검증 (DB 측 COUNT/SUM)
+    db_window = {}
+    if new_rows:
+        _fill_tmp_state(cursor, "_tmp_ma_check", [
+            (int(sid), _window_from(state[sid]), str(state[sid]["last_date"])) for sid in new_rows
+        ])
+        cursor.execute(_WINDOW_CHECK_SQL)
+        db_window = {sid: (int(cnt), float(total or 0)) for sid, cnt, total in cursor.fetchall()}
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS _tmp_ma_state")
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS _tmp_ma_check")
+
+    rows = []
+    new_bars = 0
+    for sid, bars in new_rows.items():
+        entry = state[sid]
+        if not _window_matches(entry, *db_window.get(sid, (0, 0.0))):
+            recompute.append(sid)
+            continue
+        _resum(entry)
+        for trade_date, close in bars:
+            rows.append((int(sid), str(trade_date), *_push(entry, close, trade_date)))
+            new_bars += 1
+
+    updated = _write_back(conn, rows)
+    print(f"  증분: 새 봉 {new_bars:,}개, 재계산 대상 {len(recompute)}개 종목")
+    if recompute:
+        updated += _backfill(conn, recompute, state=state)
+    return updated
 
 
 def calculate_moving_averages(conn, stock_ids=None, latest_only=False):
     """전 종목 MA50/150/200 계산 → bs_daily_prices 업데이트
 
     latest_only=True: 최신 거래일만 계산 (일일 업데이트용, 빠름)
-    latest_only=False: 전 기간 계산 (초기 백필용, 느림)
+    latest_only=False: 전 기간 계산 (초기 백필용)
     """
     cursor = conn.cursor()
 
+    # 전 종목 계산일 때만 롤링 상태를 새로 씀 (일부 종목 재계산은 기존 상태에 영향 없음)
+    rebuild_state = stock_ids is None
     if stock_ids is None:
         cursor.execute("SELECT DISTINCT stock_id FROM bs_daily_prices ORDER BY stock_id")
         stock_ids = [r[0] for r in cursor.fetchall()]
@@ -75,38 +387,39 @@ def calculate_moving_averages(conn, stock_ids=None, latest_only=False):
     total = len(stock_ids)
 
     if latest_only:
-        # 최신 거래일 확인
-        cursor.execute("SELECT MAX(trade_date) FROM bs_daily_prices")
-        latest_date = cursor.fetchone()[0]
-        if not latest_date:
-            print("[이동평균] 데이터 없음")
-            return
-
-        # 최신일에 데이터가 있는 종목만
-        cursor.execute(
-            "SELECT DISTINCT stock_id FROM bs_daily_prices WHERE trade_date = %s",
-            (latest_date,),
-        )
-        stock_ids = [r[0] for r in cursor.fetchall()]
-        total = len(stock_ids)
-
-        print(f"[이동평균] {latest_date} 최신일 {total}개 종목 MA 계산...")
+        state = load_ma_state()
+        if state:
+            print(f"[이동평균] 롤링 상태 {len(state)}개 종목 기준 증분 계산...")
+            updated = _incremental(conn, state)
+            print(f"  업데이트: {updated:,}행")
+            save_ma_state(state)
+        else:
+            # 최신 거래일 확인
+            cursor.execute("SELECT MAX(trade_date) FROM bs_daily_prices")
+            latest_date = cursor.fetchone()[0]
+            if not latest_date:
+                print("[이동평균] 데이터 없음")
+                return
 
-        for i, sid in enumerate(stock_ids):
-            cursor.execute(_UPDATE_LATEST_SQL, (sid, latest_date))
+            # 최신일에 데이터가 있는 종목만
+            cursor.execute(
+                "SELECT DISTINCT stock_id FROM bs_daily_prices WHERE trade_date = %s",
+                (latest_date,),
+            )
+            stock_ids = [r[0] for r in cursor.fetchall()]
+            total = len(stock_ids)
 
-            if (i + 1) % 500 == 0 or i + 1 == total:
-                conn.commit()
-                print(f"  진행: {i+1}/{total}", flush=True)
+            print(f"[이동평균] {latest_date} 최신일 {total}개 종목 MA 계산...")
+            state = {}
+            updated = _latest(conn, stock_ids, latest_date, state=state)
+            print(f"  업데이트: {updated:,}행")
+            save_ma_state(state)
     else:
         print(f"[이동평균] {total}개 종목 MA50/150/200 전체 계산...")
-
-        for i, sid in enumerate(stock_ids):
-            cursor.execute(_UPDATE_ALL_SQL, (sid,))
-
-            if (i + 1) % 100 == 0 or i + 1 == total:
-                conn.commit()
-                print(f"  진행: {i+1}/{total}", flush=True)
+        state = {} if rebuild_state else None
+        _backfill(conn, list(stock_ids), state=state)
+        if rebuild_state:
+            save_ma_state(state)
 
     conn.commit()
 
@@ -0,0 +1,462 @@
+"""
+로컬 컬럼형 가격 캐시 (memory-mapped NumPy).
+
+bs_daily_prices 의 OHLCV/MA/RS 를 컬럼별 .npy 파일로 내보내고,
+백테스트/스캐너 로더가 np.load(mmap_mode="r") 로 바로 매핑해서 사용.
+여러 프로세스가 동시에 읽어도 OS 페이지 캐시를 공유하므로 메모리가 늘지 않음.
+
+레이아웃 (data/price_cache/):
+    stock_ids.npy   int64  [n_stocks]      stock_id 오름차순
+    offsets.npy     int64  [n_stocks + 1]  종목 i 의 행 = offsets[i]:offsets[i+1]
+    trade_date.npy  datetime64[D] [n_rows] 종목별 과거→최신
+    open/high/low/close/ma50/ma150/ma200/rs_*.npy  float32 (NULL = NaN)
+    volume.npy      int64
+    meta.json       행 수, 최신 거래일(워터마크), 생성 시각 (+ 델타 행 수/시작일)
+    delta/          본 캐시 이후 추가된 행 (같은 레이아웃, 일일 갱신이 다시 씀)
+
+일일 갱신(refresh_cache)은 신규 행을 delta/ 에만 쓰고, 최근 PATCH_DAYS 일 내
+MA/RS 등이 바뀐 본 캐시 행은 memmap 으로 제자리 덮어씀 (본 컬럼 파일 재작성 없음).
+델타가 COMPACT_DAYS 를 넘으면 그때 한 번 본 캐시에 병합. 로더는 본 캐시와 델타를
+각각 memmap 으로 반환하고(병합 없음), 종목별 구간은 segment_index 로 찾음.
+"""
+
+import json
+import os
+import shutil
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "price_cache"
+CACHE_VERSION = 1
+PATCH_DAYS = 14  # 일일 MA/RS 갱신이 닿는 최근 기간 (캘린더일)
+COMPACT_DAYS = 30  # 델타 세그먼트가 이 기간(캘린더일)을 넘으면 본 캐시에 병합
+DELTA_DIR = "delta"
+
+# 캐시 컬럼 → (DB 컬럼, dtype)
+CACHE_COLUMNS = {
+    "trade_date": ("trade_date", "datetime64[D]"),
+    "open": ("open_price", "float32"),
+    "high": ("high_price", "float32"),
+    "low": ("low_price", "float32"),
+    "close": ("close_price", "float32"),
+    "volume": ("volume", "int64"),
+    "ma50": ("ma50", "float32"),
+    "ma150": ("ma150", "float32"),
+    "ma200": ("ma200", "float32"),
+    "rs_1m": ("rs_1m", "float32"),
+    "rs_3m": ("rs_3m", "float32"),
+    "rs_6m": ("rs_6m", "float32"),
+}
+
+# NULL 허용 컬럼 (NaN 으로 저장, 튜플 변환 시 None 으로 복원)
+NULLABLE_COLUMNS = {"ma50", "ma150", "ma200", "rs_1m", "rs_3m", "rs_6m"}
+
+# 기존 로더와 같은 튜플 순서
+OHLCV_COLUMNS = ["trade_date", "open", "high", "low", "close", "volume"]
+FULL_COLUMNS = OHLCV_COLUMNS + ["ma50", "ma150", "ma200", "rs_1m", "rs_3m", "rs_6m"]
+
+
+def to_column(values, name, dtype=None):
+    """DB 값 리스트 → 캐시 dtype(또는 지정 dtype) 배열 (Decimal/None 처리)"""
+    dtype = dtype or CACHE_COLUMNS[name][1]
+    if name == "trade_date":
+        return np.array(values, dtype=dtype)
+    if name == "volume":
+        return np.array([int(v) if v is not None else 0 for v in values], dtype=dtype)
+    nan = float("nan")
+    return np.array([float(v) if v is not None else nan for v in values], dtype=dtype)
+
+
+def _write_meta(cache_dir, meta):
+    tmp = cache_dir / "meta.json.tmp"
+    tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    os.replace(tmp, cache_dir / "meta.json")
+
+
+def _swap_dir(tmp_dir, cache_dir):
+    """완성된 임시 디렉터리로 교체 (Windows: 매핑 중인 파일이 있으면 실패)"""
+    if cache_dir.exists():
+        shutil.rmtree(cache_dir)
+    tmp_dir.rename(cache_dir)
+
+
+def build_cache(conn, cache_dir=None):
+    """bs_daily_prices 전체를 컬럼형 캐시로 내보내기 (전체 재생성)"""
+    from services.price_stream import iter_stock_arrays
+
+    cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR)
+    tmp_dir = cache_dir.with_name(cache_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    t0 = time.time()
+    cursor = conn.cursor()
+
+    # COUNT 와 본 쿼리가 같은 스냅샷을 보도록 트랜잭션 고정
+    conn.commit()
+    cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+    cursor.execute("SELECT COUNT(*) FROM bs_daily_prices")
+    total = cursor.fetchone()[0]
+    print(f"[가격 캐시] {total:,}행 내보내기 → {cache_dir}")
+
+    columns = {
+        name: np.lib.format.open_memmap(
+            tmp_dir / f"{name}.npy", mode="w+", dtype=dtype, shape=(total,)
+        )
+        for name, (_, dtype) in CACHE_COLUMNS.items()
+    }
+
+    stock_ids = []
+    starts = []
+    pos = 0
+    for sid, arrays in iter_stock_arrays(conn):
+        n = len(arrays["trade_date"])
+        if pos + n > total:
+            raise RuntimeError("가격 캐시: 내보내는 중 행 수가 바뀌었습니다. 다시 실행하세요.")
+        for name, arr in arrays.items():
+            columns[name][pos:pos + n] = arr
+        stock_ids.append(sid)
+        starts.append(pos)
+        pos += n
+
+        if len(stock_ids) % 500 == 0:
+            print(f"  진행: {len(stock_ids):,}종목, {pos:,}/{total:,}행", flush=True)
+
+    conn.commit()
+
+    for arr in columns.values():
+        arr.flush()
+    del columns
+
+    np.save(tmp_dir / "stock_ids.npy", np.array(stock_ids, dtype=np.int64))
+    np.save(tmp_dir / "offsets.npy", np.array(starts + [pos], dtype=np.int64))
+
+    dates = np.load(tmp_dir / "trade_date.npy", mmap_mode="r")
+    max_date = str(dates.max()) if pos else None
+    min_date = str(dates.min()) if pos else None
+    del dates
+
+    _write_meta(tmp_dir, {
+        "version": CACHE_VERSION,
+        "rows": pos,
+        "stocks": len(stock_ids),
+        "min_date": min_date,
+        "max_date": max_date,
+        "built_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "columns": {name: dtype for name, (_, dtype) in CACHE_COLUMNS.items()},
+    })
+    _swap_dir(tmp_dir, cache_dir)
+
+    print(f"[가격 캐시] 완료: {len(stock_ids):,}종목, {pos:,}행 "
+          f"({min_date} ~ {max_date}, {time.time() - t0:.0f}s)")
+
+
+def _same(a, b):
+    """원소별 동일 여부 (NaN == NaN)"""
+    if a.dtype.kind == "f":
+        return (a == b) | (np.isnan(a) & np.isnan(b))
+    return a == b
+
+
+def _merged_index(stock_ids, offsets, ins_sids):
+    """기존 종목 인덱스 + 삽입 행의 종목 → (새 stock_ids, 새 offsets)"""
+    new_sids = np.union1d(stock_ids, ins_sids)
+    counts = np.zeros(len(new_sids), dtype=np.int64)
+    counts[np.searchsorted(new_sids, stock_ids)] = np.diff(offsets)
+    np.add.at(counts, np.searchsorted(new_sids, ins_sids), 1)
+    return new_sids, np.concatenate(([0], np.cumsum(counts)))
+
+
+def _write_delta(cache_dir, sids, columns):
+    """(stock_id, trade_date) 순으로 정렬된 델타 행 → cache_dir/delta (임시 디렉터리에 쓴 뒤 교체)"""
+    delta_dir = cache_dir / DELTA_DIR
+    tmp_dir = cache_dir / (DELTA_DIR + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    d_sids, starts = np.unique(sids, return_index=True)
+    np.save(tmp_dir / "stock_ids.npy", d_sids.astype(np.int64))
+    np.save(tmp_dir / "offsets.npy", np.concatenate((starts, [len(sids)])).astype(np.int64))
+    for name, arr in columns.items():
+        np.save(tmp_dir / f"{name}.npy", arr)
+    _swap_dir(tmp_dir, delta_dir)
+
+
+def refresh_cache(conn, cache_dir=None, patch_days=PATCH_DAYS):
+    """워터마크 기준 증분 갱신 (본 캐시 컬럼 파일은 다시 쓰지 않음).
+
+    - 최근 patch_days 일(+ 델타 구간): 본 캐시 행 중 값이 바뀐 것만 memmap 으로 제자리 덮어쓰기
+    - 본 캐시 종목 구간 뒤에 붙는 행(신규 종목 포함): delta/ 세그먼트로 다시 씀
+      (델타 구간은 매번 DB 에서 다시 읽으므로 그 안의 MA/RS 갱신도 반영)
+    - 종목 구간 중간에 끼는 행이 있거나 델타가 COMPACT_DAYS 를 넘으면 본 캐시에 병합
+    과거 구간 백필(MA/RS --backfill, 주가 --reset)은 build_cache 로 전체 재생성할 것.
+    """
+    cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR)
+    meta = _read_meta(cache_dir)
+    if meta is None or not meta["rows"]:
+        print("[가격 캐시] 캐시 없음 → 전체 생성")
+        build_cache(conn, cache_dir)
+        return
+
+    t0 = time.time()
+    base = _load_dir(cache_dir, CACHE_COLUMNS)
+    delta = _load_dir(cache_dir / DELTA_DIR, CACHE_COLUMNS) if meta.get("delta_rows") else None
+    patch_from = (datetime.strptime(meta["max_date"], "%Y-%m-%d") - timedelta(days=patch_days)).date()
+    if meta.get("delta_from"):
+        patch_from = min(patch_from, datetime.strptime(meta["delta_from"], "%Y-%m-%d").date())
+
+    db_cols = ", ".join(db_col for db_col, _ in CACHE_COLUMNS.values())
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""SELECT stock_id, {db_cols} FROM bs_daily_prices
+            WHERE trade_date >= %s ORDER BY stock_id, trade_date""",
+        (patch_from,),
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        print(f"[가격 캐시] {patch_from} 이후 데이터 없음 → 변경 없음")
+        return
+
+    # 본 캐시에 없는 종목(이전 델타의 신규 종목 포함)은 전체 이력을 가져옴
+    stock_ids = np.asarray(base["stock_ids"])
+    offsets = np.asarray(base["offsets"])
+    known_sids = set(stock_ids.tolist())
+    new_sids = {r[0] for r in rows} - known_sids
+    if delta is not None:
+        new_sids |= set(np.asarray(delta["stock_ids"]).tolist()) - known_sids
+    if new_sids:
+        new_sids = sorted(new_sids)
+        placeholders = ", ".join(["%s"] * len(new_sids))
+        cursor.execute(
+            f"""SELECT stock_id, {db_cols} FROM bs_daily_prices
+                WHERE stock_id IN ({placeholders}) ORDER BY stock_id, trade_date""",
+            new_sids,
+        )
+        rows = [r for r in rows if r[0] in known_sids] + list(cursor.fetchall())
+        rows.sort(key=lambda r: (r[0], r[1]))
+
+    fields = list(zip(*rows))
+    sids = np.array(fields[0], dtype=np.int64)
+    fetched = {name: to_column(values, name) for name, values in zip(CACHE_COLUMNS, fields[1:])}
+    dates = fetched["trade_date"]
+    cached_dates = base["trade_date"]
+
+    # 가져온 행 → 본 캐시 내 위치 (기존 행이면 덮어쓰기, 없으면 삽입 위치)
+    k = np.searchsorted(stock_ids, sids)
+    known = (k < len(stock_ids)) & (stock_ids[np.minimum(k, len(stock_ids) - 1)] == sids)
+    pos = offsets[k].copy()  # 신규 종목: 다음 종목 구간 시작 위치
+    exists = np.zeros(len(sids), dtype=bool)
+    appended = ~known  # 종목 구간 끝에 붙는 행 (신규 종목은 전부)
+
+    bounds = np.flatnonzero(np.diff(sids)) + 1
+    for g_start, g_end in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(sids)]))):
+        if not known[g_start]:
+            continue
+        s, e = offsets[k[g_start]], offsets[k[g_start] + 1]
+        seg = cached_dates[s:e]
+        lo = np.searchsorted(seg, seg.dtype.type(patch_from)) if len(seg) else 0
+        tail = seg[lo:]
+        j = np.searchsorted(tail, dates[g_start:g_end])
+        hit = j < len(tail)
+        hit[hit] = tail[j[hit]] == dates[g_start:g_end][hit]
+        pos[g_start:g_end] = s + lo + j
+        exists[g_start:g_end] = hit
+        appended[g_start:g_end] = j == len(tail)
+
+    # 덮어쓸 행: 본 캐시 행 중 값이 바뀐 것
+    upd_pos = pos[exists]
+    changed = np.zeros(len(upd_pos), dtype=bool)
+    for name in CACHE_COLUMNS:
+        changed |= ~_same(np.asarray(base[name][upd_pos]), fetched[name][exists])
+    upd_idx = np.flatnonzero(exists)[changed]
+    upd_pos = upd_pos[changed]
+
+    ins_idx = np.flatnonzero(~exists)
+    late = int((~exists & ~appended).sum())  # 종목 구간 중간에 끼는 행
+    delta_dates = dates[ins_idx[known[ins_idx]]]
+    max_date = max(np.datetime64(meta.get("base_max_date", meta["max_date"]), "D"),
+                   dates[ins_idx].max() if len(ins_idx) else np.datetime64(meta["min_date"], "D"))
+    compact = late > 0 or (
+        len(delta_dates) and (max_date - delta_dates.min()).astype(int) > COMPACT_DAYS
+    )
+
+    unchanged_delta = (
+        not compact and len(ins_idx) == meta.get("delta_rows", 0)
+        and (delta is None or (
+            np.array_equal(np.repeat(np.asarray(delta["stock_ids"]), np.diff(delta["offsets"])), sids[ins_idx])
+            and all(_same(np.asarray(delta[name]), fetched[name][ins_idx]).all() for name in CACHE_COLUMNS)
+        ))
+    )
+    if not len(upd_idx) and unchanged_delta:
+        print(f"[가격 캐시] 변경 없음 (~{meta['max_date']})")
+        return
+
+    base_rows = int(offsets[-1])
+    del base, cached_dates
+    if len(upd_idx):
+        # 본 캐시 행 패치: 바뀐 행만 memmap 으로 제자리 쓰기 (파일 재작성 없음)
+        for name in CACHE_COLUMNS:
+            arr = np.load(cache_dir / f"{name}.npy", mmap_mode="r+")
+            arr[upd_pos] = fetched[name][upd_idx]
+            arr.flush()
+            del arr
+
+    min_date = str(min(np.datetime64(meta["min_date"], "D"), dates[ins_idx].min())) if len(ins_idx) else meta["min_date"]
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    if compact:
+        # 병합: 델타(+ 중간 삽입 행)를 본 캐시에 넣어 전체 재작성 (COMPACT_DAYS 주기로 1회)
+        new_sids, new_offsets = _merged_index(stock_ids, offsets, sids[ins_idx])
+        tmp_dir = cache_dir.with_name(cache_dir.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        for name in CACHE_COLUMNS:
+            arr = np.insert(np.load(cache_dir / f"{name}.npy"), pos[ins_idx], fetched[name][ins_idx])
+            np.save(tmp_dir / f"{name}.npy", arr)
+            del arr
+        np.save(tmp_dir / "stock_ids.npy", new_sids)
+        np.save(tmp_dir / "offsets.npy", new_offsets)
+        meta = {key: v for key, v in meta.items() if key not in ("base_rows", "base_max_date", "delta_rows", "delta_from")}
+        _write_meta(tmp_dir, {
+            **meta,
+            "rows": int(new_offsets[-1]),
+            "stocks": len(new_sids),
+            "min_date": min_date,
+            "max_date": str(max_date),
+            "refreshed_at": now,
+        })
+        _swap_dir(tmp_dir, cache_dir)
+        print(f"[가격 캐시] 병합 완료: +{len(ins_idx):,}행 (중간 삽입 {late:,}), {len(upd_idx):,}행 패치, "
+              f"{len(new_sids):,}종목 (~{max_date}, {time.time() - t0:.1f}s)")
+        return
+
+    # 델타 세그먼트 다시 쓰기 (본 캐시 워터마크 이후 행만이라 작음)
+    _write_delta(cache_dir, sids[ins_idx], {name: fetched[name][ins_idx] for name in CACHE_COLUMNS})
+    n_stocks = len(np.union1d(stock_ids, sids[ins_idx]))
+    _write_meta(cache_dir, {
+        **meta,
+        "rows": base_rows + len(ins_idx),
+        "stocks": n_stocks,
+        "min_date": min_date,
+        "max_date": str(max_date),
+        "base_rows": base_rows,
+        "base_max_date": meta.get("base_max_date", meta["max_date"]),
+        "delta_rows": len(ins_idx),
+        "delta_from": str(delta_dates.min()) if len(delta_dates) else None,
+        "refreshed_at": now,
+    })
+
+    print(f"[가격 캐시] 갱신 완료: 델타 {len(ins_idx):,}행, {len(upd_idx):,}행 패치, "
+          f"신규 종목 {n_stocks - len(stock_ids)}개 (~{max_date}, {time.time() - t0:.1f}s)")
+
+
+def cache_exists(cache_dir=None):
+    return (Path(cache_dir or DEFAULT_CACHE_DIR) / "meta.json").exists()
+
+
+def _read_meta(cache_dir):
+    """meta.json → dict. 없으면 None, 버전이 다르면 안내 후 None."""
+    meta_path = cache_dir / "meta.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    if meta.get("version") != CACHE_VERSION:
+        print(f"[가격 캐시] 버전 불일치 ({meta.get('version')}) → 무시. build-cache 를 다시 실행하세요.")
+        return None
+    return meta
+
+
+def _load_dir(path, columns, mmap_mode="r"):
+    """캐시/델타 디렉터리 → {"stock_ids", "offsets", <컬럼명>: np.memmap}"""
+    loaded = {
+        "stock_ids": np.load(path / "stock_ids.npy", mmap_mode=mmap_mode),
+        "offsets": np.load(path / "offsets.npy", mmap_mode=mmap_mode),
+    }
+    for name in columns:
+        loaded[name] = np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+    return loaded
+
+
+def load_price_cache(cache_dir=None, columns=None):
+    """캐시를 memory-map 으로 로드. 캐시가 없으면 None.
+
+    델타 세그먼트도 병합하지 않고 별도 memmap 으로 붙여 반환 (종목 구간은 segment_index).
+    Returns: {"meta", "stock_ids", "offsets", <컬럼명>: np.memmap, ..., "delta": 같은 dict 또는 None}
+    """
+    cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR)
+    meta = _read_meta(cache_dir)
+    if meta is None:
+        return None
+
+    columns = list(CACHE_COLUMNS) if columns is None else list(columns)
+    cache = _load_dir(cache_dir, columns)
+    cache["delta"] = _load_dir(cache_dir / DELTA_DIR, columns) if meta.get("delta_rows") else None
+    cache["meta"] = meta
+    return cache
+
+
+def segment_index(cache):
+    """본 캐시 + 델타의 종목별 행 구간 → (stock_ids, base [n, 2], delta [n, 2])
+
+    stock_ids 는 두 세그먼트의 합집합 (오름차순). 한쪽에 없는 종목은 빈 구간 (start == end).
+    """
+    stock_ids = np.asarray(cache["stock_ids"])
+    offsets = np.asarray(cache["offsets"])
+    delta = cache.get("delta")
+    if delta is None:
+        base = np.column_stack((offsets[:-1], offsets[1:]))
+        return stock_ids, base, np.zeros_like(base)
+
+    d_sids = np.asarray(delta["stock_ids"])
+    d_offsets = np.asarray(delta["offsets"])
+    sids = np.union1d(stock_ids, d_sids)
+    base = np.zeros((len(sids), 2), dtype=np.int64)
+    tail = np.zeros((len(sids), 2), dtype=np.int64)
+    base[np.searchsorted(sids, stock_ids)] = np.column_stack((offsets[:-1], offsets[1:]))
+    tail[np.searchsorted(sids, d_sids)] = np.column_stack((d_offsets[:-1], d_offsets[1:]))
+    return sids, base, tail
+
+
+def segment_arrays(cache, columns, base_seg, delta_seg):
+    """한 종목의 본 + 델타 구간 → {컬럼명: 배열} (델타 행이 있을 때만 종목 단위로 이어붙임)"""
+    (s, e), (ds, de) = base_seg, delta_seg
+    if ds == de:
+        return {name: cache[name][s:e] for name in columns}
+    delta = cache["delta"]
+    return {name: np.concatenate((cache[name][s:e], delta[name][ds:de])) for name in columns}
+
+
+def iter_cached_arrays(cache, columns, stock_ids=None):
+    """캐시에서 (stock_id, {컬럼명: 배열}) 를 종목 순으로 생성 (본 캐시 + 델타)."""
+    sids, base, tail = segment_index(cache)
+    for i, sid in enumerate(sids.tolist()):
+        if stock_ids is not None and sid not in stock_ids:
+            continue
+        if base[i, 0] == base[i, 1] and tail[i, 0] == tail[i, 1]:
+            continue
+        yield sid, segment_arrays(cache, columns, base[i], tail[i])
+
+
+def arrays_to_rows(arrays, columns, date_str=False):
+    """컬럼 배열 dict → 튜플 리스트 [(col1, col2, ...), ...] (기존 로더 호환).
+
+    NULL(NaN) 은 None, trade_date 는 datetime.date (date_str=True 면 "YYYY-MM-DD").
+    """
+    lists = []
+    for name in columns:
+        a = arrays[name]
+        if name == "trade_date" and date_str:
+            lists.append(np.datetime_as_string(a).tolist())
+            continue
+        values = a.tolist()
+        if name in NULLABLE_COLUMNS and np.isnan(a).any():
+            values = [None if v != v else v for v in values]
+        lists.append(values)
+    return list(zip(*lists))
+
+
+def iter_cached_rows(cache, columns, stock_ids=None, date_str=False):
+    """캐시에서 (stock_id, [(col1, col2, ...), ...]) 를 종목 순으로 생성."""
+    for sid, arrays in iter_cached_arrays(cache, columns, stock_ids=stock_ids):
+        yield sid, arrays_to_rows(arrays, columns, date_str=date_str)
@@ -4,14 +4,16 @@ bs_daily_prices 테이블에 OHLCV 데이터 저장.
 """
 
 import time
-import random
+import queue
+import threading
 import pymysql
-import requests
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-FMP_BASE = "https://financialmodelingprep.com"
-MAX_RETRIES = 4
+from services.fmp_fetcher import fetch_all
+from services.http_session import connection_stats, print_connection_stats
+
+COMMIT_EVERY = 50  # 결과 N건마다 커밋
+WRITE_QUEUE_SIZE = 200  # 수집→쓰기 큐 최대 종목 수 (초과 시 수집 일시 정지)
 
 
 def _get_all_stocks(conn, include_delisted=False):
@@ -26,21 +28,28 @@ def _get_all_stocks(conn, include_delisted=False):
     return cursor.fetchall()
 
 
-def _get_latest_date(conn, stock_id):
-    """종목의 가장 최근 데이터 날짜 조회"""
+def _get_latest_dates(conn):
+    """전 종목의 가장 최근 데이터 날짜를 한 번에 조회. {stock_id: date}
+
+    uk_stock_date (stock_id, trade_date) 인덱스로 loose index scan
+    (종목당 인덱스 탐색 1회) → 종목별 MAX 쿼리 수천 번 대신 1회.
+    """
     cursor = conn.cursor()
     cursor.execute(
-        "SELECT MAX(trade_date) FROM bs_daily_prices WHERE stock_id = %s",
-        (stock_id,),
+        "SELECT stock_id, MAX(trade_date) FROM bs_daily_prices GROUP BY stock_id"
     )
-    row = cursor.fetchone()
-    return row[0] if row and row[0] else None
+    return {row[0]: row[1] for row in cursor.fetchall() if row[1]}
 
 
-def _insert_prices(conn, stock_id, prices, after_date=None):
-    """가격 데이터 INSERT (중복 시 무시)"""
-    cursor = conn.cursor()
-    count = 0
+_INSERT_PRICE_SQL = """INSERT IGNORE INTO bs_daily_prices
+   (stock_id, trade_date, open_price, high_price, low_price, close_price, volume)
+   VALUES (%s, %s, %s, %s, %s, %s, %s)"""
+BULK_CHUNK = 5000  # 다중행 INSERT 1회당 행 수 (max_allowed_packet 여유)
+
+
+def _price_rows(stock_id, prices, after_date=None):
+    """가격 dict 리스트 → INSERT 파라미터 튜플 리스트"""
+    rows = []
     for p in prices:
         trade_date = p["date"]
         # YYYYMMDD → DATE 변환
@@ -50,19 +59,57 @@ def _insert_prices(conn, stock_id, prices, after_date=None):
         if after_date and trade_date <= str(after_date):
             continue
 
+        rows.append((stock_id, trade_date, p["open"], p["high"], p["low"], p["close"], p["volume"]))
+    return rows
+
+
+def _insert_rows_single(cursor, rows):
+    """행 단위 INSERT (중복/오류 행은 무시)"""
+    count = 0
+    for row in rows:
         try:
-            cursor.execute(
-                """INSERT IGNORE INTO bs_daily_prices
-                   (stock_id, trade_date, open_price, high_price, low_price, close_price, volume)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-                (stock_id, trade_date, p["open"], p["high"], p["low"], p["close"], p["volume"]),
-            )
+            cursor.execute(_INSERT_PRICE_SQL, row)
             count += cursor.rowcount
         except pymysql.Error:
             pass
     return count
 
 
+def _insert_prices(conn, stock_id, prices, after_date=None, bulk=True):
+    """가격 데이터 INSERT (중복 시 무시)
+
+    bulk=True: executemany → PyMySQL 이 다중행 INSERT ... VALUES (...), (...) 로 묶어 전송
+               (BULK_CHUNK 행당 1회 왕복). 청크 오류 시 해당 청크를 SAVEPOINT 로 되돌리고
+               행 단위로 재시도 (트랜잭션 안에서 호출, autocommit=False).
+    bulk=False: 캔들당 1회 왕복 (기존 방식, 비교용)
+    """
+    rows = _price_rows(stock_id, prices, after_date)
+    cursor = conn.cursor()
+    if not bulk:
+        return _insert_rows_single(cursor, rows)
+
+    count = 0
+    for i in range(0, len(rows), BULK_CHUNK):
+        chunk = rows[i:i + BULK_CHUNK]
+        cursor.execute("SAVEPOINT price_chunk")
+        try:
+            cursor.executemany(_INSERT_PRICE_SQL, chunk)
+            count += cursor.rowcount
+        except pymysql.Error:
+            # executemany 는 청크를 여러 INSERT 문으로 나눠 보낼 수 있어 앞부분이 이미 들어갔을 수 있음
+            # → 청크 시작 시점으로 되돌린 뒤 행 단위 재시도 (그래야 INSERT IGNORE 로 빠진 행 없이 집계)
+            cursor.execute("ROLLBACK TO SAVEPOINT price_chunk")
+            count += _insert_rows_single(cursor, chunk)
+    return count
+
+
+def _print_insert_rate(label, rows, secs, bulk):
+    """DB 쓰기 처리량 출력 (bulk vs 행 단위 비교용)"""
+    mode = "bulk" if bulk else "row-by-row"
+    rate = rows / secs if secs > 0 else 0
+    print(f"[{label}] DB 쓰기: {rows:,}행 / {secs:.1f}s ({rate:,.0f} rows/s, {mode})")
+
+
 def _extract_ticker_df(data, ticker, tickers):
     """yfinance DataFrame에서 개별 종목 데이터 추출 (버전 호환)"""
     import pandas as pd
@@ -89,7 +136,7 @@ def _extract_ticker_df(data, ticker, tickers):
     return None
 
 
-def collect_prices_yfinance(conn, start_date=None, batch_size=200, backfill=False):
+def collect_prices_yfinance(conn, start_date=None, batch_size=200, backfill=False, bulk=True):
     """yfinance로 전 종목 주가 수집 (초기 대량 수집용)"""
     try:
         import yfinance as yf
@@ -102,9 +149,11 @@ def collect_prices_yfinance(conn, start_date=None, batch_size=200, backfill=Fals
         print("  bs_stocks에 종목이 없습니다. collect-symbols를 먼저 실행하세요.")
         return 0
 
+    latest_dates = {} if backfill else _get_latest_dates(conn)
     total_candles = 0
     total = len(stocks)
     error_count = 0
+    insert_secs = 0.0
 
     # 배치 단위로 다운로드
     for batch_start in range(0, total, batch_size):
@@ -150,7 +199,7 @@ def collect_prices_yfinance(conn, start_date=None, batch_size=200, backfill=Fals
         for s in batch:
             ticker = s["ticker"]
             stock_id = s["id"]
-            latest = None if backfill else _get_latest_date(conn, stock_id)
+            latest = latest_dates.get(stock_id)
 
             try:
                 df = _extract_ticker_df(data, ticker, tickers)
@@ -174,7 +223,9 @@ def collect_prices_yfinance(conn, start_date=None, batch_size=200, backfill=Fals
                         "volume": int(row["Volume"]) if row["Volume"] == row["Volume"] else 0,
                     })
 
-                inserted = _insert_prices(conn, stock_id, prices, after_date=latest)
+                t_ins = time.time()
+                inserted = _insert_prices(conn, stock_id, prices, after_date=latest, bulk=bulk)
+                insert_secs += time.time() - t_ins
                 batch_candles += inserted
 
             except Exception as e:
@@ -193,25 +244,29 @@ def collect_prices_yfinance(conn, start_date=None, batch_size=200, backfill=Fals
     if error_count > 10:
         print(f"  [WARN] 총 {error_count}개 에러 발생")
 
+    _print_insert_rate("yfinance", total_candles, insert_secs, bulk)
     return total_candles
 
 
-def collect_prices_kis(conn, kis_client, target_days=260):
+def collect_prices_kis(conn, kis_client, target_days=260, bulk=True):
     """KIS API로 전 종목 주가 수집 (폴백/일일 업데이트용)"""
     stocks = _get_all_stocks(conn)
     if not stocks:
         print("  bs_stocks에 종목이 없습니다.")
         return 0
 
+    latest_dates = _get_latest_dates(conn)
+    http_before = connection_stats()
     total_candles = 0
     errors = []
     total = len(stocks)
+    insert_secs = 0.0
 
     for i, s in enumerate(stocks):
         ticker = s["ticker"]
         exchange_code = s["exchange_code"] or "NAS"
         stock_id = s["id"]
-        latest = _get_latest_date(conn, stock_id)
+        latest = latest_dates.get(stock_id)
 
         if i % 100 == 0:
             print(f"  진행: {i}/{total} (누적 {total_candles}개 캔들, 에러 {len(errors)}개)")
@@ -227,7 +282,9 @@ def collect_prices_kis(conn, kis_client, target_days=260):
                 prices = kis_client.get_daily_prices_paginated(ticker, exchange_code, target_days)
 
             if prices:
-                inserted = _insert_prices(conn, stock_id, prices, after_date=latest)
+                t_ins = time.time()
+                inserted = _insert_prices(conn, stock_id, prices, after_date=latest, bulk=bulk)
+                insert_secs += time.time() - t_ins
                 total_candles += inserted
 
             # 50개마다 커밋
@@ -245,110 +302,141 @@ def collect_prices_kis(conn, kis_client, target_days=260):
     elif errors:
         print(f"  [ERR] 총 {len(errors)}개 에러 발생")
 
+    _print_insert_rate("KIS", total_candles, insert_secs, bulk)
+    print_connection_stats("KIS", since=http_before)
     return total_candles
 
 
-def _fetch_prices_one(api_key, ticker, req_from):
-    """단일 종목 주가 HTTP 요청 (스레드용). 429시 exponential backoff + jitter 재시도."""
-    for attempt in range(MAX_RETRIES + 1):
-        try:
-            params = {"symbol": ticker, "from": req_from, "apikey": api_key}
-            resp = requests.get(
-                f"{FMP_BASE}/stable/historical-price-eod/full",
-                params=params, timeout=30,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            if data and isinstance(data, list):
-                return data
-            return None
-        except requests.exceptions.HTTPError as e:
-            if e.response is not None and e.response.status_code == 404:
-                return None
-            if e.response is not None and e.response.status_code == 429 and attempt < MAX_RETRIES:
-                wait = (2 ** attempt) + random.uniform(0, 1)
-                time.sleep(wait)
-                continue
-            raise
-        except Exception:
-            raise
-    return None
+def _price_writer(q, bulk, state):
+    """쓰기 스레드: 큐에서 (stock_id, prices, after_date) 를 꺼내 전용 연결로 INSERT.
 
+    None 을 받으면 종료. 에러가 나도 생산자가 put 에서 막히지 않도록 끝까지 비움.
+    """
+    from db.connection import get_connection
 
-def collect_prices_fmp(conn, api_key, start_date, include_delisted=False):
-    """FMP API로 전 종목 주가 수집 (split-adjusted, 멀티스레드)"""
+    conn = None
+    try:
+        conn = get_connection()
+        pending = 0
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            stock_id, prices, after = item
+            t_ins = time.time()
+            state["rows"] += _insert_prices(conn, stock_id, prices, after_date=after, bulk=bulk)
+            pending += 1
+            if pending >= COMMIT_EVERY or q.empty():
+                conn.commit()
+                pending = 0
+            state["insert_secs"] += time.time() - t_ins
+        conn.commit()
+    except Exception as e:
+        state["error"] = e
+        while q.get() is not None:
+            pass
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def collect_prices_fmp(conn, api_key, start_date, include_delisted=False, bulk=True):
+    """FMP API로 전 종목 주가 수집 (split-adjusted, 비동기, 분당 호출 한도 준수)
+
+    수집(이벤트 루프)과 저장(쓰기 스레드, 별도 DB 연결)이 bounded 큐로 분리되어
+    네트워크 대기와 INSERT 가 겹쳐서 진행됨. DB 가 밀리면 큐가 차서 put 이 막힘 (backpressure).
+    put 은 이벤트 루프 스레드에서 실행되므로 막혀 있는 동안 루프 전체가 멈춤
+    → 새 요청 발송뿐 아니라 진행 중인 요청의 응답 처리도 대기 (의도된 동작: 메모리 상한 유지).
+    쓰기 스레드가 실패하면 남은 요청을 보내지 않고 즉시 중단.
+
+    쓰기는 별도 연결에서 커밋되므로, 끝난 뒤 호출자 conn 의 트랜잭션(REPEATABLE READ 스냅샷)을
+    닫아서 이후 MA/RS 단계가 새로 들어간 행을 보도록 함.
+    """
     stocks = _get_all_stocks(conn, include_delisted=include_delisted)
     if not stocks:
         print("  bs_stocks에 종목이 없습니다.")
         return 0
 
-    # 종목별 시작일 미리 계산
+    # 종목별 시작일 미리 계산 (최근 날짜 일괄 조회)
+    latest_dates = _get_latest_dates(conn)
     stock_from = {}
     for s in stocks:
-        latest = _get_latest_date(conn, s["id"])
+        latest = latest_dates.get(s["id"])
         stock_from[s["id"]] = str(latest) if latest and str(latest) > start_date else start_date
 
-    total_candles = 0
-    total = len(stocks)
+    jobs = [
+        (s, "/stable/historical-price-eod/full", {"symbol": s["ticker"], "from": stock_from[s["id"]]})
+        for s in stocks
+    ]
     error_count = 0
-    BATCH = 50
-    WORKERS = 10
-
-    for batch_start in range(0, total, BATCH):
-        batch = stocks[batch_start:batch_start + BATCH]
-        print(f"  진행: {batch_start}/{total} (누적 {total_candles}개 캔들, 에러 {error_count}개)", flush=True)
-
-        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
-            futures = {
-                executor.submit(
-                    _fetch_prices_one, api_key, s["ticker"], stock_from[s["id"]]
-                ): s
-                for s in batch
-            }
-            for future in as_completed(futures):
-                s = futures[future]
-                try:
-                    data = future.result()
-                except Exception as e:
-                    error_count += 1
-                    if error_count <= 10:
-                        print(f"  [ERR] {s['ticker']}: {e}")
-                    continue
-
-                if not data:
-                    continue
-
-                prices = []
-                for rec in data:
-                    trade_date = rec.get("date")
-                    if not trade_date:
-                        continue
-                    close = rec.get("close") or 0
-                    prices.append({
-                        "date": trade_date,
-                        "open": round(float(rec.get("open") or 0), 4),
-                        "high": round(float(rec.get("high") or 0), 4),
-                        "low": round(float(rec.get("low") or 0), 4),
-                        "close": round(float(close), 4),
-                        "volume": int(rec.get("volume") or 0),
-                    })
-
-                if prices:
-                    latest = stock_from[s["id"]]
-                    after = latest if latest > start_date else None
-                    inserted = _insert_prices(conn, s["id"], prices, after_date=after)
-                    total_candles += inserted
+    wait_secs = 0.0
+
+    q = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    state = {"rows": 0, "insert_secs": 0.0, "error": None}
+    writer = threading.Thread(target=_price_writer, args=(q, bulk, state), daemon=True)
+    writer.start()
+
+    def on_result(s, data, err):
+        nonlocal error_count, wait_secs
+        if state["error"] is not None:
+            return
+        if err:
+            error_count += 1
+            if error_count <= 10:
+                print(f"  [ERR] {s['ticker']}: {err}")
+            return
+        if not data or not isinstance(data, list):
+            return
+
+        prices = []
+        for rec in data:
+            if not isinstance(rec, dict):
+                continue
+            trade_date = rec.get("date")
+            if not trade_date:
+                continue
+            close = rec.get("close") or 0
+            prices.append({
+                "date": trade_date,
+                "open": round(float(rec.get("open") or 0), 4),
+                "high": round(float(rec.get("high") or 0), 4),
+                "low": round(float(rec.get("low") or 0), 4),
+                "close": round(float(close), 4),
+                "volume": int(rec.get("volume") or 0),
+            })
+
+        if prices:
+            latest = stock_from[s["id"]]
+            after = latest if latest > start_date else None
+            t_put = time.time()
+            q.put((s["id"], prices, after))
+            wait_secs += time.time() - t_put
 
+    try:
+        stats = fetch_all(jobs, api_key, on_result, label="FMP 주가",
+                          should_stop=lambda: state["error"] is not None)
+    finally:
+        q.put(None)
+        writer.join()
+        # _get_all_stocks/_get_latest_dates 가 연 스냅샷 종료 (쓰기 스레드 커밋분이 보이도록)
         conn.commit()
-        time.sleep(0.5)  # 배치 간 딜레이 (rate limit 방지)
+
+    if state["error"] is not None:
+        raise state["error"]
 
     if error_count > 10:
         print(f"  [WARN] 총 {error_count}개 에러")
-    return total_candles
+    _print_insert_rate("FMP", state["rows"], state["insert_secs"], bulk)
+    print(f"  [FMP] 수집 {stats['elapsed']:.0f}s / 쓰기 {state['insert_secs']:.0f}s 겹쳐 진행, "
+          f"DB 대기(backpressure) {wait_secs:.1f}s")
+    return state["rows"]
+
 
+def collect_prices(conn, kis_client=None, bulk=True):
+    """주가 수집 메인 함수: FMP → yfinance → KIS API 폴백
 
-def collect_prices(conn, kis_client=None):
-    """주가 수집 메인 함수: FMP → yfinance → KIS API 폴백"""
+    bulk=False: 행 단위 INSERT (다중행 INSERT 와 처리량 비교용)
+    """
     from config.settings import Settings
     settings = Settings()
 
@@ -364,7 +452,7 @@ def collect_prices(conn, kis_client=None):
     if settings.FMP_API_KEY:
         print("[주가 수집] FMP API로 수집 (split-adjusted)...")
         candles = collect_prices_fmp(
-            conn, settings.FMP_API_KEY, start_date, include_delisted=True
+            conn, settings.FMP_API_KEY, start_date, include_delisted=True, bulk=bulk
         )
         if candles > 0:
             print(f"[주가 수집] FMP 완료: {candles}개 캔들 저장")
@@ -374,14 +462,16 @@ def collect_prices(conn, kis_client=None):
         print("[주가 수집] yfinance로 수집 시도...")
         backfill = settings.LOOKBACK_MONTHS > 12
         batch_size = 50 if backfill else 200
-        candles = collect_prices_yfinance(conn, start_date=start_date, backfill=backfill, batch_size=batch_size)
+        candles = collect_prices_yfinance(
+            conn, start_date=start_date, backfill=backfill, batch_size=batch_size, bulk=bulk
+        )
         if candles > 0:
             print(f"[주가 수집] yfinance 완료: {candles}개 캔들 저장")
 
     # 3차: KIS API 폴백
     if candles == 0 and kis_client:
         print("[주가 수집] KIS API로 폴백...")
-        candles = collect_prices_kis(conn, kis_client, target_days=260)
+        candles = collect_prices_kis(conn, kis_client, target_days=260, bulk=bulk)
         print(f"[주가 수집] KIS API 완료: {candles}개 캔들 저장")
 
     if candles == 0:
@@ -0,0 +1,127 @@
+"""
+bs_daily_prices 스트리밍 로더.
+
+PyMySQL SSCursor(unbuffered)로 행을 받으면서 종목 단위로 묶어 NumPy 배열로 변환.
+전체 결과셋을 클라이언트에 버퍼링하지 않으므로 최대 메모리는 한 종목 + fetch 청크 수준.
+
+주의: 스트리밍 중에는 같은 커넥션으로 다른 쿼리를 실행할 수 없음
+(제너레이터를 끝까지 소비하거나 close() 한 뒤 사용).
+"""
+
+import numpy as np
+import pymysql
+from services.price_cache import (
+    CACHE_COLUMNS, to_column, arrays_to_rows, load_price_cache, iter_cached_rows,
+)
+
+FETCH_ROWS = 100_000
+
+ACTIVE_WHERE = "stock_id IN (SELECT id FROM bs_stocks WHERE is_active = 1)"
+
+
+def _pack(rows, columns):
+    """한 종목의 DB 행 리스트 → {컬럼명: np.ndarray} (가격/MA/RS 는 float64 유지)"""
+    fields = list(zip(*rows))
+    return {
+        name: to_column(values, name, "float64" if CACHE_COLUMNS[name][1] == "float32" else None)
+        for name, values in zip(columns, fields[1:])
+    }
+
+
+def iter_stock_arrays(conn, columns=None, where=None, params=None):
+    """(stock_id, {컬럼명: np.ndarray}) 를 stock_id 순으로 생성.
+
+    columns: price_cache.CACHE_COLUMNS 의 키 (기본: 전체)
+    where/params: 추가 WHERE 조건 (예: "trade_date >= %s", (start,))
+    """
+    columns = list(CACHE_COLUMNS) if columns is None else list(columns)
+    db_cols = ", ".join(CACHE_COLUMNS[name][0] for name in columns)
+    sql = f"SELECT stock_id, {db_cols} FROM bs_daily_prices"
+    if where:
+        sql += f" WHERE {where}"
+    sql += " ORDER BY stock_id, trade_date"
+
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(sql, params)
+        current_sid = None
+        buf = []
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                if row[0] != current_sid:
+                    if buf:
+                        yield current_sid, _pack(buf, columns)
+                    current_sid = row[0]
+                    buf = []
+                buf.append(row)
+        if buf:
+            yield current_sid, _pack(buf, columns)
+    finally:
+        cursor.close()
+
+
+def iter_price_rows(conn, columns, active_only=False, date_str=False):
+    """(stock_id, [(col1, col2, ...), ...]) 를 종목 순으로 생성 (한 번에 한 종목만 튜플로 변환).
+
+    로컬 가격 캐시(build-cache)가 있으면 캐시에서, 없으면 DB 스트리밍으로 읽음.
+    NULL 은 None, trade_date 는 datetime.date (date_str=True 면 "YYYY-MM-DD").
+    캐시가 없으면 SSCursor 스트리밍이므로 소비 중에는 같은 커넥션으로 다른 쿼리 불가.
+    """
+    cache = load_price_cache(columns=columns)
+    if cache is not None:
+        print(f"  -> price cache: {cache['meta']['rows']:,} rows (~{cache['meta']['max_date']})", flush=True)
+        stock_ids = None
+        if active_only:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM bs_stocks WHERE is_active = 1")
+            stock_ids = {r[0] for r in cursor.fetchall()}
+        yield from iter_cached_rows(cache, columns, stock_ids=stock_ids, date_str=date_str)
+        return
+
+    where = ACTIVE_WHERE if active_only else None
+    for sid, arrays in iter_stock_arrays(conn, columns, where=where):
+        yield sid, arrays_to_rows(arrays, columns, date_str=date_str)
+
+
+def load_price_rows(conn, columns, active_only=False, date_str=False):
+    """전 종목 가격을 {stock_id: [(col1, col2, ...), ...]} 로 로드 (과도기 경로).
+
+    전체 테이블을 파이썬 튜플로 들고 있으므로 최대 메모리는 예전 fetchall 과 같음.
+    인터랙티브로 같은 데이터를 반복 실행하는 튜플 기반 백테스트(backtest_minervini,
+    backtest_rotation)만 사용. 종목 단위로 끝나는 처리는 iter_price_rows, 배열 연산은
+    load_price_columns / iter_stock_arrays 를 쓸 것.
+    """
+    return dict(iter_price_rows(conn, columns, active_only=active_only, date_str=date_str))
+
+
+def load_price_columns(conn, columns):
+    """전 종목 가격을 종목별 튜플 없이 컬럼형으로 로드.
+
+    Returns: {"stock_ids", "offsets", <컬럼명>: np.ndarray, "delta": 같은 dict 또는 None}
+    (종목 구간은 price_cache.segment_index). 로컬 가격 캐시가 있으면 본 캐시/델타 memmap 을
+    병합 없이 그대로 반환, 없으면 DB 스트리밍 결과를 이어붙임 (delta = None).
+    """
+    cache = load_price_cache(columns=columns)
+    if cache is not None:
+        print(f"  -> price cache: {cache['meta']['rows']:,} rows (~{cache['meta']['max_date']})", flush=True)
+        return {key: cache[key] for key in ["stock_ids", "offsets", "delta"] + list(columns)}
+
+    stock_ids, lengths = [], []
+    parts = {name: [] for name in columns}
+    for sid, arrays in iter_stock_arrays(conn, columns):
+        stock_ids.append(sid)
+        lengths.append(len(arrays[columns[0]]))
+        for name in columns:
+            parts[name].append(arrays[name])
+
+    result = {
+        "stock_ids": np.array(stock_ids, dtype=np.int64),
+        "offsets": np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]),
+        "delta": None,
+    }
+    for name in columns:
+        result[name] = np.concatenate(parts[name]) if parts[name] else np.array([], dtype=CACHE_COLUMNS[name][1])
+    return result
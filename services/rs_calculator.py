@@ -8,11 +8,269 @@ import pymysql
 import pandas as pd
 import numpy as np
 
+from services.price_stream import iter_stock_arrays
+
 RS_PERIODS = {"rs_1m": 1, "rs_3m": 3, "rs_6m": 6}  # 캘린더 월
 
+CHUNK_DAYS = 50             # 임시 테이블 한 번에 담는 날짜 수
+INSERT_CHUNK_ROWS = 50_000  # executemany 한 번에 보내는 행 수
+# 블록 백필 작업 메모리 (tracemalloc 실측 + 여유 50%, pandas 2.x / NumPy 2.x 기준):
+# - 블록 셀당: float32 현재가/lookback/수익률 + float64 rank 내부 버퍼·결과 + 백분위 체인 + 3기간 결과 ≈ 60 B
+# - 쓰기 셀당: rs_batch_rows 의 파이썬 튜플/리스트 (CHUNK_DAYS 일 x 종목, non-null 80% 기준) ≈ 115 B
+BLOCK_CELL_BYTES = 96
+WRITE_CELL_BYTES = 176
+
+_CREATE_TMP_SQL = """
+    CREATE TEMPORARY TABLE _tmp_rs (
+        stock_id INT NOT NULL,
+        trade_date DATE NOT NULL,
+        rs_1m TINYINT UNSIGNED,
+        rs_3m TINYINT UNSIGNED,
+        rs_6m TINYINT UNSIGNED,
+        PRIMARY KEY (stock_id, trade_date)
+    ) ENGINE=MEMORY
+"""
+
+_INSERT_TMP_SQL = (
+    "INSERT INTO _tmp_rs (stock_id, trade_date, rs_1m, rs_3m, rs_6m) VALUES (%s, %s, %s, %s, %s)"
+)
+
+_JOIN_UPDATE_SQL = """
+    UPDATE bs_daily_prices p
+    JOIN _tmp_rs t ON p.stock_id = t.stock_id AND p.trade_date = t.trade_date
+    SET p.rs_1m = t.rs_1m, p.rs_3m = t.rs_3m, p.rs_6m = t.rs_6m
+"""
+
+
+def _nullable_ints(values):
+    """float 배열 → int / None 리스트 (NaN → None)"""
+    nan = np.isnan(values)
+    out = np.where(nan, 0, values).astype(np.int64).astype(object)
+    out[nan] = None
+    return out.tolist()
+
+
+def rs_batch_rows(dates, stock_ids, r1, r3, r6):
+    """(날짜 x 종목) 백분위 배열 3개 → _tmp_rs INSERT 튜플 목록 (rs_1m 이 있는 칸만)
+
+    셀 단위 .at 조회 대신 non-null 마스크로 한 번에 펼침.
+    """
+    mask = ~np.isnan(r1)
+    di, si = np.nonzero(mask)
+    date_strs = np.asarray(pd.DatetimeIndex(dates).strftime("%Y-%m-%d"), dtype=object)
+    return list(zip(
+        np.asarray(stock_ids)[si].astype(np.int64).tolist(),
+        date_strs[di].tolist(),
+        r1[mask].astype(np.int64).tolist(),
+        _nullable_ints(r3[mask]),
+        _nullable_ints(r6[mask]),
+    ))
+
+
+def write_rs(conn, dates, stock_ids, r1, r3, r6):
+    """임시 테이블에 다중행 INSERT 후 JOIN UPDATE 한 번. 업데이트된 행 수 반환."""
+    batch = rs_batch_rows(dates, stock_ids, r1, r3, r6)
+    cursor = conn.cursor()
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS _tmp_rs")
+    cursor.execute(_CREATE_TMP_SQL)
+
+    updated = 0
+    if batch:
+        for start in range(0, len(batch), INSERT_CHUNK_ROWS):
+            cursor.executemany(_INSERT_TMP_SQL, batch[start:start + INSERT_CHUNK_ROWS])
+
+        # JOIN UPDATE (한번에 업데이트)
+        cursor.execute(_JOIN_UPDATE_SQL)
+        updated = cursor.rowcount
+
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS _tmp_rs")
+    conn.commit()
+    return updated
+
+
+def lookback_rows(index, lookback_dates):
+    """정렬된 날짜 index 에서 lookback_dates 각각의 as-of 행 번호 (없으면 -1)"""
+    return index.searchsorted(lookback_dates, side="right") - 1
+
+
+def _percentiles(returns):
+    """1차원 수익률 → 0~99 백분위 (NaN 제외 순위, 동순위 평균). 피벗 경로와 같은 식."""
+    ranks = pd.Series(returns).rank(method="average").to_numpy()
+    count = np.count_nonzero(~np.isnan(returns))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.round((ranks - 1) / (count - 1) * 99)
+    return np.clip(pct, 0, 99)
+
+
+def calculate_rs_latest(conn):
+    """최근 거래일 RS 만 계산 (일일 업데이트용).
+
+    전 종목 이력을 피벗하지 않고 최근일 + 1/3/6개월 전 as-of 거래일의 종가만 읽음
+    → 메모리는 종목 수에 비례. as-of 거래일은 피벗 경로와 동일하게
+    '기준일 이하 마지막 거래일(전 종목 합산)' 이며 그날 종가가 없는 종목은 제외.
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT MAX(trade_date) FROM bs_daily_prices")
+    latest = cursor.fetchone()[0]
+    if not latest:
+        print("[RS] 데이터 없음")
+        return
+    print(f"[RS] 최근일: {latest}")
+
+    asof_dates = {}
+    for col_name, months in RS_PERIODS.items():
+        lb_date = (pd.Timestamp(latest) - pd.DateOffset(months=months)).date()
+        cursor.execute("SELECT MAX(trade_date) FROM bs_daily_prices WHERE trade_date <= %s", (lb_date,))
+        asof_dates[col_name] = cursor.fetchone()[0]
+
+    dates = sorted({latest, *(d for d in asof_dates.values() if d)})
+    placeholders = ",".join(["%s"] * len(dates))
+    cursor.execute(
+        f"SELECT stock_id, trade_date, close_price FROM bs_daily_prices WHERE trade_date IN ({placeholders})",
+        dates,
+    )
+    closes = {d: {} for d in dates}
+    for stock_id, trade_date, close in cursor.fetchall():
+        closes[trade_date][stock_id] = float(close)
+
+    stock_ids = np.array(sorted(closes[latest]), dtype=np.int64)
+    current = np.array([closes[latest][sid] for sid in stock_ids])
+    print(f"[RS] {len(stock_ids)}종목, 기준일 " + ", ".join(
+        f"{col}={d}" for col, d in asof_dates.items()))
+
+    pct = {}
+    for col_name in RS_PERIODS:
+        prev_map = closes.get(asof_dates[col_name], {})
+        prev = np.array([prev_map.get(sid, np.nan) for sid in stock_ids])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = current / prev - 1
+        pct[col_name] = _percentiles(returns)
+
+    update_count = write_rs(
+        conn, pd.DatetimeIndex([latest]), stock_ids,
+        *(pct[col][np.newaxis, :] for col in RS_PERIODS),
+    )
+    print(f"[RS] 완료: {update_count:,}행 업데이트")
+
+
+def _target_dates(cursor, index):
+    """백필 대상 날짜: 첫 거래일 + 6개월 이후, RS 가 채워진 마지막 날짜 다음부터. 없으면 None."""
+    six_months_after = index[0] + pd.DateOffset(months=6)
+    all_target = index[index >= six_months_after]
+
+    # 이미 RS가 채워진 마지막 날짜 확인 → 이어쓰기
+    cursor.execute("SELECT MAX(trade_date) FROM bs_daily_prices WHERE rs_1m IS NOT NULL")
+    last_filled = cursor.fetchone()[0]
+    if last_filled:
+        last_filled = pd.Timestamp(last_filled)
+        target_dates = all_target[all_target > last_filled]
+        if len(target_dates) == 0:
+            print(f"[RS] 이미 모든 날짜 완료 ({last_filled.date()}까지)")
+            return None
+        print(f"[RS] 이어쓰기: {last_filled.date()} 이후 {len(target_dates)}일")
+    else:
+        target_dates = all_target
+        if len(target_dates) == 0:
+            print("[RS] 6개월 이상 데이터 없음")
+            return None
+        print(f"[RS] 백필: {len(target_dates)}일 ({target_dates[0].date()} ~ {target_dates[-1].date()})")
+    return target_dates
+
+
+def _load_close_matrix(conn):
+    """전 종목 종가 → float32 (날짜 x 종목) 행렬. 종목 단위 스트리밍으로 채움."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT trade_date FROM bs_daily_prices ORDER BY trade_date")
+    dates = pd.DatetimeIndex([r[0] for r in cursor.fetchall()])
+    cursor.execute("SELECT DISTINCT stock_id FROM bs_daily_prices ORDER BY stock_id")
+    stock_ids = np.array([r[0] for r in cursor.fetchall()], dtype=np.int64)
+
+    matrix = np.full((len(dates), len(stock_ids)), np.nan, dtype=np.float32)
+    col_of = {sid: j for j, sid in enumerate(stock_ids)}
+    day_index = dates.to_numpy().astype("datetime64[D]")
+    for sid, cols in iter_stock_arrays(conn, ["trade_date", "close"]):
+        rows = np.searchsorted(day_index, cols["trade_date"])
+        matrix[rows, col_of[sid]] = cols["close"]
+    return dates, stock_ids, matrix
+
+
+def calculate_rs_blocked(conn, memory_budget_mb):
+    """메모리 예산 내 RS 백필 (float32 종가 행렬 + 날짜 블록 단위 순위 계산).
+
+    종가 행렬은 float32 로 한 번만 상주하고, 수익률/순위/백분위는 예산에 맞춘
+    날짜 블록별로 계산 후 바로 DB 에 씀. 블록의 lookback 행(최대 6개월 전)은
+    상주 행렬에서 읽으므로 블록 경계에서도 결과가 이어짐.
+    float32 종가라 수익률이 거의 같은 종목끼리의 순위가 float64 경로와 드물게 다를 수 있음.
+    """
+    cursor = conn.cursor()
+
+    print("[RS] 종가 데이터 로딩 (float32)...")
+    dates, stock_ids, matrix = _load_close_matrix(conn)
+    if matrix.size == 0:
+        print("[RS] 데이터 없음")
+        return
+
+    budget = memory_budget_mb * 1024 * 1024
+    fixed = matrix.nbytes + CHUNK_DAYS * len(stock_ids) * WRITE_CELL_BYTES
+    block_days = (budget - fixed) // (len(stock_ids) * BLOCK_CELL_BYTES)
+    print(f"[RS] 행렬: {len(dates)}일 x {len(stock_ids)}종목 "
+          f"({matrix.nbytes / 1024 / 1024:,.0f}MB), 예산 {memory_budget_mb:,}MB")
+    if block_days < 1:
+        need = (fixed + len(stock_ids) * BLOCK_CELL_BYTES) / 1024 / 1024
+        print(f"[RS] 메모리 예산 부족: 종가 행렬 + 쓰기 버퍼 + 1일 블록에 {need:,.0f}MB 이상 필요")
+        return
+    block_days = int(block_days)
+
+    target_dates = _target_dates(cursor, dates)
+    if target_dates is None:
+        return
+
+    target_rows = dates.get_indexer(target_dates)
+    total_dates = len(target_rows)
+    print(f"[RS] 블록: {block_days}일씩")
+    update_count = 0
+
+    for block_start in range(0, total_dates, block_days):
+        idx = target_rows[block_start:block_start + block_days]
+        current = matrix[idx]
+
+        pct = {}
+        for col_name, months in RS_PERIODS.items():
+            lb_rows = lookback_rows(dates, dates[idx] - pd.DateOffset(months=months))
+            prev = np.full_like(current, np.nan)
+            valid = lb_rows >= 0
+            prev[valid] = matrix[lb_rows[valid]]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                returns = pd.DataFrame(current / prev - 1)
+            ranks = returns.rank(axis=1, method="average")
+            counts = returns.count(axis=1)
+            pct[col_name] = ranks.sub(1).div(counts.sub(1), axis=0).mul(99).round().clip(0, 99).to_numpy()
+
+        for chunk_start in range(0, len(idx), CHUNK_DAYS):
+            sl = slice(chunk_start, chunk_start + CHUNK_DAYS)
+            update_count += write_rs(
+                conn, dates[idx[sl]], stock_ids, *(pct[col][sl] for col in RS_PERIODS),
+            )
+
+        done = min(block_start + block_days, total_dates)
+        print(f"  진행: {done}/{total_dates}일 ({update_count:,}행)", flush=True)
+
+    print(f"[RS] 완료: {update_count:,}행 업데이트")
+
+
+def calculate_rs(conn, backfill=False, memory_budget_mb=None):
+    """전종목 RS 백분위 계산 → bs_daily_prices 업데이트
+
+    backfill=False: 최근 거래일만 (calculate_rs_latest, 전체 이력 로드 없음)
+    backfill=True: 전 기간 피벗 → RS 가 비어 있는 날짜 이어쓰기
+    memory_budget_mb: 지정 시 백필을 float32 날짜 블록 방식으로 (calculate_rs_blocked)
+    """
+    if not backfill:
+        return calculate_rs_latest(conn)
+    if memory_budget_mb:
+        return calculate_rs_blocked(conn, memory_budget_mb)
 
-def calculate_rs(conn, backfill=False):
-    """전종목 RS 백분위 계산 → bs_daily_prices 업데이트"""
     cursor = conn.cursor()
 
     # 1) 전종목 종가 로드 → 피벗 테이블
@@ -34,7 +292,6 @@ def calculate_rs(conn, backfill=False):
     print(f"[RS] 피벗: {len(pivot)}일 x {len(pivot.columns)}종목")
 
     # 2) 캘린더 월 기준 수익률 → 순위 → 백분위
-    date_to_row = {d: i for i, d in enumerate(pivot.index)}
     rs_frames = {}
 
     for col_name, months in RS_PERIODS.items():
@@ -43,12 +300,10 @@ def calculate_rs(conn, backfill=False):
         lookback_dates = pivot.index - pd.DateOffset(months=months)
         prev_prices = np.full_like(pivot.values, np.nan)
 
-        for i, lb_date in enumerate(lookback_dates):
-            nearest = pivot.index.asof(lb_date)
-            if pd.notna(nearest):
-                row_idx = date_to_row.get(nearest)
-                if row_idx is not None:
-                    prev_prices[i] = pivot.values[row_idx]
+        # 각 날짜의 기준일 이하 마지막 거래일 행 번호 (index.asof 와 동일) — 한 번에 계산
+        lb_rows = lookback_rows(pivot.index, lookback_dates)
+        valid = lb_rows >= 0
+        prev_prices[valid] = pivot.values[lb_rows[valid]]
 
         with np.errstate(divide="ignore", invalid="ignore"):
             returns_arr = pivot.values / prev_prices - 1
@@ -62,81 +317,24 @@ def calculate_rs(conn, backfill=False):
         rs_frames[col_name] = percentiles
 
     # 3) 처리할 날짜 필터링 (이미 채워진 날짜 스킵)
-    if backfill:
-        six_months_after = pivot.index[0] + pd.DateOffset(months=6)
-        all_target = pivot.index[pivot.index >= six_months_after]
-
-        # 이미 RS가 채워진 마지막 날짜 확인 → 이어쓰기
-        cursor.execute("SELECT MAX(trade_date) FROM bs_daily_prices WHERE rs_1m IS NOT NULL")
-        last_filled = cursor.fetchone()[0]
-        if last_filled:
-            last_filled = pd.Timestamp(last_filled)
-            target_dates = all_target[all_target > last_filled]
-            if len(target_dates) == 0:
-                print(f"[RS] 이미 모든 날짜 완료 ({last_filled.date()}까지)")
-                return
-            print(f"[RS] 이어쓰기: {last_filled.date()} 이후 {len(target_dates)}일")
-        else:
-            target_dates = all_target
-            print(f"[RS] 백필: {len(target_dates)}일 ({target_dates[0].date()} ~ {target_dates[-1].date()})")
-    else:
-        target_dates = pivot.index[-1:]
-        print(f"[RS] 최근일: {target_dates[0].date()}")
+    target_dates = _target_dates(cursor, pivot.index)
+    if target_dates is None:
+        return
 
     # 4) DB 업데이트 — 임시 테이블 + JOIN UPDATE (대량 쓰기 최적화)
     total_dates = len(target_dates)
-
-    # 날짜 청크별 처리 (메모리 절약)
-    CHUNK_DAYS = 50
+    rows_idx = pivot.index.get_indexer(target_dates)
+    stock_ids = pivot.columns.to_numpy()
+    values = {col: frame.to_numpy() for col, frame in rs_frames.items()}
     update_count = 0
 
+    # 날짜 청크별 처리 (메모리 절약)
     for chunk_start in range(0, total_dates, CHUNK_DAYS):
-        chunk_dates = target_dates[chunk_start:chunk_start + CHUNK_DAYS]
-
-        # 임시 테이블 생성
-        cursor.execute("DROP TEMPORARY TABLE IF EXISTS _tmp_rs")
-        cursor.execute("""
-            CREATE TEMPORARY TABLE _tmp_rs (
-                stock_id INT NOT NULL,
-                trade_date DATE NOT NULL,
-                rs_1m TINYINT UNSIGNED,
-                rs_3m TINYINT UNSIGNED,
-                rs_6m TINYINT UNSIGNED,
-                PRIMARY KEY (stock_id, trade_date)
-            ) ENGINE=MEMORY
-        """)
-
-        # 임시 테이블에 INSERT
-        insert_sql = "INSERT INTO _tmp_rs (stock_id, trade_date, rs_1m, rs_3m, rs_6m) VALUES (%s, %s, %s, %s, %s)"
-        batch = []
-
-        for trade_date in chunk_dates:
-            td_str = trade_date.strftime("%Y-%m-%d")
-            for stock_id in pivot.columns:
-                r1 = rs_frames["rs_1m"].at[trade_date, stock_id]
-                r3 = rs_frames["rs_3m"].at[trade_date, stock_id]
-                r6 = rs_frames["rs_6m"].at[trade_date, stock_id]
-
-                if pd.notna(r1):
-                    batch.append((
-                        int(stock_id), td_str,
-                        int(r1), int(r3) if pd.notna(r3) else None,
-                        int(r6) if pd.notna(r6) else None,
-                    ))
-
-        if batch:
-            cursor.executemany(insert_sql, batch)
-
-            # JOIN UPDATE (한번에 업데이트)
-            cursor.execute("""
-                UPDATE bs_daily_prices p
-                JOIN _tmp_rs t ON p.stock_id = t.stock_id AND p.trade_date = t.trade_date
-                SET p.rs_1m = t.rs_1m, p.rs_3m = t.rs_3m, p.rs_6m = t.rs_6m
-            """)
-            update_count += cursor.rowcount
-
-        cursor.execute("DROP TEMPORARY TABLE IF EXISTS _tmp_rs")
-        conn.commit()
+        idx = rows_idx[chunk_start:chunk_start + CHUNK_DAYS]
+        update_count += write_rs(
+            conn, target_dates[chunk_start:chunk_start + CHUNK_DAYS], stock_ids,
+            *(values[col][idx] for col in RS_PERIODS),
+        )
 
         done = min(chunk_start + CHUNK_DAYS, total_dates)
         print(f"  진행: {done}/{total_dates}일 ({update_count:,}행)", flush=True)
@@ -0,0 +1,62 @@
+"""
+프로세스 풀 공용 NumPy 버퍼 (multiprocessing.shared_memory).
+
+부모가 컬럼 배열을 공유 메모리 블록에 한 번 복사하고, 워커는 블록 이름만 받아
+같은 물리 메모리를 ndarray 뷰로 매핑함. 파이썬 객체(튜플 리스트)를 넘기지 않으므로
+fork 시 refcount 갱신에 의한 copy-on-write 도, spawn 시 pickle 복사도 없음
+→ 워커 수를 늘려도 가격 데이터 메모리는 한 벌.
+
+    blocks, spec = share_arrays({"close": close, ...})    # 부모
+    Pool(n, initializer=init_worker, initargs=(spec,))    # 워커는 attach_arrays(spec)
+    release_arrays(blocks)                                # 풀 종료 후 부모가 해제
+"""
+
+import numpy as np
+from multiprocessing import shared_memory
+
+# 워커 프로세스에서 연결한 블록 (GC 로 매핑이 해제되지 않도록 프로세스 수명 동안 보관)
+_attached = {}
+
+
+def share_arrays(arrays):
+    """{이름: 1차원 배열} → (blocks, spec).
+
+    blocks: SharedMemory 목록 (부모가 보관, 사용 후 release_arrays)
+    spec: {이름: (블록 이름, dtype 문자열, 길이)} — 워커에 넘기는 작은 설명자
+    """
+    blocks, spec = [], {}
+    try:
+        for name, a in arrays.items():
+            a = np.asarray(a)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, a.nbytes))
+            blocks.append(shm)
+            np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[:] = a
+            spec[name] = (shm.name, a.dtype.str, len(a))
+    except Exception:
+        release_arrays(blocks)
+        raise
+    return blocks, spec
+
+
+def attach_arrays(spec):
+    """spec → {이름: 읽기 전용 ndarray 뷰} (같은 블록은 프로세스당 한 번만 연결)"""
+    arrays = {}
+    for name, (shm_name, dtype, length) in spec.items():
+        if shm_name not in _attached:
+            shm = shared_memory.SharedMemory(name=shm_name)
+            view = np.ndarray((length,), dtype=np.dtype(dtype), buffer=shm.buf)
+            view.flags.writeable = False
+            _attached[shm_name] = (shm, view)
+        arrays[name] = _attached[shm_name][1]
+    return arrays
+
+
+def release_arrays(blocks):
+    """부모 프로세스에서 공유 블록 해제"""
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+def shared_nbytes(blocks):
+    return sum(shm.size for shm in blocks)
@@ -3,9 +3,10 @@
 NASDAQ API에서 NYSE, NASDAQ, AMEX 종목 리스트를 가져와 bs_stocks에 저장.
 """
 
-import requests
 import pymysql
 
+from services.http_session import get_session
+
 EXCHANGE_MAP = {
     "NASDAQ": "NAS",
     "NYSE": "NYS",
@@ -36,7 +37,7 @@ def fetch_stock_list():
         }
 
         try:
-            resp = requests.get(NASDAQ_API_URL, params=params, headers=NASDAQ_HEADERS, timeout=30)
+            resp = get_session().get(NASDAQ_API_URL, params=params, headers=NASDAQ_HEADERS, timeout=30)
             resp.raise_for_status()
             data = resp.json()
 
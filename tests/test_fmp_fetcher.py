@@ -0,0 +1,126 @@
+"""
+fmp_fetcher.fetch_all 를 로컬 스텁 HTTP 서버(base_url)로 검증.
+
+- 분당 호출 한도(토큰 버킷)를 넘지 않는지
+- 모든 작업에 콜백이 한 번씩 호출되는지 (404 / 에러 dict 본문 / 콜백 예외 포함)
+- 5xx 재시도와 HTTP 호출 수 집계
+"""
+
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from services import fmp_fetcher
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        symbol = query.get("symbol", [""])[0]
+        self.server.hits.append((time.monotonic(), symbol, query.get("apikey", [""])[0]))
+
+        if symbol == "MISSING":
+            self.send_response(404)
+            self.end_headers()
+            return
+        # FLAKY: 첫 호출만 503, DOWN: 항상 500
+        if symbol == "DOWN" or (symbol == "FLAKY" and sum(h[1] == "FLAKY" for h in self.server.hits) == 1):
+            self.send_response(503 if symbol == "FLAKY" else 500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if symbol == "LIMIT":
+            body = {"Error Message": "Limit Reach"}
+        else:
+            body = [{"symbol": symbol, "close": 1.0}]
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchAllStubTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self.server.hits = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_rate_limit_and_callbacks(self):
+        calls_per_min = 1200          # 초당 20건, 버스트 20
+        rate = calls_per_min / 60
+        burst = calls_per_min // 60
+        symbols = [f"S{i}" for i in range(57)] + ["MISSING", "LIMIT", "BOOM"]
+        jobs = [(sym, "/stable/test", {"symbol": sym}) for sym in symbols]
+
+        results = {}
+
+        def on_result(key, data, err):
+            results[key] = (data, err)
+            if key == "BOOM":
+                raise ValueError("callback failure")
+
+        t0 = time.monotonic()
+        stats = fmp_fetcher.fetch_all(
+            jobs, "KEY", on_result, calls_per_min=calls_per_min, max_in_flight=8,
+            base_url=self.base_url, label="stub",
+        )
+        elapsed = time.monotonic() - t0
+
+        # 모든 작업에 콜백 1회 (콜백 예외가 나머지를 중단시키지 않음)
+        self.assertEqual(set(results), set(symbols))
+        self.assertEqual(stats["jobs"], len(symbols))
+        self.assertEqual(stats["requests"], len(symbols))
+        self.assertEqual(stats["errors"], 0)
+        self.assertEqual(stats["callback_errors"], 1)
+        self.assertIsNone(results["MISSING"][0])
+        self.assertEqual(results["LIMIT"][0], {"Error Message": "Limit Reach"})
+        self.assertEqual(results["S0"][0], [{"symbol": "S0", "close": 1.0}])
+        self.assertTrue(all(hit[2] == "KEY" for hit in self.server.hits))
+
+        # 한도 준수: 버스트 이후는 초당 rate 건 → 최소 소요 시간, 임의 1초 구간 요청 수 상한
+        self.assertEqual(len(self.server.hits), len(symbols))
+        self.assertGreaterEqual(elapsed, (len(symbols) - burst) / rate * 0.9)
+        times = sorted(hit[0] for hit in self.server.hits)
+        for i, t in enumerate(times):
+            in_window = sum(1 for u in times[i:] if u < t + 1.0)
+            self.assertLessEqual(in_window, burst + rate + 1)
+
+    def test_retries_5xx_and_counts_attempts(self):
+        jobs = [(sym, "/stable/test", {"symbol": sym}) for sym in ("S0", "FLAKY", "DOWN")]
+        results = {}
+
+        with mock.patch.object(fmp_fetcher, "MAX_RETRIES", 1):
+            stats = fmp_fetcher.fetch_all(
+                jobs, "KEY", lambda key, data, err: results.__setitem__(key, (data, err)),
+                calls_per_min=1200, max_in_flight=4, base_url=self.base_url, label="stub",
+            )
+
+        # 5xx 는 재시도: FLAKY 는 두 번째 시도에 성공, DOWN 은 재시도 소진 후 에러
+        self.assertEqual(results["FLAKY"][0], [{"symbol": "FLAKY", "close": 1.0}])
+        self.assertIsNone(results["DOWN"][0])
+        self.assertIsInstance(results["DOWN"][1], fmp_fetcher.requests.exceptions.HTTPError)
+        # requests 는 작업 수가 아니라 재시도를 포함한 HTTP 호출 수
+        self.assertEqual(stats["jobs"], 3)
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["errors"], 1)
+        self.assertEqual(len(self.server.hits), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+http_session 연결 통계: 단계별 차이(since)와 풀이 빠진 뒤에도 누적이 유지되는지.
+"""
+
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from services import http_session
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+class ConnectionStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.host = f"127.0.0.1:{self.server.server_address[1]}"
+        self.session = http_session.get_session()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _get(self, n):
+        for _ in range(n):
+            self.session.get(self.url, timeout=5).close()
+
+    def test_phase_delta_and_eviction(self):
+        before = http_session.connection_stats()
+        self._get(5)
+        phase1 = http_session.connection_stats(since=before)
+        self.assertEqual(phase1[self.host]["requests"], 5)
+        self.assertEqual(phase1[self.host]["connections"], 1)
+        self.assertEqual(phase1[self.host]["reused"], 4)
+
+        # 두 번째 단계는 첫 단계 요청을 포함하지 않음
+        snapshot = http_session.connection_stats()
+        self._get(3)
+        self.assertEqual(http_session.connection_stats(since=snapshot)[self.host]["requests"], 3)
+
+        # 호스트 풀이 빠져도(POOL_HOSTS 초과 / clear) 누적 카운터는 유지
+        for adapter in set(self.session.adapters.values()):
+            adapter.poolmanager.clear()
+        self._get(2)
+        total = http_session.connection_stats(since=before)[self.host]
+        self.assertEqual(total["requests"], 10)
+        self.assertEqual(total["connections"], 2)
+
+        # 요청이 없던 단계는 해당 호스트를 출력하지 않음
+        self.assertNotIn(self.host, http_session.connection_stats(since=http_session.connection_stats()))
+
+
+if __name__ == "__main__":
+    unittest.main()
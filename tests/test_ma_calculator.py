@@ -0,0 +1,82 @@
+"""
+ma_calculator 롤링 상태(링 버퍼) 검증: 증분 MA 가 전체 계산과 같은지,
+윈도 안 종가 정정 / 과거 날짜 추가가 COUNT/SUM 비교로 잡히는지.
+"""
+
+import unittest
+
+import numpy as np
+
+from services.ma_calculator import (
+    MA_PERIODS, _new_entry, _push, _resum, _window_from, _window_matches, rolling_means,
+)
+
+
+def _db_window(close, dates, window_from, last_date):
+    """_WINDOW_CHECK_SQL 과 같은 집계 (window_from None = 전체 이력)"""
+    mask = dates <= np.datetime64(last_date)
+    if window_from is not None:
+        mask &= dates >= np.datetime64(window_from)
+    return int(mask.sum()), float(close[mask].sum())
+
+
+class RollingStateTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.close = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.02, 600))), 4)
+        self.dates = np.datetime64("2020-01-01") + np.arange(600)
+
+    def test_push_matches_full_recompute(self):
+        for start in (30, 180, 250):
+            entry = _new_entry(self.close[:start], self.dates[:start])
+            for j in range(start, len(self.close)):
+                if j % 50 == 0:
+                    _resum(entry)
+                got = _push(entry, self.close[j], self.dates[j])
+                mas = rolling_means(self.close[:j + 1])
+                want = tuple(None if np.isnan(mas[p][-1]) else round(float(mas[p][-1]), 4) for p in MA_PERIODS)
+                for g, w in zip(got, want):
+                    if w is None:
+                        self.assertIsNone(g)
+                    else:
+                        self.assertAlmostEqual(g, w, places=3)
+            self.assertEqual(entry["last_date"], self.dates[-1])
+
+    def _check(self, entry, close, dates):
+        return _window_matches(entry, *_db_window(close, dates, _window_from(entry), entry["last_date"]))
+
+    def test_window_matches_history(self):
+        for start in (30, 250):
+            entry = _new_entry(self.close[:start], self.dates[:start])
+            for j in range(start, start + 20):
+                _push(entry, self.close[j], self.dates[j])
+            last = start + 19
+            self.assertTrue(self._check(entry, self.close, self.dates))
+
+            # 윈도 안 과거 종가 1틱 정정
+            corrected = self.close.copy()
+            corrected[last - 10] += 0.0001
+            self.assertFalse(self._check(entry, corrected, self.dates))
+
+            # 윈도 안 과거 날짜 늦게 추가
+            dates = np.insert(self.dates, last - 5, self.dates[last - 5])
+            inserted = np.insert(self.close, last - 5, self.close[last - 5])
+            self.assertFalse(self._check(entry, inserted, dates))
+
+            # 윈도 밖(새 봉 이후) 변경은 영향 없음
+            later = self.close.copy()
+            later[last + 1:] += 1
+            self.assertTrue(self._check(entry, later, self.dates))
+
+    def test_short_history_uses_full_history(self):
+        entry = _new_entry(self.close[:30], self.dates[:30])
+        self.assertIsNone(_window_from(entry))
+        self.assertTrue(self._check(entry, self.close[:30], self.dates[:30]))
+        # 첫 봉 이전 날짜가 늦게 추가되면 행 수 불일치
+        dates = np.concatenate(([self.dates[0] - 1], self.dates[:30]))
+        close = np.concatenate(([self.close[0]], self.close[:30]))
+        self.assertFalse(self._check(entry, close, dates))
+
+
+if __name__ == "__main__":
+    unittest.main()
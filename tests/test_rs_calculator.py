@@ -0,0 +1,67 @@
+"""
+rs_calculator.lookback_rows 를 기존 pivot.index.asof 루프와 비교.
+
+기존 구현: 날짜마다 index.asof(기준일 - N개월) → 행 번호 (없으면 건너뜀)
+"""
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from services.rs_calculator import RS_PERIODS, lookback_rows
+
+
+def _asof_rows(index, lookback_dates):
+    """기존 calculate_rs 루프와 같은 방식의 행 번호 (없으면 -1)"""
+    date_to_row = {d: i for i, d in enumerate(index)}
+    rows = []
+    for lb_date in lookback_dates:
+        nearest = index.asof(lb_date)
+        rows.append(date_to_row.get(nearest, -1) if pd.notna(nearest) else -1)
+    return np.array(rows)
+
+
+class LookbackRowsTest(unittest.TestCase):
+    def assert_same_as_asof(self, index):
+        for months in RS_PERIODS.values():
+            lookback_dates = index - pd.DateOffset(months=months)
+            with self.subTest(months=months):
+                np.testing.assert_array_equal(
+                    lookback_rows(index, lookback_dates), _asof_rows(index, lookback_dates)
+                )
+
+    def test_business_days_with_gaps(self):
+        rng = np.random.default_rng(0)
+        days = pd.bdate_range("2020-01-01", "2022-12-31")
+        keep = rng.random(len(days)) > 0.15          # 휴장일 + 임의 결측
+        keep[rng.integers(0, len(days), 5)] = False
+        index = days[keep]
+        # 한 달 가까운 공백 (1개월 전 기준일이 공백 안에 떨어짐)
+        index = index[(index < "2021-06-03") | (index > "2021-06-28")]
+        self.assert_same_as_asof(index)
+
+    def test_month_end_dates(self):
+        # 3/31 - 1개월 = 2/29(윤년)·2/28, 5/31 - 1개월 = 4/30 등 말일 보정
+        index = pd.DatetimeIndex([
+            "2023-12-29", "2024-01-31", "2024-02-28", "2024-02-29", "2024-03-01",
+            "2024-03-29", "2024-03-31", "2024-04-30", "2024-05-31", "2024-08-30",
+            "2024-08-31", "2024-09-30", "2025-02-28", "2025-03-31",
+        ])
+        self.assert_same_as_asof(index)
+        rows = lookback_rows(index, pd.DatetimeIndex(["2024-03-31"]) - pd.DateOffset(months=1))
+        self.assertEqual(index[rows[0]], pd.Timestamp("2024-02-29"))
+
+    def test_lookback_before_first_date(self):
+        index = pd.bdate_range("2024-03-15", "2024-06-30")
+        self.assert_same_as_asof(index)
+        rows = lookback_rows(index, index - pd.DateOffset(months=6))
+        self.assertTrue((rows == -1).all())
+
+        # 정확히 첫 날짜와 같은 기준일은 0 행
+        rows = lookback_rows(index, pd.DatetimeIndex(["2024-03-14", "2024-03-15", "2024-03-16"]))
+        self.assertEqual(rows.tolist(), [-1, 0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()